@@ -9,6 +9,35 @@ FAX_SCRIPT="/opt/ORU2pdf.py"
 PRELIM_DIR="/var/lib/filemonitor/PrelimSR"
 PRELIM_SCRIPT="/opt/prelimSR.py"
 PRELIM_DICOM_DIR="/var/lib/filemonitor/PrelimSR/DICOM"
+PYTHON="/opt/radx-workflow/bin/python"
+
+# Resident hl7_pdf_dcm.py worker (--serve): keeps modules loaded so each HL7 skips a Python cold start.
+# worker_socket.py is the thin client; if the worker is down we fall back to running the script per file.
+HL7_WORKER_ENABLED=1
+HL7_WORKER_SOCKET="/run/filemonitor/hl7_pdf_dcm.sock"
+WORKER_CLIENT="/opt/worker_socket.py"
+# worker_socket.py exit codes: 0 ok, 1 err, 2 worker unreachable (run the script instead), 3 no answer within its
+# CLIENT_TIMEOUT (the worker may still be on the file: not failed, and not to be run again)
+WORKER_UNREACHABLE=2
+WORKER_NO_ANSWER=3
+
+# Resident ORU2pdf.py worker (--serve), same protocol: each FAX_*.json is rendered, named and filed by a warm process
+FAX_WORKER_ENABLED=1
+FAX_WORKER_SOCKET="/run/filemonitor/ORU2pdf.sock"
+
+# How hl7_pdf_dcm.py builds DICOM: img2dcm (JPEG + img2dcm, decompressed with dcmdjpeg before send),
+# pdf (Encapsulated PDF) or sc (uncompressed Secondary Capture). pdf/sc skip the JPEG, img2dcm and dcmdjpeg steps.
+export HL7_DICOM_MODE="img2dcm"
+# Pages to rasterise in img2dcm/sc modes: first, or all (one instance per page, same series)
+export HL7_PAGES="first"
+
+# File readiness: close_write/moved_to mean the writer is done, so files are picked up as soon as the event arrives.
+# Size polling (wait_for_file_complete, >=1s) only runs for network-mounted sources, where inotify doesn't see remote
+# writers. auto = poll on network filesystems only, event = never poll, poll = always poll (old behaviour).
+# Exported so hl7_pdf_dcm.py (file_readiness.py) applies the same rule; NETWORK_FS_TYPES is the same list as
+# file_readiness.NETWORK_FS_TYPES, change both together.
+export FILE_READINESS="auto"
+NETWORK_FS_TYPES=" nfs nfs4 cifs smb smb2 smb3 smbfs ncpfs afs 9p ceph glusterfs fuse.glusterfs fuse.sshfs davfs fuse.davfs2 lustre gpfs "
 
 # Per-script log files (detailed output stays out of main log)
 LOG_DIR_FAX="/var/lib/filemonitor/FAX/logs"
@@ -58,10 +87,90 @@ wait_for_file_complete() {
     return 0
 }
 
+# Set FS_TYPE to the filesystem type of the directory holding a file, cached per directory
+# (findmnt knows fuse subtypes; stat -f is the fallback)
+declare -A FS_TYPE_CACHE
+fs_type_of() {
+    local dir="${1%/*}"
+    if [[ -z "${FS_TYPE_CACHE[$dir]+x}" ]]; then
+        FS_TYPE_CACHE[$dir]="$(findmnt -n -o FSTYPE -T "$dir" 2>/dev/null || stat -f -c %T "$dir" 2>/dev/null)"
+    fi
+    FS_TYPE="${FS_TYPE_CACHE[$dir]}"
+}
+
+# Wait until a file delivered by close_write/moved_to is ready; sets READY_WAIT to the seconds spent polling
+file_ready() {
+    local file_path="$1"
+    READY_WAIT="0.0"
+    if [[ "$FILE_READINESS" == "event" ]]; then
+        return 0
+    fi
+    if [[ "$FILE_READINESS" != "poll" ]]; then
+        fs_type_of "$file_path"
+        [[ "$NETWORK_FS_TYPES" != *" $FS_TYPE "* ]] && return 0
+    fi
+    local start="${EPOCHREALTIME:-$(date +%s.%N)}"
+    wait_for_file_complete "$file_path"
+    local rc=$?
+    READY_WAIT="$(awk -v s="$start" -v e="${EPOCHREALTIME:-$(date +%s.%N)}" 'BEGIN { printf "%.1f", e - s }')"
+    return "$rc"
+}
+
 mkdir -p "$HL7toDICOM_DIR" "$FAX_DIR" "$PRELIM_DIR"
 mkdir -p "$HL7toDICOM_DIR/Processed" "$HL7toDICOM_DIR/Failed" "$PRELIM_DICOM_DIR/Processed" "$PRELIM_DICOM_DIR/Failed"
 mkdir -p "$LOG_DIR_FAX" "$LOG_DIR_PRELIM" "$LOG_DIR_HL7"
 
+# Start the resident HL7 worker; it logs per-file latency to $LOG_HL7DCM
+if [[ "$HL7_WORKER_ENABLED" == "1" ]]; then
+    mkdir -p "$(dirname "$HL7_WORKER_SOCKET")"
+    "$PYTHON" -u "$HL7toDICOM_SCRIPT" --serve "$HL7_WORKER_SOCKET" >> "$LOG_HL7DCM" 2>&1 &
+    HL7_WORKER_PID=$!
+fi
+
+# Start the resident FAX worker; it logs per-report latency to $LOG_ORU2PDF
+if [[ "$FAX_WORKER_ENABLED" == "1" ]]; then
+    mkdir -p "$(dirname "$FAX_WORKER_SOCKET")"
+    "$PYTHON" -u "$FAX_SCRIPT" --serve "$FAX_WORKER_SOCKET" >> "$LOG_ORU2PDF" 2>&1 &
+    FAX_WORKER_PID=$!
+fi
+trap 'kill $HL7_WORKER_PID $FAX_WORKER_PID 2>/dev/null' EXIT
+
+# Run hl7_pdf_dcm.py on one file: via the resident worker when it is up, otherwise a fresh interpreter
+run_hl7_pdf_dcm() {
+    local file_path="$1"
+    if [[ "$HL7_WORKER_ENABLED" == "1" && -S "$HL7_WORKER_SOCKET" ]]; then
+        "$PYTHON" "$WORKER_CLIENT" "$HL7_WORKER_SOCKET" "$file_path" >> "$LOG_HL7DCM" 2>&1
+        local rc=$?
+        [[ "$rc" -ne "$WORKER_UNREACHABLE" ]] && return "$rc"
+        log_main "WARN HL7 worker not reachable, running hl7_pdf_dcm.py directly: $(basename "$file_path")"
+    fi
+    "$PYTHON" -u "$HL7toDICOM_SCRIPT" "$file_path" >> "$LOG_HL7DCM" 2>&1
+}
+
+# Run ORU2pdf.py on one report: via the resident worker when it is up, otherwise a fresh interpreter
+run_oru2pdf() {
+    local file_path="$1"
+    if [[ "$FAX_WORKER_ENABLED" == "1" && -S "$FAX_WORKER_SOCKET" ]]; then
+        "$PYTHON" "$WORKER_CLIENT" "$FAX_WORKER_SOCKET" "$file_path" >> "$LOG_ORU2PDF" 2>&1
+        local rc=$?
+        [[ "$rc" -ne "$WORKER_UNREACHABLE" ]] && return "$rc"
+        log_main "WARN FAX worker not reachable, running ORU2pdf.py directly: $(basename "$file_path")"
+    fi
+    "$PYTHON" -u "$FAX_SCRIPT" "$file_path" >> "$LOG_ORU2PDF" 2>&1
+}
+
+# DONE line for a run_hl7_pdf_dcm/run_oru2pdf exit code: <script> <file> <exit code> <script log>
+log_done() {
+    local script="$1" name="$2" rc="$3" script_log="$4"
+    if [[ "$rc" -eq 0 ]]; then
+        log_main "DONE $script $name ok"
+    elif [[ "$rc" -eq "$WORKER_NO_ANSWER" ]]; then
+        log_main "DONE $script $name unknown (worker still busy, see $script_log)"
+    else
+        log_main "DONE $script $name err (see $script_log)"
+    fi
+}
+
 log_main "START FileMonitor (main=$MONITOR_DIR, FAX->$FAX_DIR, PRELIM->$PRELIM_DIR, HL7->$HL7toDICOM_DIR)"
 
 ########################################
@@ -88,14 +197,11 @@ monitor_root() {
                 log_main "ERR FAX file not readable: $BASENAME"
                 continue
             fi
-            wait_for_file_complete "$NEW_FILE"
+            file_ready "$NEW_FILE"
             mv "$NEW_FILE" "$FAX_DIR/"
-            log_main "RECV FAX $BASENAME -> $FAX_DIR | script ORU2pdf.py"
-            if /opt/radx-workflow/bin/python -u "$FAX_SCRIPT" >> "$LOG_ORU2PDF" 2>&1; then
-                log_main "DONE ORU2pdf.py $BASENAME ok"
-            else
-                log_main "DONE ORU2pdf.py $BASENAME err (see $LOG_ORU2PDF)"
-            fi
+            log_main "RECV FAX $BASENAME -> $FAX_DIR | script ORU2pdf.py | wait ${READY_WAIT}s"
+            run_oru2pdf "$FAX_DIR/$BASENAME"
+            log_done ORU2pdf.py "$BASENAME" $? "$LOG_ORU2PDF"
             continue
         fi
 
@@ -105,11 +211,11 @@ monitor_root() {
                 log_main "ERR PRELIM file not readable: $BASENAME"
                 continue
             fi
-            wait_for_file_complete "$NEW_FILE"
+            file_ready "$NEW_FILE"
             mv "$NEW_FILE" "$PRELIM_DIR/"
             MOVED_FILE="$PRELIM_DIR/$BASENAME"
-            log_main "RECV PRELIM $BASENAME -> $PRELIM_DIR | script prelimSR.py"
-            if /opt/radx-workflow/bin/python -u "$PRELIM_SCRIPT" "$MOVED_FILE" >> "$LOG_PRELIMSR" 2>&1; then
+            log_main "RECV PRELIM $BASENAME -> $PRELIM_DIR | script prelimSR.py | wait ${READY_WAIT}s"
+            if "$PYTHON" -u "$PRELIM_SCRIPT" "$MOVED_FILE" >> "$LOG_PRELIMSR" 2>&1; then
                 log_main "DONE prelimSR.py $BASENAME ok"
             else
                 log_main "DONE prelimSR.py $BASENAME err (see $LOG_PRELIMSR)"
@@ -119,16 +225,13 @@ monitor_root() {
 
         # HL7 (PDF-Base64) -> process in place, script hl7_pdf_dcm.py
         if [[ -f "$NEW_FILE" && -r "$NEW_FILE" ]]; then
-            wait_for_file_complete "$NEW_FILE"
-            log_main "RECV HL7 $(basename "$NEW_FILE") -> $HL7toDICOM_DIR | script hl7_pdf_dcm.py"
+            file_ready "$NEW_FILE"
+            log_main "RECV HL7 $(basename "$NEW_FILE") -> $HL7toDICOM_DIR | script hl7_pdf_dcm.py | wait ${READY_WAIT}s"
             if grep -q "sys.argv" "$HL7toDICOM_SCRIPT" 2>/dev/null; then
-                if /opt/radx-workflow/bin/python -u "$HL7toDICOM_SCRIPT" "$NEW_FILE" >> "$LOG_HL7DCM" 2>&1; then
-                    log_main "DONE hl7_pdf_dcm.py $(basename "$NEW_FILE") ok"
-                else
-                    log_main "DONE hl7_pdf_dcm.py $(basename "$NEW_FILE") err (see $LOG_HL7DCM)"
-                fi
+                run_hl7_pdf_dcm "$NEW_FILE"
+                log_done hl7_pdf_dcm.py "$(basename "$NEW_FILE")" $? "$LOG_HL7DCM"
             else
-                if /opt/radx-workflow/bin/python -u "$HL7toDICOM_SCRIPT" >> "$LOG_HL7DCM" 2>&1; then
+                if "$PYTHON" -u "$HL7toDICOM_SCRIPT" >> "$LOG_HL7DCM" 2>&1; then
                     log_main "DONE hl7_pdf_dcm.py ok"
                 else
                     log_main "DONE hl7_pdf_dcm.py err (see $LOG_HL7DCM)"
@@ -144,27 +247,33 @@ monitor_root() {
 # Monitor 2: DICOM in HL7toDICOM (send to PACS)
 ###########################################
 monitor_hl7_dicom() {
-    inotifywait -m -e create -e moved_to --format "%w%f" "$HL7toDICOM_DIR" 2>/dev/null | while read -r NEW_DICOM_FILE; do
+    inotifywait -m -e close_write -e moved_to --format "%w%f" "$HL7toDICOM_DIR" 2>/dev/null | while read -r NEW_DICOM_FILE; do
         [[ ! -f "$NEW_DICOM_FILE" || ! -r "$NEW_DICOM_FILE" ]] && continue
-        wait_for_file_complete "$NEW_DICOM_FILE"
+        file_ready "$NEW_DICOM_FILE"
         BN="$(basename "$NEW_DICOM_FILE")"
-        UNCOMPRESSED_FILE="${NEW_DICOM_FILE%.dcm}_uncompressed.dcm"
 
-        if dcmdjpeg "$NEW_DICOM_FILE" "$UNCOMPRESSED_FILE" >> "$LOG_HL7DCM" 2>&1; then
-            if storescu -v -aet "$DICOM_AET" -aec "$DICOM_AEC" "$DICOM_HOST" "$DICOM_PORT" "$UNCOMPRESSED_FILE" >> "$LOG_HL7DCM" 2>&1; then
-                rm -f "$UNCOMPRESSED_FILE"
-                mkdir -p "$HL7toDICOM_DIR/Processed"
-                mv "$NEW_DICOM_FILE" "$HL7toDICOM_DIR/Processed/"
-                log_main "DICOM HL7 $BN -> Processed/ | sent PACS ok"
-            else
+        # img2dcm output is JPEG-compressed; the in-process modes (pdf/sc) already write uncompressed DICOM
+        if [[ "$HL7_DICOM_MODE" == "img2dcm" ]]; then
+            UNCOMPRESSED_FILE="${NEW_DICOM_FILE%.dcm}_uncompressed.dcm"
+            if ! dcmdjpeg "$NEW_DICOM_FILE" "$UNCOMPRESSED_FILE" >> "$LOG_HL7DCM" 2>&1; then
                 mkdir -p "$HL7toDICOM_DIR/Failed"
-                mv "$UNCOMPRESSED_FILE" "$HL7toDICOM_DIR/Failed/"
-                log_main "DICOM HL7 $BN -> Failed/ | PACS send err"
+                mv "$NEW_DICOM_FILE" "$HL7toDICOM_DIR/Failed/"
+                log_main "DICOM HL7 $BN -> Failed/ | uncompress err"
+                continue
             fi
+        else
+            UNCOMPRESSED_FILE="$NEW_DICOM_FILE"
+        fi
+
+        if storescu -v -aet "$DICOM_AET" -aec "$DICOM_AEC" "$DICOM_HOST" "$DICOM_PORT" "$UNCOMPRESSED_FILE" >> "$LOG_HL7DCM" 2>&1; then
+            [[ "$UNCOMPRESSED_FILE" != "$NEW_DICOM_FILE" ]] && rm -f "$UNCOMPRESSED_FILE"
+            mkdir -p "$HL7toDICOM_DIR/Processed"
+            mv "$NEW_DICOM_FILE" "$HL7toDICOM_DIR/Processed/"
+            log_main "DICOM HL7 $BN -> Processed/ | sent PACS ok | wait ${READY_WAIT}s"
         else
             mkdir -p "$HL7toDICOM_DIR/Failed"
-            mv "$NEW_DICOM_FILE" "$HL7toDICOM_DIR/Failed/"
-            log_main "DICOM HL7 $BN -> Failed/ | uncompress err"
+            mv "$UNCOMPRESSED_FILE" "$HL7toDICOM_DIR/Failed/"
+            log_main "DICOM HL7 $BN -> Failed/ | PACS send err"
         fi
     done
 }
@@ -173,9 +282,9 @@ monitor_hl7_dicom() {
 # Monitor 3: PRELIM DICOM in PrelimSR/DICOM (send to PACS)
 ###########################################
 monitor_prelim_dicom() {
-    inotifywait -m -e create -e moved_to --format "%w%f" "$PRELIM_DICOM_DIR" 2>/dev/null | while read -r NEW_DICOM_FILE; do
+    inotifywait -m -e close_write -e moved_to --format "%w%f" "$PRELIM_DICOM_DIR" 2>/dev/null | while read -r NEW_DICOM_FILE; do
         [[ ! -f "$NEW_DICOM_FILE" || ! -r "$NEW_DICOM_FILE" ]] && continue
-        wait_for_file_complete "$NEW_DICOM_FILE"
+        file_ready "$NEW_DICOM_FILE"
         BASENAME="$(basename "$NEW_DICOM_FILE")"
 
         if [[ "$BASENAME" != *_* ]]; then
@@ -194,7 +303,7 @@ monitor_prelim_dicom() {
                 rm -f "$UNCOMPRESSED_FILE"
                 mkdir -p "$PRELIM_DICOM_DIR/Processed"
                 mv "$NEW_DICOM_FILE" "$PRELIM_DICOM_DIR/Processed/"
-                log_main "PRELIM DICOM $BASENAME -> Processed/ | AET=$AET sent ok"
+                log_main "PRELIM DICOM $BASENAME -> Processed/ | AET=$AET sent ok | wait ${READY_WAIT}s"
             else
                 mkdir -p "$PRELIM_DICOM_DIR/Failed"
                 mv "$UNCOMPRESSED_FILE" "$PRELIM_DICOM_DIR/Failed/"
@@ -2,18 +2,46 @@
 # 1. The script will convert the ORU messages into json files and then into pdf files.
 # 2. The pdf files will be renamed based on the fax number and accession number found in the json files, however this can be changed by modifying the "fax_key" and "accn_key" variables in the script.
 # 3. The script will also add a logo to the pdf files and can also be customized by modifying the "image" key in the "document" dictionary under the "create_pdf_from_json" function.
-# Known bug: If there is more than one file to be converted, it will convert one correctly and move it to pdf_dir but for the files that follow, it will detect a pdf already converted and not rename the other files according to the logic and keep the original file names. **** This is a bug that needs to be fixed ****
-# Requirements: pdfme library, chardet library, pillow library (for .jpeg images)
+# Requirements: pdfme library, chardet library (only for reports that aren't UTF-8), pillow library (for .jpeg images)
 # For pdfme library documentation, please visit: https://pdfme.readthedocs.io/en/latest/
+# Updated: --jsonl renders every record of a JSON Lines extract (e.g. from Pipe2json.py) straight to a fax-named PDF,
+# with no per-report JSON files. --part K/N renders the K-th of N byte ranges (run N copies to split a big extract);
+# --start/--end take byte offsets, and the log gives the offset to --start from after more records are appended:
+#     python ORU2pdf.py --jsonl reports.jsonl [--part K/N | --start BYTES [--end BYTES]]
+# Updated: Each report is rendered straight to its fax-named PDF (written as a hidden .part file, then renamed, so the
+# fax pickup never sees half a PDF) and its JSON filed in json_dir in one step. This also fixes the old bug where a
+# second report in one run kept its original PDF name: the rename pass re-listed every PDF in pdf_dir, hit one already
+# renamed, and stopped. A latency line is logged per report. No directory rescans or fixed sleeps:
+#     python ORU2pdf.py /var/lib/filemonitor/FAX/FAX_123.json ...    # just these reports (what filemonitor.sh does)
+#     python ORU2pdf.py --serve [socket_path]                         # resident worker fed by worker_socket.py
+#     python ORU2pdf.py                                               # every .json/.txt report in `directory`
+# Updated: The page layout is built once and the logo is converted to JPEG once per process (pdfme re-decoded the PNG
+# for every PDF); LOGO_MAX_WIDTH caps its resolution at what a fax can show. --batch renders a whole directory of
+# reports in one invocation across a process pool and reports the throughput:
+#     python ORU2pdf.py --batch /var/lib/filemonitor/FAX [--workers N]
+# Each report is locked (claim_report) while it is rendered, so a batch next to the resident worker never renders,
+# and the fax server never sends, the same report twice; a report claimed or filed by the other process is skipped.
+# Updated: Reports are read once and decoded as UTF-8 (BOM or not); chardet now only runs, on a DETECT_BYTES window,
+# for the rare report that isn't UTF-8, instead of over every whole file before a second read to parse it.
+
+import time
+
+_STARTED = time.perf_counter()  # before the heavy imports, so cold-start cost shows up in the latency log
 
 import json
 import logging
 import os
-import time
 import glob
-import chardet
+import fcntl
+import sys
+import codecs
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
 from pdfme import build_pdf
 
+import jsonl
+from worker_socket import serve
+
 # Isolated log file for this script (filemonitor redirects here; no need to clutter main log)
 LOG_DIR = "/var/lib/filemonitor/FAX/logs"
 LOG_FILE = os.path.join(LOG_DIR, "ORU2pdf.log")
@@ -43,28 +71,58 @@ def process_json_data(json_data):
 
     return "\n".join(processed_lines)
 
+# Layout shared by every report; pdfme only reads these, so one copy serves every PDF (sections are built per report)
+DOCUMENT_STYLE = {
+    "margin_bottom": 15, "text_align": "j",
+    "page_size": "letter", "margin": [60, 50]
+}
+DOCUMENT_FORMATS = {
+    "url": {"c": "blue", "u": 1},
+    "title": {"b": 1, "s": 13}
+}
+RUNNING_SECTIONS = {
+    "footer": {
+        "x": "left", "y": 740, "height": "bottom", "style": {"text_align": "c"},
+        "content": [{".": ["Page ", {"var": "$page"}]}]
+    }
+}
+
+_logo = None
+
+def logo_image():
+    """
+    pdfme image element for the logo. pdfme re-reads a PNG logo and re-encodes it to JPEG with Pillow for every PDF;
+    here that happens once per process, and each PDF embeds the cached JPEG stream as is (DCTDecode, no re-encoding).
+    A logo wider than LOGO_MAX_WIDTH pixels is scaled down to it first.
+    """
+    global _logo
+    if _logo is None:
+        from PIL import Image
+
+        with Image.open(logo_path) as im:
+            if im.format == "JPEG" and im.width <= LOGO_MAX_WIDTH:
+                with open(logo_path, "rb") as f:
+                    _logo = f.read()
+            else:
+                im = im.convert("RGB")
+                if im.width > LOGO_MAX_WIDTH:
+                    im = im.resize((LOGO_MAX_WIDTH, round(im.height * LOGO_MAX_WIDTH / im.width)), Image.LANCZOS)
+                buffer = BytesIO()
+                im.save(buffer, "JPEG")
+                _logo = buffer.getvalue()
+    return {"image": BytesIO(_logo), "extension": "jpg", "image_name": "logo"}
+
 def create_pdf_from_json(json_data, filename, pdf_dir):
     document = {
-        "style": {
-            "margin_bottom": 15, "text_align": "j",
-            "page_size": "letter", "margin": [60, 50]
-        },
-        "formats": {
-            "url": {"c": "blue", "u": 1},
-            "title": {"b": 1, "s": 13}
-        },
-        "running_sections": {
-            "footer": {
-                "x": "left", "y": 740, "height": "bottom", "style": {"text_align": "c"},
-                "content": [{".": ["Page ", {"var": "$page"}]}]
-            }
-        },
+        "style": DOCUMENT_STYLE,
+        "formats": DOCUMENT_FORMATS,
+        "running_sections": RUNNING_SECTIONS,
         "sections": [
             {
                 "style": {"page_numbering_style": "roman"},
                 "running_sections": ["footer"],
                 "content": [
-                    {"image": "/opt/radx-workflow/photos/radxsulogo.png"},
+                    logo_image(),
                     json_data
                 ],
             }
@@ -72,86 +130,233 @@ def create_pdf_from_json(json_data, filename, pdf_dir):
     }
 
     output_filename = os.path.join(pdf_dir, os.path.splitext(filename)[0] + ".pdf")
+    partial_filename = os.path.join(pdf_dir, f".{os.path.basename(output_filename)}.part")
 
-    with open(output_filename, 'wb') as f:
-        build_pdf(document, f)
-
-def read_json_data(directory, pdf_dir, json_dir):
-    for filename in glob.glob(f"{directory}/*.json"):
-        try:
-            with open(filename, 'rb') as file:
-                result = chardet.detect(file.read())
-                encoding = result['encoding']
-
-            with open(filename, 'r', encoding=encoding) as file:
-                json_data = json.load(file)
-
-            processed_content = process_json_data(json_data)
-
-            create_pdf_from_json(processed_content, os.path.basename(filename), pdf_dir)
+    try:
+        with open(partial_filename, 'wb') as f:
+            build_pdf(document, f)
+        os.replace(partial_filename, output_filename)
+    except BaseException:
+        if os.path.exists(partial_filename):
+            os.unlink(partial_filename)
+        raise
+    return output_filename
 
-            new_filename = os.path.join(json_dir, os.path.basename(filename))
-            os.rename(filename, new_filename)
-            log.info("Converted JSON to PDF and moved JSON: %s -> %s", os.path.basename(filename), json_dir)
+def decode_report(data):
+    """
+    Text of a report read as bytes. UTF-8 (with or without a BOM) and UTF-16 with a BOM are decoded directly; only
+    bytes that aren't valid UTF-8 go to chardet, and then just DETECT_BYTES of them, starting at the first byte UTF-8
+    rejected (a prefix of plain ASCII would tell it nothing).
+    """
+    if data.startswith(codecs.BOM_UTF8):
+        data = data[len(codecs.BOM_UTF8):]
+    elif data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return data.decode("utf-16")
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        bad = e.start
 
-        except FileNotFoundError:
-            log.error("File not found: %s", filename)
-        except json.JSONDecodeError as e:
-            log.error("Invalid JSON in %s: %s", filename, e)
+    import chardet  # only needed for the odd non-UTF-8 report; keeps it out of start-up
 
-def rename_pdfs_with_json_key(pdf_dir, json_dir, fax_key, accn_key):
-    for filename in os.listdir(pdf_dir):
-        if not filename.endswith(".pdf"):
-            continue
+    encoding = chardet.detect(data[bad:bad + DETECT_BYTES])["encoding"] or "cp1252"
+    log.info("Report is not UTF-8; decoding as %s", encoding)
+    return data.decode(encoding, errors="replace")
 
-        pdf_path = os.path.join(pdf_dir, filename)
-        json_path = os.path.join(json_dir, f"{os.path.splitext(filename)[0]}.json")
+def load_json_file(path):
+    """Read a report once and parse it from the same buffer."""
+    with open(path, 'rb') as file:
+        return json.loads(decode_report(file.read()))
 
-        if rename_pdf_with_json_key(pdf_path, json_path, fax_key, accn_key):
-            time.sleep(0.5)
-        else:
-            log.error("Failed to rename PDF: %s", filename)
+def _stage_done(timings, stage, since):
+    """Record how long `stage` took (when timings are being collected) and return the time it ended."""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = now - since
+    return now
 
-def rename_pdf_with_json_key(pdf_path, json_path, fax_key, accn_key):
-    filename, _ = os.path.splitext(os.path.basename(pdf_path))
-    json_path = os.path.join(json_dir, f"{filename}.json")
+def claim_report(path):
+    """
+    Take an exclusive, non-blocking lock on the report so the resident worker, a single run and --batch never render
+    the same report twice. Returns the locked file descriptor, or None if another process holds the lock or the file
+    has already been moved away. Hold it until the report has been filed.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        # The previous holder may have finished and moved the file between our open() and flock()
+        if os.fstat(fd).st_ino != os.stat(path).st_ino:
+            raise OSError("file was replaced")
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
 
+def process_report(path, timings=None):
+    """
+    Render one report (FAX_*.json, or a .txt holding the JSON) straight to its fax-named PDF in pdf_dir and move the
+    report to json_dir as <name>.json. Returns True on success, False on failure (the report is left where it is),
+    None if another process is handling it or has already filed it. Pass a dict as `timings` to get the
+    parse/render/file durations (seconds) back.
+    """
+    lock_fd = claim_report(path)
+    if lock_fd is None:
+        if not os.path.exists(path):
+            if os.path.exists(os.path.join(json_dir, os.path.splitext(os.path.basename(path))[0] + ".json")):
+                log.info("Skipping %s: no longer there, already processed", path)
+                return None
+            log.error("File not found: %s", path)
+            return False
+        if not os.access(path, os.R_OK):
+            log.error("Could not read %s: permission denied", path)
+            return False
+        log.info("Skipping %s: already being processed by another worker", path)
+        return None
     try:
-        with open(json_path, 'rb') as f:
-            result = chardet.detect(f.read())
-            encoding = result['encoding']
+        return _render_report(path, timings)
+    finally:
+        os.close(lock_fd)
 
-        with open(json_path, 'r', encoding=encoding) as f:
-            json_data = json.load(f)
+def _render_report(path, timings):
+    """Parse, render and file a report the caller has claimed."""
+    filename = os.path.basename(path)
+    stem = os.path.splitext(filename)[0]
+    stage_start = time.perf_counter()
+    try:
+        json_data = load_json_file(path)
+    except (OSError, UnicodeError, LookupError) as e:
+        log.error("Could not read %s: %s", path, e)
+        return False
     except json.JSONDecodeError as e:
-        log.error("Invalid JSON in %s: %s", json_path, e)
+        log.error("Invalid JSON in %s: %s", path, e)
         return False
+    stage_start = _stage_done(timings, "parse", stage_start)
 
+    pdf_name = fax_pdf_name(json_data, fax_key, accn_key) if isinstance(json_data, dict) else None
+    if pdf_name is None:
+        log.warning("Key(s) '%s' or '%s' missing or empty in %s; using original filename.", fax_key, accn_key, filename)
+        pdf_name = stem
     try:
-        fax_value = json_data[fax_key]
-        new_fax_value = json_data[fax_key].replace("-", "")
-        accn_value = json_data[accn_key]
-        new_name = f"fax={{1{new_fax_value}}}ACCN-{accn_value}"
-    except KeyError:
-        log.warning("Key(s) '%s' or '%s' not found in JSON; using original filename.", fax_key, accn_key)
-        new_name = os.path.splitext(filename)[0]
-
-    new_pdf_path = os.path.join(os.path.dirname(pdf_path), f"{new_name}.pdf")
+        create_pdf_from_json(process_json_data(json_data), f"{pdf_name}.pdf", pdf_dir)
+    except Exception as e:
+        log.error("Failed to render %s: %s", filename, e)
+        return False
+    stage_start = _stage_done(timings, "render", stage_start)
 
     try:
-        os.rename(pdf_path, new_pdf_path)
-        log.info("PDF renamed: %s -> %s %s", filename, new_name, check_mark)
-        return True
+        os.rename(path, os.path.join(json_dir, f"{stem}.json"))
     except OSError as e:
-        log.error("Rename failed: %s", e)
+        log.error("Rendered %s but could not move it to %s: %s", filename, json_dir, e)
         return False
+    _stage_done(timings, "file", stage_start)
+    log.info("Converted %s -> %s.pdf, JSON moved to %s %s", filename, pdf_name, json_dir, check_mark)
+    return True
+
+def process_report_timed(path, cold_start=False):
+    """
+    process_report plus a per-report latency line in the log (cold_start adds interpreter/import time).
+    A report skipped because another process holds or has filed it counts as success; that process reports the outcome.
+    """
+    timings = {}
+    start = time.perf_counter()
+    success = process_report(path, timings)
+    end = time.perf_counter()
+    stages = ", ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in timings.items())
+    if cold_start:
+        log.info("Latency %s: %.0f ms (%s), %.0f ms incl. startup (cold start)",
+                 os.path.basename(path), (end - start) * 1000, stages, (end - _STARTED) * 1000)
+    else:
+        log.info("Latency %s: %.0f ms (%s) (resident worker)", os.path.basename(path), (end - start) * 1000, stages)
+    return success is not False
+
+def read_json_data(directory):
+    """Process every .json/.txt report waiting in `directory`. Returns True if none failed."""
+    paths = sorted(glob.glob(os.path.join(directory, "*.json")) + glob.glob(os.path.join(directory, "*.txt")))
+    results = [process_report(path) for path in paths]
+    return False not in results
+
+def fax_pdf_name(json_data, fax_key, accn_key):
+    """PDF name (no extension) the fax server routes on, or None if the report lacks either key or they are null."""
+    try:
+        fax, accession = json_data[fax_key], json_data[accn_key]
+    except (KeyError, TypeError):
+        return None
+    if fax is None or accession is None or isinstance(fax, (dict, list)):
+        return None
+    return f"fax={{1{str(fax).replace('-', '')}}}ACCN-{accession}"
+
+def render_jsonl(jsonl_file, pdf_dir, start=0, end=None):
+    """
+    Render every record of a JSON Lines file whose line starts in bytes [start, end) to a fax-named PDF in pdf_dir
+    (named <file>@<offset>.pdf when the fax/accession keys are missing). A bad record is logged and skipped.
+    Returns (rendered, failed).
+    """
+    if end is None:
+        end = os.path.getsize(jsonl_file)  # records appended while we run are left for the next --start
+    stem = os.path.splitext(os.path.basename(jsonl_file))[0]
+    rendered = failed = 0
+    log.info("Rendering %s bytes %d-%d to %s", jsonl_file, start, end, pdf_dir)
+    for offset, json_data in jsonl.iter_records(jsonl_file, start, end, skip_invalid=True):
+        name = fax_pdf_name(json_data, fax_key, accn_key) if isinstance(json_data, dict) else None
+        if name is None:
+            log.warning("Record at byte %d lacks '%s' or '%s' (or null); naming it by offset.", offset, fax_key, accn_key)
+            name = f"{stem}@{offset}"
+        try:
+            create_pdf_from_json(process_json_data(json_data), f"{name}.pdf", pdf_dir)
+        except Exception as e:
+            log.error("Failed to render record at byte %d of %s: %s", offset, jsonl_file, e)
+            failed += 1
+            continue
+        log.info("Rendered record at byte %d -> %s.pdf %s", offset, name, check_mark)
+        rendered += 1
+    log.info("Rendered %d records from %s (%d failed); resume with --start %d", rendered, jsonl_file, failed, end)
+    return rendered, failed
 
-def convert_txt_to_json(directory):
-    for txt_filename in glob.glob(os.path.join(directory, "*.txt")):
-        json_filename = os.path.splitext(txt_filename)[0] + ".json"
-        os.rename(txt_filename, json_filename)
-        log.info("Converted txt to JSON: %s -> %s %s", os.path.basename(txt_filename), os.path.basename(json_filename), check_mark)
-        time.sleep(0.5)
+def _batch_report(path):
+    """--batch task: process_report in a pool worker, returns (result, seconds)."""
+    start = time.perf_counter()
+    result = process_report(path)
+    return result, time.perf_counter() - start
+
+def _percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))]
+
+def run_batch(directory, workers=None):
+    """
+    Render every .json/.txt report in `directory` in this one invocation, across `workers` processes (default: one per
+    CPU). The layout and logo are prepared once, before the workers start. Reports another process has claimed or
+    filed since the listing are skipped. Prints and logs a throughput summary. Returns True if no report failed.
+    """
+    paths = sorted(glob.glob(os.path.join(directory, "*.json")) + glob.glob(os.path.join(directory, "*.txt")))
+    workers = workers or os.cpu_count() or 1
+    log.info("Batch started: %d report(s) in %s, %d worker(s)", len(paths), directory, workers)
+    logo_image()
+
+    start = time.perf_counter()
+    if workers == 1 or len(paths) < 2:
+        results = [_batch_report(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_batch_report, paths, chunksize=8))
+    wall = time.perf_counter() - start
+
+    ok = sum(1 for result, _ in results if result)
+    err = sum(1 for result, _ in results if result is False)
+    processed = ok + err
+    lines = [f"Batch finished in {wall:.1f} s: {ok} ok, {err} err, {len(results) - processed} skipped "
+             f"({processed / wall if wall else 0:.1f} reports/s)"]
+    times = [seconds for result, seconds in results if result is not None]
+    if times:
+        lines.append(f"  report p50 {_percentile(times, 50) * 1000:.1f} ms   p95 {_percentile(times, 95) * 1000:.1f} ms")
+    for line in lines:
+        print(line)
+        log.info(line)
+    return err == 0
 
 
 directory = "/var/lib/filemonitor/FAX"
@@ -161,11 +366,43 @@ json_dir = "/var/lib/filemonitor/FAX/json"
 os.makedirs(json_dir, exist_ok=True)
 fax_key = "Fax"
 accn_key = "Accession"
+logo_path = "/opt/radx-workflow/photos/radxsulogo.png"
+DETECT_BYTES = 4096  # bytes chardet looks at when a report isn't UTF-8
+LOGO_MAX_WIDTH = 1424  # pixels: the logo spans the 512 pt text width, and 1424 px there is 200 dpi, fax fine mode
+
+# Unix socket the resident worker (--serve) listens on; filemonitor.sh sends report paths here
+FAX_WORKER_SOCKET = os.environ.get("FAX_WORKER_SOCKET", "/run/filemonitor/ORU2pdf.sock")
+
+def _option(name, default=None):
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else default
+
+if __name__ == "__main__" and "--jsonl" in sys.argv:
+    jsonl_file = _option("--jsonl")
+    if "--part" in sys.argv:
+        part, parts = (int(n) for n in _option("--part").split("/"))
+        start, end = jsonl.split_offsets(jsonl_file, parts)[part - 1]
+    else:
+        start = int(_option("--start", 0))
+        end = int(_option("--end")) if "--end" in sys.argv else None
+    rendered, failed = render_jsonl(jsonl_file, pdf_dir, start, end)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__" and "--serve" in sys.argv:
+    socket_path = sys.argv[2] if len(sys.argv) > 2 else FAX_WORKER_SOCKET
+    log.info("ORU2pdf worker starting (startup %.0f ms)", (time.perf_counter() - _STARTED) * 1000)
+    serve(socket_path, process_report_timed)
+    sys.exit(0)
+
+if __name__ == "__main__" and "--batch" in sys.argv:
+    workers = int(_option("--workers")) if "--workers" in sys.argv else None
+    sys.exit(0 if run_batch(_option("--batch", directory), workers) else 1)
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    results = [process_report_timed(path, cold_start=True) for path in sys.argv[1:]]
+    sys.exit(0 if all(results) else 1)
 
 if __name__ == "__main__":
     log.info("ORU2pdf run started; directory=%s, pdf_dir=%s, json_dir=%s", directory, pdf_dir, json_dir)
-    convert_txt_to_json(directory)
-    time.sleep(1)
-    read_json_data(directory, pdf_dir, json_dir)
-    rename_pdfs_with_json_key(pdf_dir, json_dir, fax_key, accn_key)
-    log.info("ORU2pdf run completed.")
\ No newline at end of file
+    ok = read_json_data(directory)
+    log.info("ORU2pdf run completed.")
+    sys.exit(0 if ok else 1)
\ No newline at end of file
@@ -1,54 +1,215 @@
 # This script reads a pipe-delimited HL7 flat file and converts it to multiple JSON files.
 # Each JSON file contains a specified number of blocks from the pipe-delimited file. This is useful for processing large files in smaller chunks and can be easily modified to suit your needs by changing the delimiter, max_blcks variable, and output format.
+# Updated: the file is read in ~1 MB blocks of lines, split with str.split (csv only for lines with quoting), and a
+# note's continuation lines are collected in a list and joined once (no repeated string +=). Shards are compact JSON by
+# default; --pretty keeps the indent=4 layout and --jsonl writes one entry per line (JSON Lines / NDJSON). Runs from the
+# command line:
+#     python Pipe2json.py data.pipe data [max_blocks] [--pretty | --jsonl]
+# Updated: --workers N hands finished shards to N worker processes that encode and write them while reading continues
+# (same shard numbering and content; the reader waits once 2 shards per worker are queued).
+# Updated: a base name ending in .jsonl streams every entry into that one JSON Lines file, appending if it exists
+# (no shards, nothing held in memory); ORU2pdf.py --jsonl renders such a file directly:
+#     python Pipe2json.py data.pipe notes.jsonl
 
 import csv
 import json
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
 
-def pipe_delimited_to_json(pipe_delimited_file, base_json_file, max_blocks):
-    entries = []
-    current_entry = None
-    block_counter = 0
-    file_counter = 1
+import jsonl
 
-    def save_entries_to_file(entries, file_counter):
-        file_name = f"{base_json_file}_{file_counter}.json"
-        with open(file_name, 'w') as f:
-            json.dump(entries, f, indent=4)
-        print(f"Saved {len(entries)} entries to {file_name}")
-
-    with open(pipe_delimited_file, 'r') as f:
-        reader = csv.DictReader(f, delimiter='|')
-        
-        for row in reader:
-            if current_entry is None or row['LINE'] == '1':
-                # Save the current entry if it exists
-                if current_entry:
-                    entries.append(current_entry)
-                    block_counter += 1
-
-                # Start a new entry
-                current_entry = {k: v for k, v in row.items() if k != 'NOTE_TEXT' and k != 'LINE'}
-                current_entry['NOTE_TEXT'] = row['NOTE_TEXT']
-                
-                # Check if we need to save to a new file
-                if block_counter == max_blocks:
-                    save_entries_to_file(entries, file_counter)
-                    entries = []
-                    block_counter = 0
-                    file_counter += 1
+READ_BUFFER = 1 << 20  # bytes read from the pipe file at a time
+
+OUTPUT_FORMATS = ("json", "jsonl")
+
+# --workers: shards queued per worker process before the reader waits (bounds memory to a few shards)
+PENDING_SHARDS_PER_WORKER = 2
+
+
+def read_row_blocks(f):
+    """
+    Rows of the open pipe file, exactly as csv.reader(f, delimiter='|') gives them, in lists of about READ_BUFFER bytes.
+    Lines without a quote character are split with str.split, which is much faster; a line with one goes through csv
+    (pulling in further lines when a quoted field spans them).
+    """
+    while True:
+        lines = f.readlines(READ_BUFFER)
+        if not lines:
+            return
+        if '"' not in "".join(lines):
+            # [] for a blank line, as csv.reader gives
+            yield [line.rstrip('\n').split('|') if line != '\n' else [] for line in lines]
+            continue
+        rows = []
+        block = iter(lines)
+        for line in block:
+            if '"' in line:
+                rows.append(next(csv.reader(chain([line], block, f), delimiter='|')))
             else:
-                # Aggregate the NOTE_TEXT for the current entry with a | at the start
-                current_entry['NOTE_TEXT'] += " | " + row['NOTE_TEXT']
-        
-        # Save the last set of entries
-        if current_entry:
-            entries.append(current_entry)
+                rows.append(line.rstrip('\n').split('|') if line != '\n' else [])
+        yield rows
+
+
+def iter_pipe_entries(pipe_delimited_file):
+    """
+    Yield one dict per block: the columns of its LINE == '1' row (minus LINE), with the NOTE_TEXT of every following
+    row appended as " | <text>". Same keys, values and order as csv.DictReader would give.
+    """
+    with open(pipe_delimited_file, 'r', buffering=READ_BUFFER) as f:
+        row_blocks = read_row_blocks(f)
+        first = next(row_blocks, None)
+        if not first:
+            return
+        header = first[0]
+
+        # DictReader semantics: a repeated column name keeps its first position and its last value
+        positions = {}
+        for i, name in enumerate(header):
+            positions[name] = i
+        keys = [k for k in positions if k != 'NOTE_TEXT' and k != 'LINE']
+        columns = [positions[k] for k in keys]
+        line_col = positions.get('LINE')
+        note_col = positions.get('NOTE_TEXT')
+        width = len(header)
+
+        entry = None
+        notes = None
+        for rows in chain([first[1:]], row_blocks):
+            for row in rows:
+                if len(row) != width:
+                    if not row:
+                        continue  # DictReader skips blank lines
+                    d = _as_dict_row(header, row)
+                    line, note = d['LINE'], d['NOTE_TEXT']
+                else:
+                    if line_col is None:
+                        raise KeyError('LINE')
+                    if note_col is None:
+                        raise KeyError('NOTE_TEXT')
+                    d = None
+                    line, note = row[line_col], row[note_col]
+
+                if entry is None or line == '1':
+                    if entry is not None:
+                        entry['NOTE_TEXT'] = notes[0] if len(notes) == 1 else " | ".join(notes)
+                        yield entry
+                    if d is None:
+                        entry = {k: row[i] for k, i in zip(keys, columns)}
+                    else:
+                        entry = {k: v for k, v in d.items() if k != 'NOTE_TEXT' and k != 'LINE'}
+                    notes = [note]
+                else:
+                    notes.append(note)
+
+        if entry is not None:
+            entry['NOTE_TEXT'] = notes[0] if len(notes) == 1 else " | ".join(notes)
+            yield entry
+
+
+def _as_dict_row(header, row):
+    """csv.DictReader's dict for a row whose length doesn't match the header (extra fields under None, missing None)."""
+    d = dict(zip(header, row))
+    if len(row) > len(header):
+        d[None] = row[len(header):]
+    else:
+        for key in header[len(row):]:
+            d[key] = None
+    return d
+
+
+def encode_entries(entries, output_format="json", pretty=False):
+    """Text of one shard: a JSON array (compact, or indent=4 with `pretty`) or one JSON entry per line (jsonl)."""
+    if output_format == "jsonl":
+        return "".join(map(jsonl.dumps_record, entries))
+    if pretty:
+        return json.dumps(entries, indent=4)
+    return json.dumps(entries, separators=(',', ':'))
+
+
+def write_shard(file_name, entries, output_format="json", pretty=False):
+    """Encode and write one shard; returns (file_name, number of entries). Runs in a pool worker with --workers."""
+    with open(file_name, 'w') as f:
+        f.write(encode_entries(entries, output_format, pretty))
+    return file_name, len(entries)
+
+
+def pipe_delimited_to_json(pipe_delimited_file, base_json_file, max_blocks, output_format="json", pretty=False,
+                           workers=0):
+    """
+    Write the blocks of the pipe file to {base_json_file}_1.json, _2.json, ... with up to max_blocks entries each.
+    With workers > 1, shards are encoded and written by that many worker processes while reading goes on; numbering
+    and content are the same, and at most PENDING_SHARDS_PER_WORKER shards per worker are held in memory.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}")
+    extension = "jsonl" if output_format == "jsonl" else "json"
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    pending = deque()
+
+    def finish_oldest():
+        file_name, count = pending.popleft().result()
+        print(f"Saved {count} entries to {file_name}")
+
+    def save_entries_to_file(entries, file_counter):
+        file_name = f"{base_json_file}_{file_counter}.{extension}"
+        if pool is None:
+            print(f"Saved {write_shard(file_name, entries, output_format, pretty)[1]} entries to {file_name}")
+            return
+        # backpressure: wait for the oldest shard before queueing more than the workers can take
+        while len(pending) >= workers * PENDING_SHARDS_PER_WORKER:
+            finish_oldest()
+        pending.append(pool.submit(write_shard, file_name, entries, output_format, pretty))
+
+    try:
+        entries = []
+        file_counter = 1
+        for entry in iter_pipe_entries(pipe_delimited_file):
+            entries.append(entry)
+            if len(entries) == max_blocks:
+                save_entries_to_file(entries, file_counter)
+                entries = []
+                file_counter += 1
         if entries:
             save_entries_to_file(entries, file_counter)
+        while pending:
+            finish_oldest()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def pipe_delimited_to_jsonl(pipe_delimited_file, jsonl_file):
+    """Append every block of the pipe file to the JSON Lines file `jsonl_file` as it is read; returns the count."""
+    count = jsonl.append_records(jsonl_file, iter_pipe_entries(pipe_delimited_file))
+    print(f"Saved {count} entries to {jsonl_file}")
+    return count
 
-# Example usage
+
+# Example usage (defaults when run without arguments)
 pipe_delimited_file = 'data.pipe'  # Replace with your pipe-delimited file path
 base_json_file = 'data'  # Base name for your JSON files
 max_blocks = 100  # Maximum number of blocks per file
 
-pipe_delimited_to_json(pipe_delimited_file, base_json_file, max_blocks)
\ No newline at end of file
+if __name__ == "__main__":
+    workers = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else 0
+    argv = [a for i, a in enumerate(sys.argv) if i == 0 or sys.argv[i - 1] != "--workers"]
+    args = [a for a in argv[1:] if not a.startswith("--")]
+    if len(args) > 3 or ("--pretty" in argv and "--jsonl" in argv):
+        print("Usage: Pipe2json.py [pipe_file base_name [max_blocks]] [--pretty | --jsonl] [--workers N]\n"
+              "       Pipe2json.py pipe_file output.jsonl")
+        sys.exit(1)
+    if args:
+        pipe_delimited_file = args[0]
+        base_json_file = args[1] if len(args) > 1 else base_json_file
+        max_blocks = int(args[2]) if len(args) > 2 else max_blocks
+
+    if base_json_file.endswith(".jsonl"):
+        pipe_delimited_to_jsonl(pipe_delimited_file, base_json_file)
+        sys.exit(0)
+
+    pipe_delimited_to_json(pipe_delimited_file, base_json_file, max_blocks,
+                           output_format="jsonl" if "--jsonl" in argv else "json",
+                           pretty="--pretty" in argv, workers=workers)
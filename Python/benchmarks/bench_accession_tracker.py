@@ -0,0 +1,193 @@
+"""
+Benchmark: hl7_accession_tracker against the algorithm of PowerShell/HL7-Accession-MRN-Tracker.ps1.
+
+PowerShell isn't needed: "ps1 algorithm" below is a line-for-line transliteration of the script's data handling into
+Python -- arrays grown with `@() +=` (a full copy per append), `-notcontains` linear scans over the lines to remove,
+and Remove-LinesFromFile rebuilding the whole line array once per removed line. Python runs those steps faster than
+PowerShell does, so its times are a lower bound for the real script.
+
+Builds --files flat files holding "Text Files/sampleHL7FlatFile.txt" repeated --scale times in total. Each copy gets
+its own accession numbers, except that in every run of 20 copies, copies 10-14 share theirs (5 occurrences, above
+the threshold of 4), so a quarter of the messages are duplicates to report and remove. Then it times
+  - ps1 algorithm at --legacy-scale copies (it's quadratic in the lines removed; 1000x would take hours)
+  - hl7_accession_tracker at --legacy-scale and at --scale copies
+and checks that at --legacy-scale both report the same duplicates and leave the same files.
+
+Usage:
+    python bench_accession_tracker.py [--scale 1000] [--legacy-scale 20] [--files 4] [--work-dir DIR]
+"""
+
+import argparse
+import contextlib
+import filecmp
+import io
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hl7_accession_tracker import track_accessions  # noqa: E402
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                      "Text Files", "sampleHL7FlatFile.txt")
+
+
+def make_folder(folder, scale, files):
+    with open(SAMPLE, encoding="utf-8") as f:
+        sample = f.read().rstrip("\n") + "\n"
+    accessions = set()
+    for line in sample.splitlines():
+        fields = line.split("|")
+        if fields[0] in ("OBR", "ORC"):
+            accessions.update(v.split("^")[0] for v in fields[2:4] if v.strip())
+    pattern = re.compile("|".join(sorted(map(re.escape, accessions), key=len, reverse=True)))
+    os.makedirs(folder)
+    outputs = [open(os.path.join(folder, f"priors_{n}.txt"), "w", encoding="utf-8") for n in range(files)]
+    try:
+        for copy in range(scale):
+            suffix = f"G{copy // 20}" if 10 <= copy % 20 < 15 else f"C{copy}"
+            outputs[copy * files // scale].write(pattern.sub(lambda m: m.group(0) + suffix, sample))
+    finally:
+        for out in outputs:
+            out.close()
+
+
+def ps1_algorithm(input_folder, output_file, threshold=4):
+    """HL7-Accession-MRN-Tracker.ps1, transliterated with its data structures (see the module docstring)."""
+    field_counts = {"OBR-2": {}, "OBR-3": {}, "ORC-2": {}, "ORC-3": {}}
+    accession_occurrences, accession_files, accession_counts = {}, {}, {}
+    lines_to_remove, duplicate_accessions, line_accessions = {}, {}, {}
+    message_lines, line_message_ids = {}, {}
+
+    def value(fields, index):
+        return fields[index].strip() if len(fields) > index else ""
+
+    def track(accession, mrn, file_name, file_path, line_number):
+        accession_counts[accession] = accession_counts.get(accession, 0) + 1
+        occurrences = accession_occurrences.setdefault(accession, {})
+        occurrences[mrn] = occurrences.get(mrn, 0) + 1
+        names = accession_files.setdefault(accession, {})
+        names[file_name] = names.get(file_name, 0) + 1
+        lines = line_accessions[file_path]
+        lines[line_number] = lines.get(line_number, []) + [accession]  # @() +=
+
+    paths = sorted(os.path.join(input_folder, f) for f in os.listdir(input_folder))
+    for file_path in paths:
+        file_name = os.path.basename(file_path)
+        current_mrn = ""
+        line_accessions[file_path], message_lines[file_path], line_message_ids[file_path] = {}, {}, {}
+        message = 0
+        with open(file_path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if len(line) < 3:
+                    continue
+                segment = line[:3]
+                if segment == "MSH":
+                    message += 1
+                if message == 0:
+                    message = 1
+                message_lines[file_path][message] = message_lines[file_path].get(message, []) + [line_number]
+                line_message_ids[file_path][line_number] = message
+                fields = line.split("|")
+                if segment == "PID":
+                    current_mrn = value(fields, 2) or value(fields, 3)
+                elif segment in ("ORC", "OBR"):
+                    mrn = current_mrn or "<no MRN>"
+                    for index in (2, 3):
+                        accession = value(fields, index)
+                        counts = field_counts[f"{segment}-{index}"]
+                        counts[accession or "<empty>"] = counts.get(accession or "<empty>", 0) + 1
+                        if accession:
+                            track(accession, mrn, file_name, file_path, line_number)
+
+    duplicates = []
+    for accession, count in accession_counts.items():
+        if count > threshold:
+            duplicate_accessions[accession] = True
+            mrn_info = [f"No MRN ({c} time(s))" if m == "<no MRN>" else f"{m} ({c} time(s))"
+                        for m, c in accession_occurrences[accession].items()]
+            file_info = [f"{n} ({c} time(s))" for n, c in accession_files[accession].items()]
+            duplicates.append(f"Duplicate Accession: {accession} (appears {count} time(s))"
+                              f"{' - MRNs: ' + ', '.join(mrn_info) if mrn_info else ''}"
+                              f"{' - Files: ' + ', '.join(file_info) if file_info else ''}")
+
+    for file_path, lines in line_accessions.items():
+        lines_to_remove[file_path] = []
+        for line_number, accessions in lines.items():
+            for accession in accessions:
+                if accession in duplicate_accessions:
+                    for msg_line in message_lines[file_path][line_message_ids[file_path][line_number]]:
+                        if msg_line not in lines_to_remove[file_path]:  # -notcontains
+                            lines_to_remove[file_path] = lines_to_remove[file_path] + [msg_line]  # @() +=
+                    break
+
+    for file_path, numbers in lines_to_remove.items():
+        if not numbers:
+            continue
+        with open(file_path, encoding="utf-8") as f:
+            all_lines = f.read().splitlines()
+        for line_number in sorted(numbers, reverse=True):
+            if line_number <= len(all_lines):
+                all_lines = all_lines[:line_number - 1] + all_lines[line_number:]  # Remove-LinesFromFile
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in all_lines))
+
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("".join(line + "\n" for line in duplicates) if duplicates else "No duplicates found.\n")
+
+
+def timed(run, folder, output_file):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run(folder, output_file)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=1000)
+    parser.add_argument("--legacy-scale", type=int, default=20)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--work-dir", default=None)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_accession_tracker_", dir=args.work_dir)
+    try:
+        for scale in (args.legacy_scale, args.scale):
+            source = os.path.join(work_dir, f"source{scale}")
+            make_folder(source, scale, args.files)
+            size = sum(entry.stat().st_size for entry in os.scandir(source))
+            print(f"{scale}x sample: {size / 1e6:.1f} MB in {args.files} files")
+            runs = [("hl7_accession_tracker", track_accessions)]
+            if scale == args.legacy_scale:
+                runs.insert(0, ("ps1 algorithm", ps1_algorithm))
+            results = []
+            for name, run in runs:
+                folder = os.path.join(work_dir, name)
+                shutil.copytree(source, folder)
+                output_file = os.path.join(work_dir, f"{name}.txt")
+                elapsed = timed(run, folder, output_file)
+                with open(output_file, encoding="utf-8") as f:
+                    report = sorted(f.read().splitlines())
+                results.append((folder, report))
+                print(f"  {name:<22} {elapsed:8.2f} s  {len(report)} duplicates reported")
+            if len(results) == 2:
+                (old_folder, old_report), (new_folder, new_report) = results
+                _, mismatch, errors = filecmp.cmpfiles(old_folder, new_folder, sorted(os.listdir(source)),
+                                                       shallow=False)
+                if old_report != new_report or mismatch or errors:
+                    sys.exit("hl7_accession_tracker and the ps1 algorithm disagree")
+            for folder, _ in results:
+                shutil.rmtree(folder)
+            shutil.rmtree(source)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark/check prelimSR's StudyInstanceUID lookup against a local stand-in C-FIND SCP (pynetdicom).
+
+Approaches, each resolving --queries accessions (--repeat-rate of them repeats, like addenda/re-sends):
+    findscu           - DCMTK findscu per query (old behaviour; skipped when findscu isn't on PATH)
+    fresh association - FindClient opened and closed per query
+    persistent        - one FindClient, association reused
+    persistent+cache  - as above, fronted by StudyUIDCache
+
+Also checks that a PACS that stops answering costs at most the response timeout instead of hanging.
+
+Usage:
+    python bench_dicom_query.py [--queries 200] [--repeat-rate 0.3] [--scp-delay-ms 2]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydicom.dataset import Dataset  # noqa: E402
+from pynetdicom import AE, evt  # noqa: E402
+from pynetdicom.sop_class import StudyRootQueryRetrieveInformationModelFind  # noqa: E402
+
+from dicom_query import FindClient, FindError, StudyUIDCache, _no_delay  # noqa: E402
+
+HOST = "127.0.0.1"
+HANG_PREFIX = "HANG"
+
+
+def start_scp(port, delay):
+    """Stand-in PACS: every accession matches one study whose UID is derived from it; HANG* never gets an answer."""
+    def handle_find(event):
+        accession = str(event.identifier.get("AccessionNumber", ""))
+        if accession.startswith(HANG_PREFIX):
+            time.sleep(30)
+        time.sleep(delay)
+        match = Dataset()
+        match.QueryRetrieveLevel = "STUDY"
+        match.AccessionNumber = accession
+        match.StudyInstanceUID = "1.2.826.0.1.3680043.10.1." + str(sum(map(ord, accession)) * 7919 + len(accession))
+        yield 0xFF00, match
+
+    ae = AE(ae_title="STANDIN")
+    ae.add_supported_context(StudyRootQueryRetrieveInformationModelFind)
+    # Nagle off on the SCP side as well, as most PACS do; otherwise its delayed ACKs dominate every timing
+    return ae.start_server((HOST, port), block=False,
+                           evt_handlers=[(evt.EVT_C_FIND, handle_find), (evt.EVT_CONN_OPEN, _no_delay)])
+
+
+def run_findscu(accessions, port):
+    for accession in accessions:
+        subprocess.run(["findscu", "-S", "-k", "0008,0052=STUDY", "-k", f"0008,0050={accession}", "-k", "0020,000D",
+                        "-aet", "REPORTGEN", HOST, str(port)], capture_output=True, timeout=30, check=False)
+
+
+def run_fresh(accessions, port):
+    for accession in accessions:
+        with FindClient(HOST, port, "REPORTGEN") as client:
+            client.find_study_uid(accession)
+
+
+def run_persistent(accessions, port):
+    with FindClient(HOST, port, "REPORTGEN") as client:
+        for accession in accessions:
+            client.find_study_uid(accession)
+
+
+def run_cached(accessions, port):
+    cache = StudyUIDCache()
+    with FindClient(HOST, port, "REPORTGEN") as client:
+        for accession in accessions:
+            if cache.get(accession) is None:
+                cache.put(accession, client.find_study_uid(accession))
+    return cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--repeat-rate", type=float, default=0.3)
+    parser.add_argument("--scp-delay-ms", type=float, default=2)
+    parser.add_argument("--port", type=int, default=11113)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    accessions = []
+    for i in range(args.queries):
+        if accessions and rng.random() < args.repeat_rate:
+            accessions.append(rng.choice(accessions))
+        else:
+            accessions.append(f"{1000000 + i}RADXSU")
+
+    server = start_scp(args.port, args.scp_delay_ms / 1000)
+    try:
+        with FindClient(HOST, args.port, "REPORTGEN") as client:
+            uid = client.find_study_uid(accessions[0])
+        print(f"stand-in SCP on {HOST}:{args.port} answers: {uid}")
+
+        approaches = [("fresh association", run_fresh), ("persistent", run_persistent),
+                      ("persistent+cache", run_cached)]
+        if shutil.which("findscu"):
+            approaches.insert(0, ("findscu", run_findscu))
+        else:
+            print("findscu not found; skipping the DCMTK baseline")
+
+        print(f"{args.queries} lookups, {len(set(accessions))} distinct accessions")
+        print(f"{'approach':<20}{'total s':>10}{'ms/lookup':>12}")
+        for name, func in approaches:
+            start = time.perf_counter()
+            func(accessions, args.port)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<20}{elapsed:>10.2f}{elapsed / args.queries * 1000:>12.2f}")
+
+        client = FindClient(HOST, args.port, "REPORTGEN", response_timeout=1)
+        start = time.perf_counter()
+        try:
+            client.find_study_uid(HANG_PREFIX + "1")
+            outcome = "answered?"
+        except FindError as e:
+            outcome = f"FindError ({e})"
+        print(f"hung PACS with response_timeout=1: {outcome} after {time.perf_counter() - start:.1f} s")
+        uid = client.find_study_uid(accessions[0])
+        print(f"next query on a new association: {'ok' if uid else 'no match'} "
+              f"({client.associations_opened} associations opened)")
+        client.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
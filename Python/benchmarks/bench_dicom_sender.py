@@ -0,0 +1,157 @@
+"""
+Benchmark: sending DICOM files with dicom_sender against a storescu process per file.
+
+Writes --instances Secondary Capture files (--size x --size, 8-bit, uncompressed) and starts a local storescp stand-in
+(pynetdicom's, discarding what it receives; --no-scp to use one already listening on --host/--port). Then sends them
+  - storescu:          one `storescu` run per file, as filemonitor.sh does (--fork-instances of them; --storescu
+                       names the command, e.g. DCMTK's)
+  - new association:   dicom_sender.StoreClient in this process, but a new association for every file
+  - kept association:  dicom_sender.StoreClient, every file over one association
+  - N facilities:      dicom_sender.StoreClients from N threads, one calling AET (and association) per thread, the way
+                       PrelimSR files for N facilities are sent
+and prints instances/second and the speed-up over storescu. Every send must succeed.
+
+Needs pydicom, pynetdicom and numpy.
+
+Usage:
+    python bench_dicom_sender.py [--instances 500] [--fork-instances 50] [--size 512] [--facilities 4]
+                                 [--storescu storescu] [--host 127.0.0.1] [--port 11119] [--no-scp] [--work-dir DIR]
+"""
+
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, SecondaryCaptureImageStorage, generate_uid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dicom_sender  # noqa: E402
+
+CALLED_AET = "STORESCP"
+
+
+def make_instances(directory, count, size, seed=3):
+    rng = np.random.default_rng(seed)
+    study_uid, series_uid = generate_uid(), generate_uid()
+    paths = []
+    for n in range(count):
+        meta = FileMetaDataset()
+        meta.MediaStorageSOPClassUID = SecondaryCaptureImageStorage
+        meta.MediaStorageSOPInstanceUID = generate_uid()
+        meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        ds = Dataset()
+        ds.file_meta = meta
+        ds.SOPClassUID = SecondaryCaptureImageStorage
+        ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+        ds.StudyInstanceUID = study_uid
+        ds.SeriesInstanceUID = series_uid
+        ds.PatientName = f"DOE^JANE{n % 97}"
+        ds.PatientID = str(100000 + n)
+        ds.AccessionNumber = f"{n:010d}RADXSU"
+        ds.Modality = "OT"
+        ds.InstanceNumber = n + 1
+        ds.Rows = ds.Columns = size
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = "MONOCHROME2"
+        ds.BitsAllocated = ds.BitsStored = 8
+        ds.HighBit = 7
+        ds.PixelRepresentation = 0
+        ds.PixelData = rng.integers(0, 255, (size, size), dtype=np.uint8).tobytes()
+        path = os.path.join(directory, f"FAC{n % 10}_{n:06d}.dcm")
+        ds.save_as(path, enforce_file_format=True)
+        paths.append(path)
+    return paths
+
+
+def wait_for_port(host, port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                sys.exit(f"No SCP listening on {host}:{port}")
+            time.sleep(0.2)
+
+
+def send_storescu(command, host, port, paths):
+    for path in paths:
+        subprocess.run([command, "-aet", "BENCH", "-aec", CALLED_AET, host, str(port), path], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def send_client(host, port, paths, idle_timeout):
+    with dicom_sender.StoreClient(host, port, "BENCH", CALLED_AET, idle_timeout=idle_timeout) as client:
+        for path in paths:
+            client.send(path)
+        return client.associations_opened
+
+
+def send_facilities(host, port, paths, facilities):
+    senders = dicom_sender.StoreClients(host, port)
+    try:
+        with ThreadPoolExecutor(facilities) as pool:
+            list(pool.map(lambda n: [senders.send(path, f"FAC{n}", CALLED_AET) for path in paths[n::facilities]],
+                          range(facilities)))
+    finally:
+        senders.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--instances", type=int, default=500)
+    parser.add_argument("--fork-instances", type=int, default=50)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--facilities", type=int, default=4)
+    parser.add_argument("--storescu", default="storescu")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11119)
+    parser.add_argument("--no-scp", action="store_true")
+    parser.add_argument("--work-dir", default=None)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_dicom_sender_", dir=args.work_dir)
+    scp = None
+    try:
+        if not args.no_scp:
+            scp = subprocess.Popen([sys.executable, "-m", "pynetdicom", "storescp", str(args.port), "--ignore",
+                                    "-aet", CALLED_AET], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        paths = make_instances(work_dir, args.instances, args.size)
+        wait_for_port(args.host, args.port)
+        print(f"{len(paths)} instances of {os.path.getsize(paths[0]) / 1024:.0f} KB, SCP on {args.host}:{args.port}")
+
+        forked = paths[:args.fork_instances]
+        start = time.perf_counter()
+        send_storescu(args.storescu, args.host, args.port, forked)
+        baseline = len(forked) / (time.perf_counter() - start)
+        print(f"  {'storescu':<18} {len(forked):6d} files  {baseline:8.1f} instances/s")
+
+        runs = (
+            ("new association", lambda: send_client(args.host, args.port, paths, idle_timeout=0)),
+            ("kept association", lambda: send_client(args.host, args.port, paths, idle_timeout=60)),
+            (f"{args.facilities} facilities", lambda: send_facilities(args.host, args.port, paths, args.facilities)),
+        )
+        for name, run in runs:
+            start = time.perf_counter()
+            run()
+            rate = len(paths) / (time.perf_counter() - start)
+            print(f"  {name:<18} {len(paths):6d} files  {rate:8.1f} instances/s  {rate / baseline:6.1f}x storescu")
+    finally:
+        if scp is not None:
+            scp.terminate()
+            scp.wait()
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: hl7_field_profiler against counting one field per pass (the obr24counts / HL7-Field-Counter.ps1 way).
+
+Builds a flat file of about --size-mb MB by repeating "Text Files/sampleHL7FlatFile.txt", giving every message its own
+MSH-10 control id (a field with as many distinct values as messages, like free text), then profiles the default
+fields plus OBR-4.2 and MSH-10:
+  - per-field:  one pass over the file per field, counting every value in a dict (no bound)
+  - profiler:   profile_files with --workers 1 and each N in --workers, all fields in one pass
+and checks the results: exact fields must match the per-field counts, and for MSH-10 (past --max-values) every
+reported count must be within its error of the true count and no value above the floor may be missing.
+
+Usage:
+    python bench_hl7_field_profiler.py [--size-mb 256] [--workers 2 4] [--max-values 10000] [--work-dir DIR]
+"""
+
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hl7_field_profiler  # noqa: E402
+from hl7_field_profiler import EMPTY, compile_fields, profile_files  # noqa: E402
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                      "Text Files", "sampleHL7FlatFile.txt")
+FIELDS = hl7_field_profiler.fields + ["OBR-4.2", "MSH-10"]
+
+
+def make_flat_file(path, size_mb):
+    with open(SAMPLE, encoding="utf-8") as f:
+        sample = f.read().rstrip("\n") + "\n"
+    control_id = re.compile(r"^(MSH(?:\|[^|\n]*){8}\|)([^|\n]*)", re.MULTILINE)
+    target = size_mb * 1024 * 1024
+    copies = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while f.tell() < target:
+            f.write(control_id.sub(lambda m: f"{m.group(1)}{m.group(2)}C{copies}", sample))
+            copies += 1
+    return os.path.getsize(path)
+
+
+def count_field(path, spec):
+    """One pass over the file counting one field, the way the single-field scripts do."""
+    (segment, wanted), = compile_fields([spec]).items()
+    (_, position, component), = wanted
+    counts = Counter()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line[:3] != segment:
+                continue
+            values = line.split("|")
+            value = values[position].strip() if position < len(values) else ""
+            if component is not None and value:
+                components = value.split("^")
+                value = components[component - 1].strip() if component <= len(components) else ""
+            counts[value or EMPTY] += 1
+    return counts
+
+
+def check(name, counter, truth):
+    if counter.exact:
+        if counter.counts != dict(truth):
+            sys.exit(f"{name}: counts differ from the per-field pass")
+        return
+    for value, count in counter.counts.items():
+        if not count - counter.errors.get(value, 0) <= truth[value] <= count:
+            sys.exit(f"{name}: {value} counted {count}, true count {truth[value]}")
+    missing = [value for value, count in truth.items() if value not in counter.counts and count > counter.floor]
+    if missing:
+        sys.exit(f"{name}: {len(missing)} values above the floor missing")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--max-values", type=int, default=hl7_field_profiler.MAX_VALUES)
+    parser.add_argument("--work-dir", default=None)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_hl7_field_profiler_", dir=args.work_dir)
+    try:
+        source = os.path.join(work_dir, "flat.txt")
+        size = make_flat_file(source, args.size_mb)
+        print(f"{size / 1e6:.0f} MB flat file, {len(FIELDS)} fields, {os.cpu_count()} CPUs")
+
+        start = time.perf_counter()
+        truth = {spec: count_field(source, spec) for spec in FIELDS}
+        elapsed = time.perf_counter() - start
+        held = sum(len(counts) for counts in truth.values())
+        print(f"  per-field    {elapsed:7.2f} s  {size / 1e6 / elapsed:6.0f} MB/s  {held} values held")
+
+        for workers in [1] + args.workers:
+            start = time.perf_counter()
+            counters = profile_files([source], FIELDS, args.max_values, workers)
+            elapsed = time.perf_counter() - start
+            held = sum(len(counter.counts) for counter in counters.values())
+            print(f"  profiler x{workers:<2} {elapsed:7.2f} s  {size / 1e6 / elapsed:6.0f} MB/s  {held} values held")
+            for name, counter in counters.items():
+                check(f"{workers} workers {name}", counter, truth[name])
+        msh10 = counters["MSH-10"]
+        print(f"  MSH-10: {len(truth['MSH-10'])} distinct, sketch floor {msh10.floor}")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
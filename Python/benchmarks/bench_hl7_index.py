@@ -0,0 +1,134 @@
+"""
+Benchmark: answering "which messages carry accession X" from hl7_index against rescanning the archive.
+
+Builds an archive of --files flat files holding "Text Files/sampleHL7FlatFile.txt" repeated --scale times (each copy
+with its own accession numbers and MRNs), then times
+  - index:     FlatFileIndex.update on the whole archive (first build)
+  - append:    appending one more copy to one file and updating again (only the new messages are read)
+  - lookups:   --lookups random accession queries, reading each hit's message from disk
+  - scan:      the same accession found by reading every file start to end (what the .ps1 tools and
+               removeORUbydate.py do today), for a few of the queries
+and checks that every lookup returns the messages the scan finds.
+
+Usage:
+    python bench_hl7_index.py [--scale 2000] [--files 8] [--lookups 200] [--work-dir DIR]
+"""
+
+import argparse
+import os
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hl7_index import FlatFileIndex  # noqa: E402
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                      "Text Files", "sampleHL7FlatFile.txt")
+
+
+def sample_copies():
+    """A function copy(n) -> text of the sample with accessions and MRNs made unique to copy n, and the accessions."""
+    with open(SAMPLE, encoding="utf-8") as f:
+        sample = f.read().rstrip("\n") + "\n"
+    ids = set()
+    for line in sample.splitlines():
+        fields = line.split("|")
+        if fields[0] in ("OBR", "ORC"):
+            ids.update(v.split("^")[0] for v in fields[2:4] if v.strip())
+        elif fields[0] == "PID":
+            ids.update(v.split("^")[0] for v in fields[2:4] if v.strip())
+    pattern = re.compile("|".join(sorted(map(re.escape, ids), key=len, reverse=True)))
+    accessions = sorted({v.split("^")[0] for line in sample.splitlines() if line.startswith("OBR|")
+                         for v in [line.split("|")[3]] if v.strip()})
+    return (lambda n: pattern.sub(lambda m: f"{m.group(0)}X{n}", sample)), accessions
+
+
+def scan(paths, accession):
+    """(path, offset) of every message with `accession` as an OBR-3 value, by reading every file."""
+    needle = f"|{accession}|".encode()
+    hits = []
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        pos = data.find(needle)
+        while pos >= 0:
+            line_start = data.rfind(b"\n", 0, pos) + 1
+            if data.startswith(b"OBR|", line_start):
+                start = data.rfind(b"\nMSH|", 0, pos) + 1
+                if not hits or hits[-1] != (path, start):
+                    hits.append((path, start))
+            pos = data.find(needle, pos + 1)
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=2000)
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--work-dir", default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    copy, accessions = sample_copies()
+    work_dir = tempfile.mkdtemp(prefix="bench_hl7_index_", dir=args.work_dir)
+    try:
+        archive = os.path.join(work_dir, "archive")
+        os.makedirs(archive)
+        paths = [os.path.join(archive, f"flat_{n}.txt") for n in range(args.files)]
+        for n, path in enumerate(paths):
+            with open(path, "w", encoding="utf-8") as f:
+                for c in range(n * args.scale // args.files, (n + 1) * args.scale // args.files):
+                    f.write(copy(c))
+        size = sum(os.path.getsize(p) for p in paths)
+        print(f"archive: {size / 1e6:.0f} MB in {args.files} files")
+
+        db_path = os.path.join(work_dir, "index.db")
+        with FlatFileIndex(db_path) as index:
+            start = time.perf_counter()
+            messages = sum(index.update([archive]).values())
+            elapsed = time.perf_counter() - start
+            print(f"  index      {elapsed:8.2f} s  {messages} messages, {size / 1e6 / elapsed:.1f} MB/s, "
+                  f"db {os.path.getsize(db_path) / 1e6:.0f} MB")
+
+            with open(paths[0], "a", encoding="utf-8") as f:
+                f.write(copy(args.scale))
+            start = time.perf_counter()
+            messages = sum(index.update([archive]).values())
+            print(f"  append     {(time.perf_counter() - start) * 1000:8.1f} ms  {messages} messages read")
+
+            queries = [(rng.choice(accessions), rng.randrange(args.scale)) for _ in range(args.lookups)]
+            times = []
+            for accession, n in queries:
+                start = time.perf_counter()
+                hits = index.query(accession=f"{accession}X{n}")
+                for hit in hits:
+                    index.read_message(hit)
+                times.append(time.perf_counter() - start)
+                if not hits:
+                    sys.exit(f"no hit for {accession}X{n}")
+            print(f"  lookups    {statistics.median(times) * 1000:8.2f} ms median, "
+                  f"{max(times) * 1000:.2f} ms max over {len(times)} queries")
+
+            scan_times = []
+            for accession, n in queries[:3]:
+                start = time.perf_counter()
+                found = scan(paths, f"{accession}X{n}")
+                scan_times.append(time.perf_counter() - start)
+                indexed = [(hit.path, hit.offset) for hit in index.query(accession=f"{accession}X{n}")]
+                if found != indexed:
+                    sys.exit(f"{accession}X{n}: index {indexed} != scan {found}")
+            print(f"  scan       {statistics.median(scan_times) * 1000:8.0f} ms per query "
+                  f"({size / 1e6 / statistics.median(scan_times):.0f} MB/s)")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
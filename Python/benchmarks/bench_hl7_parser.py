@@ -0,0 +1,101 @@
+"""
+Micro-benchmark: hl7_pdf_dcm.parse_hl7 (hl7_parser based) vs. the previous per-field regex parser.
+
+Builds a synthetic ORU of roughly --size-mb megabytes with the base64 PDF split across many OBX lines, then times both
+parsers and checks that they return identical results.
+
+Usage:
+    python bench_hl7_parser.py [--size-mb 20] [--chunk 76] [--repeat 3]
+"""
+
+import argparse
+import base64
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hl7_pdf_dcm import parse_hl7  # noqa: E402
+
+
+def legacy_parse_hl7(hl7_message):
+    """The regex-per-field parser hl7_pdf_dcm.py used before hl7_parser.py."""
+    pid_5, pid_3, pid_7, obr_3, obr_4_2, obx_11 = None, None, None, None, None, None
+    base64_pdf = ""
+
+    lines = hl7_message.split("\n")
+    for line in lines:
+        if line.startswith("PID"):
+            pid_5_match = re.search(r"(?:\|[^|]*){4}\|([^|]*)", line)
+            pid_3_match = re.search(r"(?:\|[^|]*){2}\|([^|]*)", line)
+            pid_7_match = re.search(r"(?:\|[^|]*){6}\|([^|]*)", line)
+            if pid_5_match: pid_5 = pid_5_match.group(1).strip()
+            if pid_3_match: pid_3 = pid_3_match.group(1).strip()
+            if pid_7_match: pid_7 = pid_7_match.group(1).strip()
+
+        if line.startswith("OBR"):
+            obr_3_match = re.search(r"(?:\|[^|]*){2}\|([^|]*)", line)
+            obr_4_match = re.search(r"(?:\|[^|]*){3}\|([^|]*)", line)
+            if obr_3_match: obr_3 = obr_3_match.group(1).strip()
+            if obr_4_match:
+                obr_4_parts = obr_4_match.group(1).split("^")
+                if len(obr_4_parts) > 1:
+                    obr_4_2 = obr_4_parts[1][:2].strip()
+
+        if line.startswith("OBX"):
+            obx_11_match = re.search(r"(?:\|[^|]*){10}\|([^|]*)", line)
+            if obx_11_match: obx_11 = obx_11_match.group(1).strip()
+            parts = line.split("|")
+            if len(parts) > 5:
+                base64_pdf += parts[5].strip()
+
+    return pid_5, pid_3, pid_7, obr_3, obr_4_2, obx_11, base64_pdf
+
+
+def build_oru(size_mb, chunk):
+    # ~32 bytes of OBX framing per line, so scale the payload to land near size_mb overall
+    payload_chars = int(size_mb * 1024 * 1024 * chunk / (chunk + 32))
+    payload = base64.b64encode(os.urandom(payload_chars * 3 // 4)).decode("ascii")
+    lines = [
+        "MSH|^~\\&|NIGHTHAWK|RAD|RIS|FAC|20240911080808||ORU^R01|MSG0001|P|2.3",
+        "PID|1||19891213||DOENING^JANE||20250111|F",
+        "OBR|1|0111202501021|0111202501021|CTHEAD^CT BRAIN WO|||20240911000000",
+    ]
+    for i, start in enumerate(range(0, len(payload), chunk), start=1):
+        prefix = "^^PDF^Base64^" if i == 1 else ""
+        lines.append(f"OBX|{i}|ED|PDF^Report||{prefix}{payload[start:start + chunk]}||||||F")
+    return "\n".join(lines) + "\n"
+
+
+def time_it(func, arg, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=20)
+    parser.add_argument("--chunk", type=int, default=76, help="base64 characters per OBX line")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    message = build_oru(args.size_mb, args.chunk)
+    print(f"Synthetic ORU: {len(message) / 1024 / 1024:.1f} MB, {message.count(chr(10))} segments")
+
+    legacy_time, legacy_result = time_it(legacy_parse_hl7, message, args.repeat)
+    new_time, new_result = time_it(parse_hl7, message, args.repeat)
+
+    print(f"regex parser : {legacy_time:.3f} s")
+    print(f"hl7_parser   : {new_time:.3f} s  ({legacy_time / new_time:.1f}x)")
+    print("results match" if legacy_result == new_result else "RESULTS DIFFER")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: hl7_shard.rewrite_file_sharded across worker counts on a large HL7 flat file.
+
+Builds a flat file of about --size-mb MB by repeating "Text Files/sampleHL7FlatFile.txt" (with fresh control ids),
+then rewrites it with hl7_rewrite's default OBR-24 rules:
+  - 1 worker:   hl7_rewrite.rewrite_file (no sharding)
+  - N workers:  rewrite_file_sharded(..., workers=N) for each N in --workers
+in both the every-line and --only-changed modes, and checks that every run's output matches the single-process one.
+Scaling depends on the cores actually available (os.cpu_count() is printed) and on the disk keeping up.
+
+Usage:
+    python bench_hl7_shard.py [--size-mb 1024] [--workers 1 2 4 8] [--work-dir DIR]
+"""
+
+import argparse
+import filecmp
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hl7_rewrite  # noqa: E402
+from hl7_shard import rewrite_file_sharded  # noqa: E402
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                      "Text Files", "sampleHL7FlatFile.txt")
+
+
+def make_flat_file(path, size_mb):
+    with open(SAMPLE, encoding="utf-8") as f:
+        sample = f.read()
+    if not sample.endswith("\n"):
+        sample += "\n"
+    target = size_mb * 1024 * 1024
+    copies = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while f.tell() < target:
+            f.write(sample.replace("MSH|^~\\&|", f"MSH|^~\\&|C{copies}", 1) if copies else sample)
+            copies += 1
+    return os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--work-dir", default=None)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_hl7_shard_", dir=args.work_dir)
+    table = hl7_rewrite.compile_rules(hl7_rewrite.rules)
+    try:
+        source = os.path.join(work_dir, "flat.txt")
+        size = make_flat_file(source, args.size_mb)
+        print(f"{size / 1e6:.0f} MB flat file, {os.cpu_count()} CPUs")
+        for only_changed in (False, True):
+            print("--only-changed" if only_changed else "every line")
+            reference = os.path.join(work_dir, "reference.txt")
+            baseline = None
+            for workers in args.workers:
+                output = reference if workers == 1 else os.path.join(work_dir, "out.txt")
+                start = time.perf_counter()
+                if workers == 1:
+                    hl7_rewrite.rewrite_file(source, output, table, only_changed)
+                else:
+                    rewrite_file_sharded(source, output, table, only_changed, workers=workers)
+                elapsed = time.perf_counter() - start
+                baseline = baseline or elapsed
+                if workers != 1 and os.path.exists(reference) and not filecmp.cmp(reference, output, shallow=False):
+                    sys.exit(f"{workers} workers: output differs from the single-process rewrite")
+                print(f"  {workers:>2} workers  {elapsed:7.2f} s  {size / 1e6 / elapsed:7.0f} MB/s  "
+                      f"x{baseline / elapsed:.2f}")
+            for path in (reference, os.path.join(work_dir, "out.txt")):
+                if os.path.exists(path):
+                    os.unlink(path)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
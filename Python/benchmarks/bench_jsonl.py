@@ -0,0 +1,111 @@
+"""
+Benchmark: handing reports to ORU2pdf as one JSON Lines file against one JSON file per report.
+
+Generates --reports synthetic ORU-style reports (Fax, Accession, a few header fields and a 1-4 KB report body), then
+times getting them from the producer to the point where ORU2pdf has a parsed record ready to render:
+  - per-file:     write one .json per report, then per file chardet.detect + json.load + move to json/ (what
+                  ORU2pdf.read_json_data does before build_pdf)
+  - jsonl:        jsonl.append_records into one file, then jsonl.iter_records over it (ORU2pdf --jsonl)
+  - jsonl xN:     the same file read as N byte ranges by N processes (ORU2pdf --jsonl --part K/N)
+PDF rendering is left out: it costs the same per report either way. Also checks that every reader sees the same
+records.
+
+Usage:
+    python bench_jsonl.py [--reports 100000] [--parts 4] [--work-dir DIR]
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chardet
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jsonl  # noqa: E402
+
+WORDS = ("no acute findings patient tolerated procedure well impression stable compared with prior exam "
+         "mild moderate severe degenerative change follow up recommended clinical correlation").split()
+
+
+def make_reports(count, seed=5):
+    rng = random.Random(seed)
+    for n in range(count):
+        yield {
+            "Patient": f"DOE^JANE{n % 997}",
+            "MRN": str(rng.randint(100000, 999999)),
+            "Accession": f"{n:010d}RADXSU",
+            "Fax": f"555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+            "Exam": "CT HEAD WO CONTRAST",
+            "Report": " ".join(rng.choice(WORDS) for _ in range(rng.randint(150, 600))),
+        }
+
+
+def per_file(reports, work_dir):
+    in_dir = os.path.join(work_dir, "in")
+    json_dir = os.path.join(work_dir, "json")
+    os.makedirs(in_dir)
+    os.makedirs(json_dir)
+    for report in reports:
+        with open(os.path.join(in_dir, f"ORU_{report['Accession']}.json"), "w") as f:
+            json.dump(report, f)
+    seen = []
+    for filename in sorted(glob.glob(f"{in_dir}/*.json")):
+        with open(filename, "rb") as f:
+            encoding = chardet.detect(f.read())["encoding"]
+        with open(filename, "r", encoding=encoding) as f:
+            seen.append(json.load(f)["Accession"])
+        os.rename(filename, os.path.join(json_dir, os.path.basename(filename)))
+    return seen
+
+
+def read_range(path, start, end):
+    return [record["Accession"] for _, record in jsonl.iter_records(path, start, end)]
+
+
+def jsonl_file(reports, work_dir, parts=1):
+    path = os.path.join(work_dir, "reports.jsonl")
+    jsonl.append_records(path, reports)
+    if parts == 1:
+        return read_range(path, 0, None)
+    with ProcessPoolExecutor(max_workers=parts) as pool:
+        ranges = jsonl.split_offsets(path, parts)
+        results = pool.map(read_range, [path] * parts, *zip(*ranges))
+        return [accession for part in results for accession in part]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=100000)
+    parser.add_argument("--parts", type=int, default=4)
+    parser.add_argument("--work-dir", default=None)
+    args = parser.parse_args()
+
+    expected = [report["Accession"] for report in make_reports(args.reports)]
+    runs = [("per-file", per_file, {}), ("jsonl", jsonl_file, {})]
+    if args.parts > 1:
+        runs.append((f"jsonl x{args.parts}", jsonl_file, {"parts": args.parts}))
+
+    print(f"{args.reports} reports")
+    for name, run, kwargs in runs:
+        work_dir = tempfile.mkdtemp(prefix="bench_jsonl_", dir=args.work_dir)
+        try:
+            start = time.perf_counter()
+            seen = run(make_reports(args.reports), work_dir, **kwargs)
+            elapsed = time.perf_counter() - start
+        finally:
+            shutil.rmtree(work_dir)
+        if sorted(seen) != expected:
+            sys.exit(f"{name}: records differ from the generated reports")
+        print(f"  {name:<12} {elapsed:8.2f} s  {args.reports / elapsed:10.0f} reports/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: peak memory of rendering a multi-page report all at once vs. one page at a time (HL7_PAGES=all).
+
+Each approach runs in its own child process so the peak RSS numbers don't contaminate each other:
+    all-at-once - convert_from_path(pdf) for the whole document, then build and save each page
+    streaming   - hl7_pdf_dcm.iter_pdf_pages, each page built, saved and dropped before the next is rendered
+
+Needs poppler (pdftoppm/pdfinfo) on PATH.
+
+Usage:
+    python bench_multipage_memory.py [--pages 30] [--dpi 200] [--grayscale]
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sample_pdf import make_pdf  # noqa: E402
+
+TAGS = {
+    "PatientName": "DOENING^JANE",
+    "PatientID": "19891213",
+    "PatientBirthDate": "20250111",
+    "PatientSex": "F",
+    "AccessionNumber": "0111202501021",
+    "Modality": "CT",
+}
+
+
+def run_child(approach, pdf_path, out_dir, dpi, grayscale):
+    """Render and write every page with `approach`; print elapsed seconds and peak RSS (KB)."""
+    from pdf2image import convert_from_path
+    from pydicom.uid import generate_uid
+
+    from hl7_pdf_dcm import build_secondary_capture, iter_pdf_pages, page_output_path
+
+    tags = dict(TAGS, StudyInstanceUID=generate_uid(), SeriesInstanceUID=generate_uid())
+    dcm_path = os.path.join(out_dir, "report.dcm")
+    start = time.perf_counter()
+    if approach == "all-at-once":
+        images = convert_from_path(pdf_path, dpi=dpi, grayscale=grayscale)
+        pages = enumerate(images, start=1)
+    else:
+        pages = iter_pdf_pages(pdf_path, all_pages=True, dpi=dpi, grayscale=grayscale)
+    for page, image in pages:
+        build_secondary_capture(image, tags, page).save_as(page_output_path(dcm_path, page), write_like_original=False)
+        del image
+    elapsed = time.perf_counter() - start
+    print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--grayscale", action="store_true")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.pdf, args.out, args.dpi, args.grayscale)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "report.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(make_pdf(pages=args.pages))
+
+        print(f"{args.pages} pages at {args.dpi} dpi, {'grayscale' if args.grayscale else 'RGB'}")
+        print(f"{'approach':<14}{'seconds':>10}{'peak RSS MB':>14}{'MB written':>12}")
+        for approach in ("all-at-once", "streaming"):
+            out_dir = tempfile.mkdtemp(dir=tmp)
+            cmd = [sys.executable, __file__, "--child", approach, "--pdf", pdf_path, "--out", out_dir,
+                   "--dpi", str(args.dpi)] + (["--grayscale"] if args.grayscale else [])
+            elapsed, peak_kb = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout.split()
+            written = sum(os.path.getsize(os.path.join(out_dir, name)) for name in os.listdir(out_dir))
+            print(f"{approach:<14}{float(elapsed):>10.2f}{int(peak_kb) / 1024:>14.1f}{written / 1048576:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark: reading fax reports with ORU2pdf.load_json_file against chardet over every whole file.
+
+Writes --reports JSON reports like the records Pipe2json.py produces (ASCII mostly, some with UTF-8 names and
+symbols, some saved with a UTF-8 BOM, and every --cp1252-every'th one in Windows-1252), in two sizes: normal
+(150-600 words) and --long-words long. Then loads each set with
+  - chardet:        the old read: chardet.detect on the whole file, then reopen it and json.load
+  - load_json_file: one read, UTF-8 first, chardet on a DETECT_BYTES window only when that fails
+and prints reports/second and how many reports each way decoded back to exactly the record that was written.
+
+Needs chardet, and whatever ORU2pdf imports (pdfme: Python 3.12+ for pdfme 0.5).
+
+Usage:
+    python bench_oru2pdf_decode.py [--reports 2000] [--long-words 20000] [--cp1252-every 50] [--work-dir DIR]
+"""
+
+import argparse
+import codecs
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import chardet
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ORU2pdf  # noqa: E402
+
+WORDS = ("no acute findings patient tolerated procedure well impression stable compared with prior exam "
+         "mild moderate severe degenerative change follow up recommended clinical correlation").split()
+ACCENTED = ["Müller", "Peña", "José", "5 mm × 3 mm", "37 °C", "Zoë", "François"]
+
+
+def make_reports(directory, count, words, cp1252_every, seed=11):
+    rng = random.Random(seed)
+    os.makedirs(directory)
+    reports = {}
+    for n in range(count):
+        text = [rng.choice(WORDS) for _ in range(rng.randint(words // 4, words))]
+        accented = n % 3 == 0
+        if accented:
+            for _ in range(3):
+                text.insert(rng.randrange(len(text)), rng.choice(ACCENTED))
+        report = {
+            "Patient": "PEÑA^JOSÉ" if accented else f"DOE^JANE{n % 997}",
+            "Accession": f"{n:010d}RADXSU",
+            "Fax": f"555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+            "Report": " ".join(text),
+        }
+        path = os.path.join(directory, f"FAX_{n}.json")
+        text = json.dumps(report, ensure_ascii=False)
+        if cp1252_every and n % cp1252_every == cp1252_every - 1:
+            data = text.encode("cp1252", errors="replace")
+            report = json.loads(data.decode("cp1252"))
+        elif n % 7 == 1:
+            data = codecs.BOM_UTF8 + text.encode("utf-8")
+        else:
+            data = text.encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(data)
+        reports[path] = report
+    return reports
+
+
+def chardet_load(path):
+    with open(path, "rb") as file:
+        encoding = chardet.detect(file.read())["encoding"]
+    with open(path, "r", encoding=encoding) as file:
+        return json.load(file)
+
+
+def timed(load, reports):
+    correct = 0
+    start = time.perf_counter()
+    for path, report in reports.items():
+        try:
+            correct += load(path) == report
+        except (UnicodeError, ValueError):
+            pass
+    return time.perf_counter() - start, correct
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=2000)
+    parser.add_argument("--long-words", type=int, default=20000)
+    parser.add_argument("--cp1252-every", type=int, default=50)
+    parser.add_argument("--work-dir", default=None)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_oru2pdf_decode_", dir=args.work_dir)
+    try:
+        for size, words, count in (("normal", 600, args.reports), ("long", args.long_words, args.reports // 10)):
+            directory = os.path.join(work_dir, size)
+            reports = make_reports(directory, count, words, args.cp1252_every)
+            total = sum(os.path.getsize(path) for path in reports)
+            print(f"{count} {size} reports, {total / count / 1024:.1f} KB average")
+            for name, load in (("chardet", chardet_load), ("load_json_file", ORU2pdf.load_json_file)):
+                elapsed, correct = timed(load, reports)
+                print(f"  {name:<15} {elapsed:7.2f} s  {count / elapsed:8.1f} reports/s  {correct}/{count} exact")
+            shutil.rmtree(directory)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Benchmark: ORU2pdf PDF rendering with the cached layout and logo against the per-report document of before.
+
+Makes --reports synthetic fax reports and a --logo-width pixel wide PNG logo, then renders every report with
+  - per-report:    the old create_pdf_from_json (document dict and {"image": logo.png} built per report, so pdfme
+                   decodes the PNG and re-encodes it to JPEG for every PDF)
+  - cached:        ORU2pdf.create_pdf_from_json with the logo converted once, at full resolution
+  - cached+capped: the same with the logo scaled to ORU2pdf.LOGO_MAX_WIDTH
+  - batch xN:      ORU2pdf.run_batch over the reports as JSON files (parse, render, file), for each N in --workers
+and prints PDFs/second and the average PDF size. The first reports from "cached" must match "per-report" byte for
+byte, apart from the random /ID pdfme writes in each trailer.
+
+Needs pdfme (Python 3.12+ for pdfme 0.5), Pillow and chardet.
+
+Usage:
+    python bench_oru2pdf_render.py [--reports 1000] [--logo-width 2400] [--workers 2 4] [--work-dir DIR]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw  # noqa: E402
+from pdfme import build_pdf  # noqa: E402
+
+import ORU2pdf  # noqa: E402
+
+WORDS = ("no acute findings patient tolerated procedure well impression stable compared with prior exam "
+         "mild moderate severe degenerative change follow up recommended clinical correlation").split()
+TRAILER_ID = re.compile(rb"/ID \[<[0-9a-f]+> <[0-9a-f]+>\]")
+
+
+def make_reports(count, seed=5):
+    rng = random.Random(seed)
+    return [{
+        "Patient": f"DOE^JANE{n % 997}",
+        "MRN": str(rng.randint(100000, 999999)),
+        "Accession": f"{n:010d}RADXSU",
+        "Fax": f"555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+        "Exam": "CT HEAD WO CONTRAST",
+        "Report": " ".join(rng.choice(WORDS) for _ in range(rng.randint(150, 600))),
+    } for n in range(count)]
+
+
+def make_logo(path, width):
+    height = width // 4
+    im = Image.new("RGBA", (width, height), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(im)
+    for x in range(0, width, width // 30):
+        draw.ellipse((x, height // 6, x + width // 15, height * 5 // 6), fill=(x % 256, 90, 180, 255))
+    draw.rectangle((0, height * 7 // 8, width, height), fill=(20, 40, 120, 255))
+    im.save(path)
+
+
+def per_report_create_pdf(json_data, filename, pdf_dir):
+    """create_pdf_from_json as it was: a new document per report and the logo by path."""
+    document = {
+        "style": {
+            "margin_bottom": 15, "text_align": "j",
+            "page_size": "letter", "margin": [60, 50]
+        },
+        "formats": {
+            "url": {"c": "blue", "u": 1},
+            "title": {"b": 1, "s": 13}
+        },
+        "running_sections": {
+            "footer": {
+                "x": "left", "y": 740, "height": "bottom", "style": {"text_align": "c"},
+                "content": [{".": ["Page ", {"var": "$page"}]}]
+            }
+        },
+        "sections": [
+            {
+                "style": {"page_numbering_style": "roman"},
+                "running_sections": ["footer"],
+                "content": [
+                    {"image": ORU2pdf.logo_path},
+                    json_data
+                ],
+            }
+        ]
+    }
+    with open(os.path.join(pdf_dir, os.path.splitext(filename)[0] + ".pdf"), "wb") as f:
+        build_pdf(document, f)
+
+
+def render_all(create_pdf, reports, pdf_dir):
+    os.makedirs(pdf_dir)
+    start = time.perf_counter()
+    for report in reports:
+        name = ORU2pdf.fax_pdf_name(report, ORU2pdf.fax_key, ORU2pdf.accn_key)
+        create_pdf(ORU2pdf.process_json_data(report), f"{name}.pdf", pdf_dir)
+    return time.perf_counter() - start
+
+
+def summary(name, count, elapsed, pdf_dir):
+    sizes = [entry.stat().st_size for entry in os.scandir(pdf_dir) if entry.name.endswith(".pdf")]
+    print(f"  {name:<14} {elapsed:7.2f} s  {count / elapsed:6.1f} PDFs/s  {sum(sizes) / len(sizes) / 1024:6.1f} KB/PDF")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=1000)
+    parser.add_argument("--logo-width", type=int, default=2400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--work-dir", default=None)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_oru2pdf_render_", dir=args.work_dir)
+    try:
+        ORU2pdf.logo_path = os.path.join(work_dir, "logo.png")
+        make_logo(ORU2pdf.logo_path, args.logo_width)
+        reports = make_reports(args.reports)
+        print(f"{len(reports)} reports, {args.logo_width} px logo ({os.path.getsize(ORU2pdf.logo_path) / 1024:.0f} KB "
+              f"PNG), {os.cpu_count()} CPUs")
+
+        legacy_dir = os.path.join(work_dir, "per-report")
+        summary("per-report", len(reports), render_all(per_report_create_pdf, reports, legacy_dir), legacy_dir)
+
+        max_width = ORU2pdf.LOGO_MAX_WIDTH
+        for name, width in (("cached", max(max_width, args.logo_width)), ("cached+capped", max_width)):
+            ORU2pdf.LOGO_MAX_WIDTH = width
+            ORU2pdf._logo = None
+            pdf_dir = os.path.join(work_dir, name)
+            summary(name, len(reports), render_all(ORU2pdf.create_pdf_from_json, reports, pdf_dir), pdf_dir)
+            if name == "cached":
+                for filename in sorted(os.listdir(pdf_dir))[:20]:
+                    with open(os.path.join(pdf_dir, filename), "rb") as new, \
+                            open(os.path.join(legacy_dir, filename), "rb") as old:
+                        if TRAILER_ID.sub(b"", new.read()) != TRAILER_ID.sub(b"", old.read()):
+                            sys.exit(f"{filename}: cached rendering differs from the per-report one")
+            shutil.rmtree(pdf_dir)
+        shutil.rmtree(legacy_dir)
+
+        ORU2pdf.LOGO_MAX_WIDTH = max_width
+        ORU2pdf._logo = None
+        for workers in args.workers:
+            ORU2pdf.directory = os.path.join(work_dir, "in")
+            ORU2pdf.pdf_dir = os.path.join(work_dir, "pdf")
+            ORU2pdf.json_dir = os.path.join(work_dir, "json")
+            for path in (ORU2pdf.directory, ORU2pdf.pdf_dir, ORU2pdf.json_dir):
+                os.makedirs(path)
+            for report in reports:
+                with open(os.path.join(ORU2pdf.directory, f"FAX_{report['Accession']}.json"), "w") as f:
+                    json.dump(report, f)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                ORU2pdf.run_batch(ORU2pdf.directory, workers)
+            summary(f"batch x{workers}", len(reports), time.perf_counter() - start, ORU2pdf.pdf_dir)
+            for path in (ORU2pdf.directory, ORU2pdf.pdf_dir, ORU2pdf.json_dir):
+                shutil.rmtree(path)
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: PDF -> DICOM via the JPEG/img2dcm/dcmdjpeg chain vs. the in-process HL7_DICOM_MODE=pdf|sc builders.
+
+For each approach it reports wall time per report and bytes written to disk per report (intermediate JPEG and the
+dcmdjpeg copy included for the chain). The chain is skipped when img2dcm/dcmdjpeg are not on PATH.
+
+Usage:
+    python bench_pdf_to_dicom.py [--pdf report.pdf] [--runs 20]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf2image import convert_from_path  # noqa: E402
+
+from hl7_pdf_dcm import RENDER_DPI, build_encapsulated_pdf, build_secondary_capture  # noqa: E402
+from sample_pdf import make_pdf  # noqa: E402
+
+TAGS = {
+    "PatientName": "DOENING^JANE",
+    "PatientID": "19891213",
+    "PatientBirthDate": "20250111",
+    "PatientSex": "F",
+    "AccessionNumber": "0111202501021",
+    "Modality": "CT",
+}
+
+
+def run_chain(pdf_path, work_dir, i):
+    jpg_path = os.path.join(work_dir, f"{i}.jpg")
+    dcm_path = os.path.join(work_dir, f"{i}.dcm")
+    raw_path = os.path.join(work_dir, f"{i}_uncompressed.dcm")
+    convert_from_path(pdf_path, dpi=RENDER_DPI, first_page=1, last_page=1)[0].save(jpg_path, "JPEG")
+    subprocess.run(["img2dcm", jpg_path, dcm_path] + [a for k, v in (
+        ("(0010,0010)", TAGS["PatientName"]), ("(0010,0020)", TAGS["PatientID"]),
+        ("(0008,0050)", TAGS["AccessionNumber"]), ("(0008,0060)", TAGS["Modality"])) for a in ("-k", f"{k}={v}")],
+        check=True, capture_output=True)
+    subprocess.run(["dcmdjpeg", dcm_path, raw_path], check=True, capture_output=True)
+    return sum(os.path.getsize(p) for p in (jpg_path, dcm_path, raw_path))
+
+
+def run_pdf(pdf_path, work_dir, i):
+    dcm_path = os.path.join(work_dir, f"{i}.dcm")
+    with open(pdf_path, "rb") as f:
+        build_encapsulated_pdf(f.read(), TAGS).save_as(dcm_path, write_like_original=False)
+    return os.path.getsize(dcm_path)
+
+
+def run_sc(pdf_path, work_dir, i):
+    dcm_path = os.path.join(work_dir, f"{i}.dcm")
+    image = convert_from_path(pdf_path, dpi=RENDER_DPI, first_page=1, last_page=1)[0]
+    build_secondary_capture(image, TAGS).save_as(dcm_path, write_like_original=False)
+    return os.path.getsize(dcm_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="report PDF to convert (default: generated 1-page report)")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = args.pdf
+        if not pdf_path:
+            pdf_path = os.path.join(tmp, "report.pdf")
+            with open(pdf_path, "wb") as f:
+                f.write(make_pdf(pages=1))
+
+        approaches = [("pdf (in-process)", run_pdf), ("sc (in-process)", run_sc)]
+        if shutil.which("img2dcm") and shutil.which("dcmdjpeg"):
+            approaches.insert(0, ("jpeg+img2dcm+dcmdjpeg", run_chain))
+        else:
+            print("img2dcm/dcmdjpeg not found; skipping the current chain")
+
+        print(f"{'approach':<24}{'ms/report':>12}{'KB written/report':>20}")
+        for name, func in approaches:
+            work_dir = tempfile.mkdtemp(dir=tmp)
+            written = 0
+            start = time.perf_counter()
+            for i in range(args.runs):
+                written += func(pdf_path, work_dir, i)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<24}{elapsed / args.runs * 1000:>12.1f}{written / args.runs / 1024:>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark: Pipe2json's chunked engine against the previous pipe_delimited_to_json on a synthetic pipe-delimited extract.
+
+Generates a NOTE extract (header + one row per note line, LINE restarting at 1 for each note; 1 note in 200 is a long
+one with 300-3000 lines) of about --size-mb MB, then times
+  - legacy:          csv.DictReader, NOTE_TEXT built with +=, json.dump(indent=4)
+  - pretty:          the new engine with --pretty (same output layout as legacy)
+  - compact json:    the new engine's default
+  - jsonl:           the new engine, one entry per line
+  - ... N workers:   the same with --workers N (shards encoded and written by worker processes)
+and checks that every approach's shards hold the same entries as legacy's.
+
+Usage:
+    python bench_pipe2json.py [--size-mb 2048] [--max-blocks 1000] [--workers 4] [--work-dir DIR] [--skip-legacy]
+"""
+
+import argparse
+import contextlib
+import csv
+import glob
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Pipe2json import pipe_delimited_to_json  # noqa: E402
+
+HEADER = ["PAT_MRN", "NOTE_ID", "NOTE_DATE", "AUTHOR", "NOTE_TYPE", "LINE", "NOTE_TEXT"]
+WORDS = ("no acute findings patient tolerated procedure well impression stable compared with prior exam "
+         "mild moderate severe degenerative change follow up recommended clinical correlation").split()
+
+
+def make_extract(path, size_mb, seed=3):
+    """Write a synthetic extract of about size_mb MB; returns (rows, notes)."""
+    rng = random.Random(seed)
+    lines = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 16))) for _ in range(5000)]
+    target = size_mb * 1024 * 1024
+    rows = notes = 0
+    with open(path, "w") as f:
+        f.write("|".join(HEADER) + "\n")
+        while f.tell() < target:
+            notes += 1
+            count = rng.randint(300, 3000) if rng.random() < 0.005 else rng.randint(1, 30)
+            prefix = f"{rng.randint(100000, 999999)}|N{notes}|2012-03-{rng.randint(1, 28):02d}|DOE^JOHN|RAD|"
+            f.write("".join(f"{prefix}{n}|{rng.choice(lines)}\n" for n in range(1, count + 1)))
+            rows += count
+    return rows, notes
+
+
+def legacy_pipe_delimited_to_json(pipe_delimited_file, base_json_file, max_blocks):
+    """Pipe2json.pipe_delimited_to_json before the chunked engine (DictReader, NOTE_TEXT +=, json.dump indent=4)."""
+    entries = []
+    current_entry = None
+    block_counter = 0
+    file_counter = 1
+
+    def save_entries_to_file(entries, file_counter):
+        file_name = f"{base_json_file}_{file_counter}.json"
+        with open(file_name, 'w') as f:
+            json.dump(entries, f, indent=4)
+        print(f"Saved {len(entries)} entries to {file_name}")
+
+    with open(pipe_delimited_file, 'r') as f:
+        reader = csv.DictReader(f, delimiter='|')
+        
+        for row in reader:
+            if current_entry is None or row['LINE'] == '1':
+                # Save the current entry if it exists
+                if current_entry:
+                    entries.append(current_entry)
+                    block_counter += 1
+
+                # Start a new entry
+                current_entry = {k: v for k, v in row.items() if k != 'NOTE_TEXT' and k != 'LINE'}
+                current_entry['NOTE_TEXT'] = row['NOTE_TEXT']
+                
+                # Check if we need to save to a new file
+                if block_counter == max_blocks:
+                    save_entries_to_file(entries, file_counter)
+                    entries = []
+                    block_counter = 0
+                    file_counter += 1
+            else:
+                # Aggregate the NOTE_TEXT for the current entry with a | at the start
+                current_entry['NOTE_TEXT'] += " | " + row['NOTE_TEXT']
+        
+        # Save the last set of entries
+        if current_entry:
+            entries.append(current_entry)
+        if entries:
+            save_entries_to_file(entries, file_counter)
+
+
+def shard_entries(paths):
+    """Entries of every shard, in shard-number order, one shard at a time."""
+    for path in sorted(paths, key=lambda p: int(p.rsplit("_", 1)[1].split(".")[0])):
+        with open(path) as f:
+            if path.endswith(".jsonl"):
+                yield [json.loads(line) for line in f]
+            else:
+                yield json.load(f)
+
+
+def run(name, func, base):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # one "Saved ..." line per shard
+        func(base)
+    elapsed = time.perf_counter() - start
+    paths = glob.glob(base + "_*")
+    written = sum(os.path.getsize(p) for p in paths)
+    return elapsed, paths, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=2048)
+    parser.add_argument("--max-blocks", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4, help="worker processes for the --workers runs (0: skip them)")
+    parser.add_argument("--work-dir", help="where the extract and shards go (default: a temp dir, removed afterwards)")
+    parser.add_argument("--skip-legacy", action="store_true", help="time the new engine only")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as tmp:
+        extract = os.path.join(tmp, "notes.pipe")
+        start = time.perf_counter()
+        rows, notes = make_extract(extract, args.size_mb)
+        size = os.path.getsize(extract)
+        print(f"extract: {size / 1e6:.0f} MB, {rows} rows, {notes} notes ({time.perf_counter() - start:.0f} s to generate)")
+
+        approaches = [
+            ("pretty", lambda base: pipe_delimited_to_json(extract, base, args.max_blocks, pretty=True)),
+            ("compact json", lambda base: pipe_delimited_to_json(extract, base, args.max_blocks)),
+            ("jsonl", lambda base: pipe_delimited_to_json(extract, base, args.max_blocks, output_format="jsonl")),
+        ]
+        if args.workers > 1:
+            approaches += [
+                (f"pretty, {args.workers} workers", lambda base: pipe_delimited_to_json(
+                    extract, base, args.max_blocks, pretty=True, workers=args.workers)),
+                (f"json, {args.workers} workers", lambda base: pipe_delimited_to_json(
+                    extract, base, args.max_blocks, workers=args.workers)),
+            ]
+        if not args.skip_legacy:
+            approaches.insert(0, ("legacy", lambda base: legacy_pipe_delimited_to_json(extract, base, args.max_blocks)))
+
+        print(f"{'approach':<20}{'s total':>10}{'MB/s in':>10}{'MB out':>10}")
+        reference = None
+        for name, func in approaches:
+            base = os.path.join(tmp, name.replace(" ", "_").replace(",", ""))
+            elapsed, paths, written = run(name, func, base)
+            print(f"{name:<20}{elapsed:>10.1f}{size / 1e6 / elapsed:>10.1f}{written / 1e6:>10.0f}")
+            if reference is None:
+                reference = paths
+            elif any(a != b for a, b in zip(shard_entries(reference), shard_entries(paths))) \
+                    or len(reference) != len(paths):
+                sys.exit(f"{name}: shards differ from {approaches[0][0]}")
+            if paths is not reference:
+                for path in paths:
+                    os.remove(path)
+        print(f"all approaches wrote the same entries to the same {len(reference)} shards")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark: removeORUbydate's streaming filter against the previous DictReader/strptime-per-row process_files.
+
+Generates --rows rows of a synthetic ORU extract (ACCESSION_NUM, BEGIN_EXAM_DTTM over ~6 years of dates, a few more
+columns, 1 row in 500 with a quoted multi-line comment) split across --files .pipe files, then filters a fresh copy
+with each approach:
+  - legacy:        csv.DictReader, datetime.strptime per row, kept rows held in memory, file rewritten in place
+  - streaming:     process_files(..., workers=1)
+  - streaming xN:  process_files(..., workers=N)
+and checks that every approach leaves the same files and logs the same accession numbers.
+
+Usage:
+    python bench_remove_oru_by_date.py [--rows 10000000] [--files 8] [--workers 4] [--work-dir DIR] [--skip-legacy]
+"""
+
+import argparse
+import contextlib
+import csv
+import glob
+import hashlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from removeORUbydate import process_files  # noqa: E402
+
+HEADER = ["PAT_MRN", "ACCESSION_NUM", "BEGIN_EXAM_DTTM", "PROC_CODE", "PROC_NAME", "STATUS", "COMMENT"]
+PROCEDURES = [("CT001", "CT HEAD WO CONTRAST"), ("MR014", "MRI BRAIN W WO CONTRAST"), ("XR100", "XR CHEST 2 VIEWS"),
+              ("US020", "US ABDOMEN COMPLETE"), ("NM007", "NM BONE SCAN WHOLE BODY")]
+THRESHOLD = datetime(2024, 10, 1)
+
+
+def make_extract(directory, rows, files, seed=11):
+    rng = random.Random(seed)
+    first = datetime(2019, 1, 1)
+    dates = [f"{d.month}/{d.day}/{d.year}" if rng.random() < 0.5 else d.strftime("%m/%d/%Y")
+             for d in (first + timedelta(days=n) for n in range(6 * 365))]
+    per_file = rows // files
+    for n in range(files):
+        with open(os.path.join(directory, f"extract_{n}.pipe"), "w") as f:
+            f.write("|".join(HEADER) + "\n")
+            lines = []
+            for i in range(per_file):
+                code, name = rng.choice(PROCEDURES)
+                comment = '"see prior\nreport"' if rng.random() < 0.002 else ""
+                lines.append(f"{rng.randint(100000, 999999)}|{n}{i:09d}|{rng.choice(dates)}|{code}|{name}|F|"
+                             f"{comment}\n")
+                if len(lines) == 100000:
+                    f.write("".join(lines))
+                    lines = []
+            f.write("".join(lines))
+    return per_file * files
+
+
+def legacy_process_files(file_list, log_file, date_threshold):
+    """removeORUbydate.process_files before the streaming rewrite."""
+    accession_nums_to_remove = set()
+    for file_path in file_list:
+        entries_to_keep = []
+        with open(file_path, 'r') as f:
+            reader = csv.DictReader(f, delimiter='|')
+            for row in reader:
+                begin_exam_dttm = row.get('BEGIN_EXAM_DTTM')
+                accession_num = row.get('ACCESSION_NUM')
+                if begin_exam_dttm and datetime.strptime(begin_exam_dttm, '%m/%d/%Y') >= date_threshold:
+                    if accession_num:
+                        accession_nums_to_remove.add(accession_num)
+                else:
+                    entries_to_keep.append(row)
+        with open(file_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=reader.fieldnames, delimiter='|')
+            writer.writeheader()
+            writer.writerows(entries_to_keep)
+    with open(log_file, 'w') as log:
+        for accession_num in accession_nums_to_remove:
+            log.write(f"{accession_num}\n")
+
+
+def fingerprint(directory, log_file):
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(directory, "*.pipe"))):
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    with open(log_file) as f:
+        digest.update("\n".join(sorted(f.read().split())).encode())
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_remove_oru_", dir=args.work_dir)
+    try:
+        source = os.path.join(work_dir, "source")
+        os.makedirs(source)
+        rows = make_extract(source, args.rows, args.files)
+        size_mb = sum(os.path.getsize(p) for p in glob.glob(os.path.join(source, "*.pipe"))) / 1e6
+        print(f"{rows} rows in {args.files} files ({size_mb:.0f} MB)")
+
+        runs = []
+        if not args.skip_legacy:
+            runs.append(("legacy", legacy_process_files, {}))
+        runs.append(("streaming", process_files, {"workers": 1}))
+        if args.workers > 1:
+            runs.append((f"streaming x{args.workers}", process_files, {"workers": args.workers}))
+
+        expected = None
+        for name, run, kwargs in runs:
+            target = os.path.join(work_dir, "run")
+            shutil.copytree(source, target)
+            file_list = sorted(glob.glob(os.path.join(target, "*.pipe")))
+            log_file = os.path.join(work_dir, "removed.txt")
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                run(file_list, log_file, THRESHOLD, **kwargs)
+            elapsed = time.perf_counter() - start
+            result = fingerprint(target, log_file)
+            shutil.rmtree(target)
+            if expected is None:
+                expected = result
+            elif result != expected:
+                sys.exit(f"{name}: output differs from {runs[0][0]}")
+            print(f"  {name:<14} {elapsed:8.2f} s  {rows / elapsed:12,.0f} rows/s")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark: splitting report text into sections for the SR content tree.
+
+Builds a corpus of synthetic reports from the sample ORUs in "Text Files" (headings in mixed case, varying numbers of
+finding lines, 1 in 10 without any headings) and reports throughput for
+  - split_report_sections:  the single linear scan over one precompiled pattern
+  - per-heading search:     one regex pass per heading label, matches merged afterwards (the obvious alternative)
+  - build_basic_text_sr with the sectioned content tree vs. the previous single Finding item
+
+Usage:
+    python bench_report_sections.py [--reports 50000]
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prelimSR  # noqa: E402
+
+SAMPLES_GLOB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                            "Text Files", "sampleORU*.txt")
+
+EXTRA_FINDINGS = [
+    "Spleen: Normal in size.",
+    "Kidneys: No hydronephrosis.",
+    "Lungs: Clear without consolidation or effusion.",
+    "Heart: Normal size. No pericardial effusion.",
+    "Bones: Degenerative changes without acute fracture.",
+]
+
+
+def load_samples():
+    reports = []
+    for path in sorted(glob.glob(SAMPLES_GLOB)):
+        with open(path, encoding="utf-8") as f:
+            reports.append(json.load(f))
+    if not reports:
+        sys.exit(f"no sample ORUs found at {SAMPLES_GLOB}")
+    return reports
+
+
+def synthetic_report(samples, rng):
+    report = dict(rng.choice(samples))
+    text = report["Report"]
+    extra = "\n".join(rng.choice(EXTRA_FINDINGS) for _ in range(rng.randint(0, 40)))
+    text = re.sub(r"(?im)^(findings:[ \t]*\n)", lambda m: m.group(1) + extra + "\n", text, count=1)
+    if rng.random() < 0.3:
+        text = re.sub(r"(?m)^([A-Z][A-Z /]+):", lambda m: m.group(1).title() + ":", text)
+    if rng.random() < 0.1:
+        text = re.sub(r"(?m)^[A-Za-z /]+:[ \t]*", "", text)  # dictated without headings
+    report["Report"] = text
+    report["Accession"] = str(rng.randint(10 ** 12, 10 ** 13))
+    return report
+
+
+_LABEL_PATTERNS = [
+    (re.compile(r"^[ \t]*" + label.replace(" ", r"[ \t]+") + r"[ \t]*:[ \t]*", re.IGNORECASE | re.MULTILINE), label)
+    for label in sorted(prelimSR._SECTION_BY_LABEL, key=len, reverse=True)
+]
+
+
+def split_per_heading(report_text):
+    """Same sections (signature line aside) found with one search pass per heading label."""
+    bounds = {}
+    for pattern, label in _LABEL_PATTERNS:
+        for m in pattern.finditer(report_text):
+            bounds.setdefault(m.start(), (m.end(), prelimSR._SECTION_BY_LABEL[label]))
+    sections = []
+    starts = sorted(bounds)
+    for i, start in enumerate(starts):
+        end, heading = bounds[start]
+        text = report_text[end:starts[i + 1] if i + 1 < len(starts) else len(report_text)].strip()
+        if text:
+            sections.append((heading, text))
+    return sections
+
+
+def timed(func, items):
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=50000)
+    args = parser.parse_args()
+
+    prelimSR.log.setLevel(logging.WARNING)
+    rng = random.Random(11)
+    samples = load_samples()
+    reports = [synthetic_report(samples, rng) for _ in range(args.reports)]
+    texts = [r["Report"] for r in reports]
+    megabytes = sum(len(t) for t in texts) / 1e6
+
+    sectioned = [prelimSR.split_report_sections(t) for t in texts]
+    with_headings = sum(1 for s in sectioned if s)
+    print(f"{len(texts)} reports, {megabytes:.1f} MB of report text, {with_headings} with headings, "
+          f"{sum(len(s) for s in sectioned) / max(with_headings, 1):.1f} sections per sectioned report")
+
+    print(f"{'split':<28}{'s total':>10}{'reports/s':>12}{'MB/s':>8}")
+    for name, func in (("linear scan", prelimSR.split_report_sections), ("per-heading search", split_per_heading)):
+        seconds = timed(func, texts)
+        print(f"{name:<28}{seconds:>10.2f}{len(texts) / seconds:>12.0f}{megabytes / seconds:>8.1f}")
+
+    subset = reports[:5000]
+    print(f"\n{'SR build (' + str(len(subset)) + ' reports)':<28}{'s total':>10}{'SRs/s':>12}")
+    split = prelimSR.split_report_sections
+    for name, splitter in (("single Finding item", lambda text: []), ("sectioned content tree", split)):
+        prelimSR.split_report_sections = splitter
+        try:
+            seconds = timed(prelimSR.basic_text_sr_bytes, subset)
+        finally:
+            prelimSR.split_report_sections = split
+        print(f"{name:<28}{seconds:>10.2f}{len(subset) / seconds:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Benchmark: SRs/second for create_basic_text_sr_from_json before and after the prebuilt SR template.
+
+Builds and writes one SR per synthetic JSON report with
+  - legacy:        the previous builder (whole dataset tree built per report, random ImplementationClassUID)
+  - template file: create_basic_text_sr_from_json (template copy + per-report attributes) writing to a path
+  - template bytes: basic_text_sr_bytes, serialised in memory
+and checks that legacy and template output carry the same attributes (per-report UIDs and creation time aside).
+
+Usage:
+    python bench_sr_builder.py [--reports 10000]
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pydicom  # noqa: E402
+from pydicom.dataset import Dataset, FileDataset  # noqa: E402
+from pydicom.sequence import Sequence  # noqa: E402
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid  # noqa: E402
+
+import prelimSR  # noqa: E402
+
+# differ per SR by design
+VOLATILE = {"SOPInstanceUID", "MediaStorageSOPInstanceUID", "SeriesInstanceUID", "StudyInstanceUID",
+            "ImplementationClassUID", "FileMetaInformationGroupLength", "InstanceCreationDate", "InstanceCreationTime"}
+
+FINDINGS = [
+    "No acute intracranial abnormality.",
+    "Mild degenerative changes of the lumbar spine without acute fracture.",
+    "Small right pleural effusion with adjacent atelectasis. No pneumothorax.",
+    "Appendix is normal in caliber. No free fluid or abscess.",
+]
+
+
+def synthetic_report(i, rng):
+    report = {
+        "Accession": f"{1000000 + i}",
+        "Facility": rng.choice(["RADX", "MCH", "NORTH"]),
+        "PatientName": rng.choice(["JANE DOE", "DOE^JOHN", "MARY ANN SMITH"]),
+        "MRN": str(rng.randint(100000, 999999)),
+        "DoB": rng.choice(["01/11/1980", "19750402", ""]),
+        "PatientSex": rng.choice(["F", "M", "Female"]),
+        "ExamType": rng.choice(["CT HEAD WO CONTRAST", "XR CHEST 2 VIEWS", "US ABDOMEN"]),
+        "Ordering": "GREGORY HOUSE",
+        "Radiologist": "ALLISON CAMERON",
+        "SignedTime": f"20250111{rng.randint(0, 23):02d}{rng.randint(0, 59):02d}00",
+        "Report": "\r\n".join(rng.choice(FINDINGS) for _ in range(rng.randint(3, 30))),
+    }
+    if i % 3 == 0:
+        report["SUID"] = generate_uid()
+    return report
+
+
+def legacy_create_sr(json_data, output_path):
+    """create_basic_text_sr_from_json before the template: the whole tree and a new ImplementationClassUID per report."""
+
+    # ---------------------------------------------------------
+    # File Meta
+    # ---------------------------------------------------------
+    file_meta = Dataset()
+    file_meta.MediaStorageSOPClassUID = prelimSR.BASIC_TEXT_SR_SOP_CLASS_UID
+    sop_instance_uid = generate_uid()
+    file_meta.MediaStorageSOPInstanceUID = sop_instance_uid
+    file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    file_meta.ImplementationClassUID = generate_uid()
+
+    # ---------------------------------------------------------
+    # Top-level DICOM dataset
+    # ---------------------------------------------------------
+    ds = FileDataset(
+        output_path,
+        {},
+        file_meta=file_meta,
+        preamble=b"\0" * 128,
+    )
+    ds.is_little_endian = True
+    ds.is_implicit_VR = False
+
+    # Instance creation
+    now = datetime.now()
+    now_date = now.strftime("%Y%m%d")
+    now_time = now.strftime("%H%M%S")
+    ds.InstanceCreationDate = now_date
+    ds.InstanceCreationTime = now_time
+
+    # Leave SpecificCharacterSet unset -> default ISO_IR 6 (ASCII)
+
+    # ---------------------------------------------------------
+    # Patient Module
+    # ---------------------------------------------------------
+    patient_name_raw = json_data.get("PatientName", "")
+    ds.PatientName = prelimSR.split_person_name(patient_name_raw)
+
+    mrn = json_data.get("MRN") or json_data.get("Mrn") or json_data.get("mrn")
+    ds.PatientID = "" if mrn is None else str(mrn)
+
+    dob_raw = json_data.get("DoB", "")
+    dob_str = prelimSR.parse_dicom_date(dob_raw)
+    ds.PatientBirthDate = dob_str if dob_str else ""  # type 2
+
+    sex = json_data.get("PatientSex") or json_data.get("Sex") or json_data.get("SEX")
+    if sex:
+        ds.PatientSex = str(sex)[0].upper()
+    else:
+        ds.PatientSex = ""  # type 2
+
+    # ---------------------------------------------------------
+    # Study / Series timing
+    # ---------------------------------------------------------
+    study_date_raw = json_data.get("StudyDate") or json_data.get("Study Date")
+    study_time_raw = json_data.get("StudyTime") or json_data.get("Study Time")
+
+    study_date = prelimSR.parse_dicom_date(study_date_raw) if study_date_raw else None
+    study_time = prelimSR.parse_dicom_time(study_time_raw) if study_time_raw else None
+
+    # Fallback: SignedTime (YYYYMMDDHHMMSS)
+    signed = json_data.get("SignedTime")
+    if signed and (not study_date or not study_time):
+        sdate, stime = prelimSR.split_signed_time(signed)
+        if not study_date:
+            study_date = sdate
+        if not study_time:
+            study_time = stime
+
+    # Fallback: ExamTime / Contact (MM/DD/YYYY ...)
+    if not study_date or not study_time:
+        exam_time = json_data.get("ExamTime") or json_data.get("Contact")
+        if exam_time:
+            edate, etime = prelimSR.parse_datetime_mmddyyyy(exam_time)
+            if not study_date:
+                study_date = edate
+            if not study_time:
+                study_time = etime
+
+    # Final fallback: now
+    if not study_date:
+        study_date = now_date
+    if not study_time:
+        study_time = now_time
+
+    ds.StudyDate = study_date
+    ds.StudyTime = study_time
+    ds.ContentDate = study_date
+    ds.ContentTime = study_time
+
+    # ------------- StudyInstanceUID from SUID (if present) -------------
+    custom_suid = json_data.get("SUID")
+    if custom_suid:
+        ds.StudyInstanceUID = str(custom_suid)
+        prelimSR.log.info("Using StudyInstanceUID from JSON SUID: %s", custom_suid)
+    else:
+        ds.StudyInstanceUID = generate_uid()
+        prelimSR.log.info("No SUID in JSON; generated StudyInstanceUID: %s", ds.StudyInstanceUID)
+
+    ds.SeriesInstanceUID = generate_uid()
+    ds.StudyID = str(json_data.get("Accession", ""))
+    ds.AccessionNumber = str(json_data.get("Accession", ""))
+    ds.Modality = "SR"
+    ds.SeriesNumber = "1"
+    ds.InstanceNumber = "1"
+    ds.StudyDescription = str(json_data.get("ExamType", ""))
+    ds.SeriesDescription = "Preliminary Report"
+
+    # ---------------------------------------------------------
+    # General Equipment / Institution
+    # ---------------------------------------------------------
+    ds.InstitutionName = str(json_data.get("Facility", ""))
+    ds.Manufacturer = "RadInformatix"
+
+    # ---------------------------------------------------------
+    # Physicians
+    # ---------------------------------------------------------
+    ds.ReferringPhysicianName = prelimSR.split_person_name(json_data.get("Ordering", ""))
+    ds.NameOfPhysiciansReadingStudy = prelimSR.split_person_name(json_data.get("Radiologist", ""))
+
+    # ---------------------------------------------------------
+    # SR Document General
+    # ---------------------------------------------------------
+    ds.SOPClassUID = prelimSR.BASIC_TEXT_SR_SOP_CLASS_UID
+    ds.SOPInstanceUID = sop_instance_uid
+    ds.CompletionFlag = "COMPLETE"
+    ds.VerificationFlag = "UNVERIFIED"  # can change to VERIFIED later if needed
+
+    # Top-level doc concept – match working SR (“Radiology Report”)
+    doc_title = Dataset()
+    doc_title.CodeValue = "11528-7"
+    doc_title.CodingSchemeDesignator = "LN"
+    doc_title.CodeMeaning = "Radiology Report"
+    ds.ConceptNameCodeSequence = Sequence([doc_title])
+
+    # Make the SR document root explicit (matches your manual dcmtk edits)
+    ds.ValueType = "CONTAINER"
+    ds.ContinuityOfContent = "SEPARATE"
+
+    # PerformedProcedureCodeSequence (type 2)
+    ppcs_item = Dataset()
+    ppcs_item.CodeValue = "P0"
+    ppcs_item.CodingSchemeDesignator = "99LOCAL"
+    ppcs_item.CodeMeaning = str(json_data.get("ExamType", "Imaging procedure"))
+    ds.PerformedProcedureCodeSequence = Sequence([ppcs_item])
+
+    # ReferencedPerformedProcedureStepSequence (type 2, empty allowed)
+    ds.ReferencedPerformedProcedureStepSequence = Sequence([])
+
+    # ---------------------------------------------------------
+    # SR Content Tree – mimic working SR pattern
+    # ---------------------------------------------------------
+    report_text = str(json_data.get("Report", ""))
+
+    # Root item: Findings CONTAINER
+    root = Dataset()
+    root.RelationshipType = "CONTAINS"
+    root.ValueType = "CONTAINER"
+
+    findings_code = Dataset()
+    findings_code.CodeValue = "121070"
+    findings_code.CodingSchemeDesignator = "DCM"
+    findings_code.CodeMeaning = "Findings"
+    root.ConceptNameCodeSequence = Sequence([findings_code])
+
+    root.ContinuityOfContent = "SEPARATE"
+
+    # Child TEXT item: single Finding
+    text_item = Dataset()
+    text_item.RelationshipType = "CONTAINS"
+    text_item.ValueType = "TEXT"
+
+    finding_code = Dataset()
+    finding_code.CodeValue = "121071"
+    finding_code.CodingSchemeDesignator = "DCM"
+    finding_code.CodeMeaning = "Finding"
+    text_item.ConceptNameCodeSequence = Sequence([finding_code])
+
+    text_item.TextValue = report_text
+
+    # Attach child to root
+    root.ContentSequence = Sequence([text_item])
+
+    # Attach root as dataset ContentSequence[0]
+    ds.ContentSequence = Sequence([root])
+
+    prelimSR.log.debug("Root item: %s %s", ds.ContentSequence[0].RelationshipType, ds.ContentSequence[0].ValueType)
+
+    # ---------------------------------------------------------
+    # Save SR
+    # ---------------------------------------------------------
+    ds.save_as(output_path, write_like_original=False)
+
+
+def comparable(dataset):
+    """(keyword, value) of every attribute, file meta and nested items included, minus the volatile ones."""
+    elems = list(dataset.file_meta) + list(dataset.iterall())
+    return [(e.keyword, str(e.value)) for e in elems if e.VR != "SQ" and e.keyword not in VOLATILE]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=10000)
+    args = parser.parse_args()
+
+    prelimSR.log.setLevel(logging.WARNING)  # one INFO line per SR otherwise
+    rng = random.Random(7)
+    reports = [synthetic_report(i, rng) for i in range(args.reports)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.dcm")
+        template_path = os.path.join(tmp, "template.dcm")
+        for report in reports[:200]:
+            legacy_create_sr(report, legacy_path)
+            prelimSR.create_basic_text_sr_from_json(report, template_path)
+            legacy, template = comparable(pydicom.dcmread(legacy_path)), comparable(pydicom.dcmread(template_path))
+            if legacy != template:
+                print(sorted(set(legacy) ^ set(template)))
+                sys.exit(f"template output differs from legacy for accession {report['Accession']}")
+        print("legacy and template SRs carry the same attributes (200 reports checked)")
+
+        approaches = [
+            ("legacy", lambda r: legacy_create_sr(r, legacy_path)),
+            ("template file", lambda r: prelimSR.create_basic_text_sr_from_json(r, template_path)),
+            ("template bytes", prelimSR.basic_text_sr_bytes),
+        ]
+        # approaches take turns on 500-report chunks so load on the machine hits them alike
+        elapsed = dict.fromkeys((name for name, _ in approaches), 0.0)
+        for chunk_start in range(0, len(reports), 500):
+            chunk = reports[chunk_start:chunk_start + 500]
+            for name, func in approaches:
+                start = time.perf_counter()
+                for report in chunk:
+                    func(report)
+                elapsed[name] += time.perf_counter() - start
+
+        print(f"{'approach':<16}{'s total':>10}{'SRs/s':>10}{'us/SR':>10}")
+        for name, seconds in elapsed.items():
+            print(f"{name:<16}{seconds:>10.2f}{len(reports) / seconds:>10.0f}{seconds / len(reports) * 1e6:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
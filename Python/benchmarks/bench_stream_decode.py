@@ -0,0 +1,132 @@
+"""
+Check and benchmark the streaming OBX-5 base64 decode (hl7_pdf_dcm.read_hl7_to_pdf) against the previous
+read-everything path (read the file, join OBX-5, replace/pad, base64.b64decode).
+
+1. Byte-identical check: decodes a set of generated ORUs (sample PDFs, \\r / \\n / \\r\\n segments, one giant OBX,
+   marker on every OBX, stripped padding) plus any HL7 files given on the command line, both ways, and compares.
+2. Memory/time: peak traced Python allocations and wall time for both paths on a --size-mb ORU.
+
+Usage:
+    python bench_stream_decode.py [--size-mb 20] [hl7 files ...]
+"""
+
+import argparse
+import base64
+import hashlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_hl7_parser import build_oru  # noqa: E402
+from hl7_pdf_dcm import parse_hl7, read_hl7_to_pdf  # noqa: E402
+from sample_pdf import make_pdf  # noqa: E402
+
+HEADER = [
+    "MSH|^~\\&|NIGHTHAWK|RAD|RIS|FAC|20240911080808||ORU^R01|MSG0001|P|2.3",
+    "PID|1||19891213||DOENING^JANE||20250111|F",
+    "OBR|1|0111202501021|0111202501021|CTHEAD^CT BRAIN WO|||20240911000000",
+]
+
+
+def legacy_decode(hl7_path):
+    """What hl7_pdf_dcm.py did before streaming: whole file in memory, decoded in one go."""
+    with open(hl7_path, "r", encoding="utf-8", errors="ignore") as f:
+        base64_pdf = parse_hl7(f.read())[-1]
+    cleaned = base64_pdf.replace("^^PDF^Base64^", "").replace("\n", "").replace("\r", "")
+    if len(cleaned) % 4:
+        cleaned += "=" * (4 - len(cleaned) % 4)
+    return base64.b64decode(cleaned)
+
+
+def stream_decode(hl7_path, pdf_path):
+    """hl7_pdf_dcm.py now: the PDF is written while the HL7 is read."""
+    with open(pdf_path, "wb") as pdf_file:
+        msg, decoder = read_hl7_to_pdf(hl7_path, pdf_file)
+        decoder.close()
+
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def make_oru(pdf_bytes, chunk=76, newline="\r", every_chunk_marker=False, strip_padding=False):
+    payload = base64.b64encode(pdf_bytes).decode("ascii")
+    if strip_padding:
+        payload = payload.rstrip("=")
+    lines = list(HEADER)
+    for i, start in enumerate(range(0, len(payload), chunk), start=1):
+        prefix = "^^PDF^Base64^" if i == 1 or every_chunk_marker else ""
+        lines.append(f"OBX|{i}|ED|PDF^Report||{prefix}{payload[start:start + chunk]}||||||F")
+    return newline.join(lines) + newline
+
+
+def generated_cases():
+    report = make_pdf(pages=3)
+    yield "76-char OBX, \\r", make_oru(report)
+    yield "76-char OBX, \\n", make_oru(report, newline="\n")
+    yield "76-char OBX, \\r\\n", make_oru(report, newline="\r\n")
+    yield "single OBX-5", make_oru(report, chunk=10 ** 9)
+    yield "marker on every OBX", make_oru(report, chunk=64, every_chunk_marker=True)
+    yield "padding stripped", make_oru(report + b"x", strip_padding=True)
+    yield "30-page report", make_oru(make_pdf(pages=30), chunk=1000)
+
+
+def measure(func, *args):
+    """Wall time of one untraced run, then peak traced allocations of a second run (tracing slows allocation)."""
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="extra HL7 files to compare (e.g. real ORUs with embedded PDFs)")
+    parser.add_argument("--size-mb", type=float, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, "out.pdf")
+        cases = []
+        for name, text in generated_cases():
+            path = os.path.join(tmp, f"case{len(cases)}.hl7")
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                f.write(text)
+            cases.append((name, path))
+        cases += [(os.path.basename(path), path) for path in args.files]
+
+        failures = 0
+        for name, path in cases:
+            stream_decode(path, pdf_path)
+            same = legacy_decode(path) == read_bytes(pdf_path)
+            failures += not same
+            print(f"{'identical' if same else 'DIFFERENT':<10} {name}")
+
+        big_path = os.path.join(tmp, "big.hl7")
+        with open(big_path, "w", encoding="utf-8") as f:
+            f.write(build_oru(args.size_mb, 76))
+        size_mb = os.path.getsize(big_path) / 1048576
+        legacy_time, legacy_peak, legacy_pdf = measure(legacy_decode, big_path)
+        stream_time, stream_peak, _ = measure(stream_decode, big_path, pdf_path)
+
+        print(f"\n{size_mb:.1f} MB ORU")
+        print(f"{'path':<10}{'seconds':>10}{'peak traced MB':>16}")
+        print(f"{'legacy':<10}{legacy_time:>10.3f}{legacy_peak / 1048576:>16.1f}")
+        print(f"{'stream':<10}{stream_time:>10.3f}{stream_peak / 1048576:>16.1f}")
+        same = hashlib.sha256(legacy_pdf).digest() == hashlib.sha256(read_bytes(pdf_path)).digest()
+        print(f"outputs {'identical' if same else 'DIFFERENT'}")
+        failures += not same
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Dependency-free generator for simple multi-page text PDFs, used by the benchmarks as stand-in report PDFs.
+
+    from sample_pdf import make_pdf
+    pdf_bytes = make_pdf(pages=30)
+"""
+
+LETTER = (612, 792)
+
+
+def make_pdf(pages=1, lines_per_page=45):
+    """Return the bytes of a letter-size PDF with `pages` pages of report-like text."""
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = len(objects) + 1 + 2 * pages  # the Pages dict goes after every page/content pair
+    kids = []
+    for page in range(1, pages + 1):
+        text = [b"BT /F1 10 Tf 60 740 Td 14 TL"]
+        text.append(f"(PRELIMINARY REPORT - page {page} of {pages}) Tj T*".encode())
+        for line in range(lines_per_page):
+            text.append(f"(FINDINGS line {line + 1}: No acute osseous abnormality. Soft tissues unremarkable.) Tj T*"
+                        .encode())
+        text.append(b"ET")
+        stream = b"\n".join(text)
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        kids.append(add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+                        b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, *LETTER, content, font)))
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), pages))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
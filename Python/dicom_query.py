@@ -0,0 +1,235 @@
+"""
+C-FIND client with a reusable association, plus a StudyInstanceUID cache, for scripts that look studies up on PACS.
+
+    from dicom_query import FindClient, StudyUIDCache
+    client = FindClient("172.25.1.22", 5000, "REPORTGEN")
+    uid = client.find_study_uid("0111202501021RADXSU")    # None if PACS has no such study
+    client.close()
+
+FindClient keeps its association open between queries. An association that has been idle for longer than
+idle_timeout is released and reopened, and a query that fails on a reused association is retried once on a fresh one
+(PACS often drop idle associations without telling us). connect_timeout / response_timeout bound every network wait,
+so a hung PACS costs at most those seconds. Anything that stops a query from completing raises FindError.
+
+StudyUIDCache is an LRU map with a TTL, keyed by the query key (accession + facility), so addenda and re-sends for the
+same study skip the network. With a path it is loaded from / saved to a JSON file, for scripts that run once per file.
+
+Needs pynetdicom for FindClient (HAVE_PYNETDICOM is False without it; callers fall back to DCMTK findscu).
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from pydicom.dataset import Dataset
+
+try:
+    from pynetdicom import AE, evt
+    from pynetdicom.sop_class import StudyRootQueryRetrieveInformationModelFind
+except ImportError:
+    AE = None
+
+HAVE_PYNETDICOM = AE is not None
+
+log = logging.getLogger(__name__)
+logging.getLogger("pynetdicom").setLevel(logging.WARNING)  # it logs every PDU at INFO
+
+STATUS_SUCCESS = 0x0000
+STATUS_PENDING = (0xFF00, 0xFF01)
+
+
+class FindError(Exception):
+    """The C-FIND could not be completed: PACS unreachable, association rejected/aborted, timeout or failure status."""
+
+
+class FindClient:
+    """Study Root C-FIND SCU that reuses one association across queries. Safe to share between threads."""
+
+    def __init__(self, peer, port, calling_aet, called_aet="ANY-SCP", connect_timeout=5, response_timeout=15,
+                 idle_timeout=60):
+        if AE is None:
+            raise ImportError("pynetdicom is required for FindClient")
+        self.peer = peer
+        self.port = port
+        self.called_aet = called_aet
+        self.idle_timeout = idle_timeout
+        self.associations_opened = 0
+
+        self._ae = AE(ae_title=calling_aet)
+        self._ae.add_requested_context(StudyRootQueryRetrieveInformationModelFind)
+        self._ae.connection_timeout = connect_timeout
+        self._ae.acse_timeout = connect_timeout
+        self._ae.dimse_timeout = response_timeout
+        self._ae.network_timeout = response_timeout
+        self._assoc = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def find(self, query):
+        """Send one Study Root C-FIND; returns the matching identifiers (possibly empty). Raises FindError."""
+        with self._lock:
+            reused = self._association_is_fresh()
+            for attempt in (1, 2):
+                assoc = self._association()
+                try:
+                    return self._send(assoc, query)
+                except _AssociationLost as e:
+                    self._drop()
+                    if not reused or attempt == 2:
+                        raise FindError(str(e)) from None
+                    log.info("Association to %s:%s was lost (%s); retrying on a new one", self.peer, self.port, e)
+                    reused = False
+
+    def find_study_uid(self, accession):
+        """StudyInstanceUID of the study with this AccessionNumber, or None if PACS has no match."""
+        query = Dataset()
+        query.QueryRetrieveLevel = "STUDY"
+        query.AccessionNumber = accession
+        query.StudyInstanceUID = ""
+        for identifier in self.find(query):
+            uid = str(identifier.get("StudyInstanceUID", "") or "").strip()
+            if uid:
+                return uid
+        return None
+
+    def close(self):
+        with self._lock:
+            if self._assoc is not None and self._assoc.is_established:
+                self._assoc.release()
+            self._assoc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _association_is_fresh(self):
+        return (self._assoc is not None and self._assoc.is_established
+                and time.monotonic() - self._last_used < self.idle_timeout)
+
+    def _association(self):
+        if self._association_is_fresh():
+            return self._assoc
+        self._drop()
+        assoc = self._ae.associate(self.peer, self.port, ae_title=self.called_aet,
+                                   evt_handlers=[(evt.EVT_CONN_OPEN, _no_delay)])
+        if not assoc.is_established:
+            raise FindError(f"Association with {self.called_aet}@{self.peer}:{self.port} failed "
+                            f"({'rejected' if assoc.is_rejected else 'no response'})")
+        self.associations_opened += 1
+        self._assoc = assoc
+        return assoc
+
+    def _send(self, assoc, query):
+        matches = []
+        try:
+            for status, identifier in assoc.send_c_find(query, StudyRootQueryRetrieveInformationModelFind):
+                if not status:
+                    raise _AssociationLost("no response (timed out or association aborted)")
+                if status.Status in STATUS_PENDING:
+                    if identifier is not None:
+                        matches.append(identifier)
+                elif status.Status == STATUS_SUCCESS:
+                    break
+                else:
+                    raise FindError(f"C-FIND failed with status 0x{status.Status:04X}")
+        except (RuntimeError, OSError) as e:
+            raise _AssociationLost(str(e)) from None
+        self._last_used = time.monotonic()
+        return matches
+
+    def _drop(self):
+        if self._assoc is not None:
+            if self._assoc.is_established:
+                self._assoc.abort()
+            self._assoc = None
+
+
+class _AssociationLost(Exception):
+    pass
+
+
+def _no_delay(event):
+    """
+    Turn off Nagle on the association's socket. A C-FIND request is two small writes (command, then identifier), and
+    Nagle plus the peer's delayed ACK otherwise adds ~40 ms to every query on a kept-open association.
+    """
+    try:
+        event.assoc.dul.socket.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except (AttributeError, OSError):
+        pass
+
+
+class StudyUIDCache:
+    """
+    LRU map of query key -> StudyInstanceUID whose entries expire after `ttl` seconds. Only found UIDs are stored: a
+    study PACS doesn't have yet may arrive later. Thread-safe. With `path`, entries are loaded from that JSON file and
+    written back by save().
+    """
+
+    def __init__(self, maxsize=5000, ttl=24 * 3600, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()  # key -> (uid, stored_at), least recently used first
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, uid):
+        with self._lock:
+            self._entries[key] = (uid, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def save(self):
+        """Write the live entries to `path` (atomically, so a concurrent run never reads half a file)."""
+        if not self.path:
+            return
+        with self._lock:
+            now = time.time()
+            rows = [[key, uid, stored] for key, (uid, stored) in self._entries.items() if now - stored <= self.ttl]
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(rows, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.warning("Could not save StudyInstanceUID cache %s: %s", self.path, e)
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                rows = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.warning("Ignoring unreadable StudyInstanceUID cache %s: %s", self.path, e)
+            return
+        now = time.time()
+        for key, uid, stored in rows[-self.maxsize:]:
+            if now - stored <= self.ttl:
+                self._entries[key] = (uid, stored)
@@ -0,0 +1,289 @@
+"""
+C-STORE sender that keeps its associations open, for sending many files to the same PACS.
+
+    from dicom_sender import StoreClients
+    senders = StoreClients("192.168.1.25", 104)
+    seconds = senders.send("/var/lib/filemonitor/PrelimSR/DICOM/FAC1_0111.dcm", "FAC1", "NIGHTHAWK_SR")
+    senders.close()
+
+    python dicom_sender.py [-aet AET] [-aec AEC] [--decompress] host port file_or_dir...
+
+filemonitor.sh runs `dcmdjpeg` and `storescu` for every file, so every instance pays for two process starts and a new
+association. A StoreClient keeps one association (one calling AET -> called AET pair) open and sends each file over
+it; StoreClients holds one StoreClient per pair, created on first use, so each facility AET of the PrelimSR files keeps
+its own association. Files can be sent one at a time as they arrive or as a list (send_files); either way they share
+the open association.
+
+Associations are opened with presentation contexts for the SOP classes this pipeline sends (Secondary Capture,
+Encapsulated PDF, SR); a file of another SOP class or transfer syntax reopens the association with its context added.
+As in dicom_query.FindClient, an association idle for longer than idle_timeout is reopened, and a send that fails on
+a reused association is retried once on a new one. When the PACS can't be reached the send is retried after each of
+reconnect_delays seconds before giving up. Anything that stops a file from being stored raises StoreError.
+
+decompress=True sends JPEG-compressed files (img2dcm output) decoded in memory, as dcmdjpeg would decode them to disk.
+
+Needs pydicom and pynetdicom (HAVE_PYNETDICOM is False without pynetdicom; callers fall back to DCMTK storescu), and
+Pillow to decompress JPEG.
+"""
+
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+
+import pydicom
+from pydicom.filereader import read_file_meta_info
+from pydicom.uid import ExplicitVRLittleEndian, ImplicitVRLittleEndian, UID
+
+try:
+    from pynetdicom import AE, build_context, evt
+    from pynetdicom.sop_class import (
+        BasicTextSRStorage, ComprehensiveSRStorage, EncapsulatedPDFStorage, EnhancedSRStorage,
+        SecondaryCaptureImageStorage,
+    )
+except ImportError:
+    AE = None
+
+HAVE_PYNETDICOM = AE is not None
+
+log = logging.getLogger(__name__)
+logging.getLogger("pynetdicom").setLevel(logging.WARNING)  # it logs every PDU at INFO
+
+STATUS_SUCCESS = 0x0000
+STATUS_WARNING = (0x0001, 0xB000, 0xB006, 0xB007)  # stored, with coercion or elements discarded
+UNCOMPRESSED = (ExplicitVRLittleEndian, ImplicitVRLittleEndian)
+DEFAULT_SOP_CLASSES = (
+    (SecondaryCaptureImageStorage, EncapsulatedPDFStorage, BasicTextSRStorage, EnhancedSRStorage,
+     ComprehensiveSRStorage) if HAVE_PYNETDICOM else ()
+)
+MAX_CONTEXTS = 128  # per association (PS3.8)
+
+
+class StoreError(Exception):
+    """The file could not be stored: unreadable, PACS unreachable, association rejected/aborted or a failure status."""
+
+
+class StoreClient:
+    """Storage SCU that sends every file over one kept-open association. Safe to share between threads."""
+
+    def __init__(self, peer, port, calling_aet, called_aet="ANY-SCP", connect_timeout=5, response_timeout=30,
+                 idle_timeout=60, reconnect_delays=(1, 2, 5)):
+        if AE is None:
+            raise ImportError("pynetdicom is required for StoreClient")
+        self.peer = peer
+        self.port = port
+        self.calling_aet = calling_aet
+        self.called_aet = called_aet
+        self.idle_timeout = idle_timeout
+        self.reconnect_delays = reconnect_delays
+        self.associations_opened = 0
+
+        self._ae = AE(ae_title=calling_aet)
+        self._ae.connection_timeout = connect_timeout
+        self._ae.acse_timeout = connect_timeout
+        self._ae.dimse_timeout = response_timeout
+        self._ae.network_timeout = response_timeout
+        self._contexts = {(sop_class, ts) for sop_class in DEFAULT_SOP_CLASSES for ts in UNCOMPRESSED}
+        self._assoc = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def send(self, path, decompress=False):
+        """Store one file; returns the seconds it took (including any reconnect). Raises StoreError."""
+        dataset, sop_class, transfer_syntax = _load(path, decompress)
+        started = time.perf_counter()
+        with self._lock:
+            reused = self._association_is_fresh()
+            delays = iter(self.reconnect_delays)
+            while True:
+                try:
+                    self._store(self._association(sop_class, transfer_syntax), dataset, sop_class)
+                    break
+                except _AssociationLost as e:
+                    self._drop()
+                    if reused:
+                        log.info("Association to %s was lost (%s); retrying on a new one", self._peer_name(), e)
+                        reused = False
+                        continue
+                    delay = next(delays, None)
+                    if delay is None:
+                        raise StoreError(f"{os.path.basename(path)}: {e}") from None
+                    log.warning("%s; retrying in %s s", e, delay)
+                    time.sleep(delay)
+        elapsed = time.perf_counter() - started
+        log.debug("Stored %s on %s in %.1f ms", os.path.basename(path), self._peer_name(), elapsed * 1000)
+        return elapsed
+
+    def send_files(self, paths, decompress=False):
+        """Store several files over the same association; returns [(path, seconds or StoreError)] in order."""
+        results = []
+        for path in paths:
+            try:
+                results.append((path, self.send(path, decompress)))
+            except StoreError as e:
+                results.append((path, e))
+        return results
+
+    def close(self):
+        with self._lock:
+            if self._assoc is not None and self._assoc.is_established:
+                self._assoc.release()
+            self._assoc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _peer_name(self):
+        return f"{self.called_aet}@{self.peer}:{self.port} (as {self.calling_aet})"
+
+    def _association_is_fresh(self):
+        return (self._assoc is not None and self._assoc.is_established
+                and time.monotonic() - self._last_used < self.idle_timeout)
+
+    def _association(self, sop_class, transfer_syntax):
+        if self._association_is_fresh():
+            if _accepts(self._assoc, sop_class, transfer_syntax):
+                return self._assoc
+            self._assoc.release()  # reopen it with the new context added
+        self._drop()
+        syntaxes = UNCOMPRESSED if transfer_syntax in UNCOMPRESSED else (transfer_syntax,)
+        self._contexts.update((sop_class, ts) for ts in syntaxes)
+        # One context per SOP class and transfer syntax, as storescu proposes them, the file's own first
+        contexts = sorted(self._contexts, key=lambda c: (c != (sop_class, transfer_syntax), c))
+        assoc = self._ae.associate(self.peer, self.port, ae_title=self.called_aet,
+                                   contexts=[build_context(*context) for context in contexts[:MAX_CONTEXTS]],
+                                   evt_handlers=[(evt.EVT_CONN_OPEN, _no_delay)])
+        if not assoc.is_established:
+            raise _AssociationLost(f"Association with {self._peer_name()} failed "
+                                   f"({'rejected' if assoc.is_rejected else 'no response'})")
+        self.associations_opened += 1
+        self._assoc = assoc
+        if not _accepts(assoc, sop_class, transfer_syntax):
+            raise StoreError(f"{self.called_aet} does not accept {sop_class.name} in {transfer_syntax.name}")
+        return assoc
+
+    def _store(self, assoc, dataset, sop_class):
+        try:
+            status = assoc.send_c_store(dataset)
+        except (RuntimeError, OSError) as e:
+            raise _AssociationLost(str(e)) from None
+        if not status:
+            raise _AssociationLost("no response (timed out or association aborted)")
+        self._last_used = time.monotonic()
+        if status.Status in STATUS_WARNING:
+            log.warning("%s stored with warning status 0x%04X", sop_class.name, status.Status)
+        elif status.Status != STATUS_SUCCESS:
+            raise StoreError(f"C-STORE failed with status 0x{status.Status:04X}")
+
+    def _drop(self):
+        if self._assoc is not None:
+            if self._assoc.is_established:
+                self._assoc.abort()
+            self._assoc = None
+
+
+class StoreClients:
+    """One StoreClient per (calling AET, called AET) pair, opened on first use. Safe to share between threads."""
+
+    def __init__(self, peer, port, **options):
+        self.peer = peer
+        self.port = port
+        self.options = options
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self, calling_aet, called_aet):
+        with self._lock:
+            client = self._clients.get((calling_aet, called_aet))
+            if client is None:
+                client = StoreClient(self.peer, self.port, calling_aet, called_aet, **self.options)
+                self._clients[(calling_aet, called_aet)] = client
+            return client
+
+    def send(self, path, calling_aet, called_aet, decompress=False):
+        return self.client(calling_aet, called_aet).send(path, decompress)
+
+    def close(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+
+class _AssociationLost(Exception):
+    pass
+
+
+def _load(path, decompress):
+    """What to hand send_c_store (the path, or the decoded dataset), its SOP class and transfer syntax."""
+    try:
+        meta = read_file_meta_info(path)
+        sop_class = UID(meta.MediaStorageSOPClassUID)
+        transfer_syntax = UID(meta.TransferSyntaxUID)
+        if not (decompress and transfer_syntax.is_compressed):
+            return path, sop_class, transfer_syntax  # pynetdicom streams the file as it is
+        dataset = pydicom.dcmread(path)
+        dataset.decompress()
+        return dataset, sop_class, UID(dataset.file_meta.TransferSyntaxUID)
+    except Exception as e:
+        raise StoreError(f"{os.path.basename(path)}: could not be read for sending: {e}") from None
+
+
+def _accepts(assoc, sop_class, transfer_syntax):
+    return any(context.abstract_syntax == sop_class and context.transfer_syntax[0] == transfer_syntax
+               for context in assoc.accepted_contexts)
+
+
+def _no_delay(event):
+    """Turn off Nagle on the association's socket (see dicom_query._no_delay)."""
+    try:
+        event.assoc.dul.socket.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except (AttributeError, OSError):
+        pass
+
+
+def _files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            yield from sorted(entry.path for entry in os.scandir(path) if entry.is_file())
+        else:
+            yield path
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    calling_aet, called_aet, decompress = "DICOM_SENDER", "ANY-SCP", False
+    while args and args[0].startswith("-"):
+        option = args.pop(0)
+        if option == "-aet" and args:
+            calling_aet = args.pop(0)
+        elif option == "-aec" and args:
+            called_aet = args.pop(0)
+        elif option == "--decompress":
+            decompress = True
+        else:
+            args = []
+    if len(args) < 3 or not args[1].isdigit():
+        print("Usage: dicom_sender.py [-aet AET] [-aec AEC] [--decompress] host port file_or_dir...", file=sys.stderr)
+        sys.exit(2)
+
+    failed = 0
+    started = time.perf_counter()
+    with StoreClient(args[0], int(args[1]), calling_aet, called_aet) as sender:
+        results = sender.send_files(_files(args[2:]), decompress)
+        for path, result in results:
+            if isinstance(result, StoreError):
+                failed += 1
+                print(result, file=sys.stderr)
+            else:
+                print(f"{path}: stored in {result * 1000:.1f} ms")
+    elapsed = time.perf_counter() - started
+    print(f"{len(results) - failed} of {len(results)} stored in {elapsed:.2f} s over "
+          f"{sender.associations_opened} association(s)")
+    sys.exit(1 if failed else 0)
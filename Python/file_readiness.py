@@ -0,0 +1,110 @@
+"""
+Decide when an inbound file is completely written, without paying a fixed polling delay on every file.
+
+filemonitor.sh hands files over on inotify close_write / moved_to. At that point the writer has closed the file (or a
+finished file was renamed into place), so it can be used straight away. Polling for a stable size is only needed when
+those events can't be trusted:
+  - the file is on a network filesystem (NFS, CIFS/SMB, ...): inotify only sees writes made by this host, so a remote
+    writer may still be appending when the local event fires
+  - FILE_READINESS=poll forces polling everywhere (e.g. a sender that writes in several open/close passes)
+
+    from file_readiness import wait_until_ready
+    ready, waited = wait_until_ready(path)   # waited = seconds spent polling, 0.0 when the event was trusted
+
+FILE_READINESS (environment): auto (default; poll only on network filesystems), event (never poll), poll (always poll).
+filemonitor.sh exports the same setting and applies the same rule to its own waits.
+"""
+
+import os
+import time
+
+FILE_READINESS = os.environ.get("FILE_READINESS", "auto")
+
+# The same list as NETWORK_FS_TYPES in BASH/filemonitor.sh; change both together
+NETWORK_FS_TYPES = {
+    "nfs", "nfs4", "cifs", "smb", "smb2", "smb3", "smbfs", "ncpfs", "afs", "9p", "ceph", "glusterfs", "fuse.glusterfs",
+    "fuse.sshfs", "davfs", "fuse.davfs2", "lustre", "gpfs",
+}
+MOUNTS_FILE = "/proc/mounts"
+MOUNTS_TTL = 60  # seconds; resident workers pick up new mounts after this long
+
+_mounts = None
+_mounts_read_at = 0.0
+
+
+def _unescape(field):
+    """/proc/mounts writes space, tab, newline and backslash in mount points as octal escapes (\\040 etc.)."""
+    if "\\" not in field:
+        return field
+    return field.encode("latin-1").decode("unicode_escape")
+
+
+def _mount_table():
+    """(mount point, fs type) pairs, longest mount point first, re-read every MOUNTS_TTL seconds."""
+    global _mounts, _mounts_read_at
+    now = time.monotonic()
+    if _mounts is None or now - _mounts_read_at > MOUNTS_TTL:
+        mounts = []
+        try:
+            with open(MOUNTS_FILE, encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) >= 3:
+                        mounts.append((_unescape(parts[1]), parts[2]))
+        except OSError:
+            pass
+        mounts.sort(key=lambda m: len(m[0]), reverse=True)
+        _mounts, _mounts_read_at = mounts, now
+    return _mounts
+
+
+def filesystem_type(path):
+    """Type of the filesystem `path` lives on (e.g. "ext4", "nfs4"), or None if it can't be told."""
+    path = os.path.realpath(path)
+    for mount_point, fs_type in _mount_table():
+        if path == mount_point or path.startswith(mount_point.rstrip("/") + "/"):
+            return fs_type
+    return None
+
+
+def is_network_path(path):
+    return filesystem_type(path) in NETWORK_FS_TYPES
+
+
+def wait_for_stable_size(file_path, max_wait=30, check_interval=0.5, required_stable=2):
+    """Poll until the file size has been the same for `required_stable` checks in a row. False on timeout/error."""
+    if not os.path.exists(file_path):
+        return False
+
+    last_size = -1
+    stable_count = 0
+    for _ in range(int(max_wait / check_interval)):
+        try:
+            current_size = os.path.getsize(file_path)
+        except OSError:
+            return False
+        if current_size == last_size:
+            stable_count += 1
+            if stable_count >= required_stable:
+                return True
+        else:
+            stable_count = 0
+            last_size = current_size
+        time.sleep(check_interval)
+    return False
+
+
+def wait_until_ready(file_path, mode=None, max_wait=30, check_interval=0.5):
+    """
+    Wait until `file_path` is completely written, trusting the inotify event unless `mode` (default FILE_READINESS)
+    says to poll. Returns (ready, seconds spent waiting).
+    """
+    mode = mode or FILE_READINESS
+    if not os.path.exists(file_path):
+        return False, 0.0
+    if mode == "event" or (mode != "poll" and not is_network_path(file_path)):
+        return True, 0.0
+
+    start = time.perf_counter()
+    ready = wait_for_stable_size(file_path, max_wait, check_interval)
+    return ready, time.perf_counter() - start
@@ -0,0 +1,246 @@
+"""
+Python port of PowerShell/HL7-Accession-MRN-Tracker.ps1: finds accession numbers that occur too often across a folder
+of HL7 flat files, reports the MRNs and files they occur with, and removes the messages that carry them.
+
+    python hl7_accession_tracker.py [input_folder [output_file]] [--threshold N] [--dry-run]
+
+Same rules as the PowerShell script:
+  - every file in input_folder is read line by line (one segment per line); lines are trimmed, and blank lines or
+    lines shorter than 3 characters are skipped
+  - a message starts at each MSH line (lines before the first MSH count as message 1)
+  - the MRN is PID-2, or PID-3 when PID-2 is empty ("<no MRN>" when both are)
+  - ORC-2, ORC-3, OBR-2 and OBR-3 are accessions; each non-empty one is counted against the current MRN and file
+  - an accession counted more than DUPLICATE_THRESHOLD times is a duplicate; output_file gets one line per duplicate
+    ("Duplicate Accession: X (appears N time(s)) - MRNs: ... - Files: ..."), or "No duplicates found."
+  - every message containing a duplicate accession is removed from its file (blank lines are left in place)
+  - the field counts of ORC-2/ORC-3/OBR-2/OBR-3 values seen more than once are printed
+
+Differences: the index is built in one streaming pass and the files are rewritten with one more pass over just the
+files that lose messages (through a temp file that replaces the original, keeping each kept line byte for byte).
+Values are compared exactly, where PowerShell hashtables ignore case. Duplicates, MRNs and files are listed in the
+order first seen (PowerShell lists them in hash order). The .ps1 removal also dropped the wrong lines when the first
+or last line of a file was removed; that isn't reproduced.
+"""
+
+import os
+import sys
+import tempfile
+from array import array
+
+DUPLICATE_THRESHOLD = 4  # an accession seen more often than this is a duplicate
+NO_MRN = "<no MRN>"
+EMPTY = "<empty>"
+COUNTED_FIELDS = ("OBR-2", "OBR-3", "ORC-2", "ORC-3")
+
+READ_BUFFER = 1 << 20
+MESSAGE_BITS = 40  # occurrences are stored as file number << MESSAGE_BITS | message number
+
+
+def _lines(path):
+    """Lines of a file with their endings (\\r, \\n or \\r\\n, as Get-Content splits them); undecodable bytes survive."""
+    return open(path, "r", encoding="utf-8", errors="surrogateescape", newline="", buffering=READ_BUFFER)
+
+
+class AccessionIndex:
+    """
+    accession -> MRN counts, file counts and the messages it occurs in, built from one pass over each file.
+
+    Strings are interned, and each accession's occurrences are one array of packed (file, message) numbers rather
+    than a list per line, so a few million accessions fit in memory.
+    """
+
+    def __init__(self):
+        self.files = []  # file paths, by file number
+        self.mrns = {}  # accession -> {mrn: count}, insertion ordered
+        self.file_counts = {}  # accession -> {file name: count}
+        self.occurrences = {}  # accession -> array of file number << MESSAGE_BITS | message number
+        self.field_counts = {field: {} for field in COUNTED_FIELDS}
+
+    def count(self, accession):
+        occurrences = self.occurrences.get(accession)
+        return len(occurrences) if occurrences is not None else 0
+
+    def add_file(self, path):
+        """Index one flat file. Returns the number of messages in it."""
+        file_number = len(self.files)
+        self.files.append(path)
+        file_name = sys.intern(os.path.basename(path))
+        intern = sys.intern
+        mrns, file_counts, occurrences = self.mrns, self.file_counts, self.occurrences
+        counts = self.field_counts
+        message = 0
+        mrn = ""
+
+        with _lines(path) as f:
+            for line in f:
+                line = line.strip()
+                if len(line) < 3:
+                    continue
+                segment = line[:3]
+                if segment == "MSH":
+                    message += 1
+                elif message == 0:
+                    message = 1
+                if segment == "PID":
+                    fields = line.split("|", 4)
+                    mrn = _field(fields, 2) or _field(fields, 3)
+                    continue
+                if segment != "ORC" and segment != "OBR":
+                    continue
+
+                fields = line.split("|", 4)
+                mrn_to_use = intern(mrn) if mrn else NO_MRN
+                ref = file_number << MESSAGE_BITS | message
+                for index in (2, 3):
+                    accession = _field(fields, index)
+                    field_count = counts[f"{segment}-{index}"]
+                    key = accession or EMPTY
+                    field_count[key] = field_count.get(key, 0) + 1
+                    if not accession:
+                        continue
+
+                    entry = occurrences.get(accession)
+                    if entry is None:
+                        accession = intern(accession)
+                        occurrences[accession] = array("Q", (ref,))
+                        mrns[accession] = {mrn_to_use: 1}
+                        file_counts[accession] = {file_name: 1}
+                        continue
+                    entry.append(ref)
+                    by_mrn = mrns[accession]
+                    by_mrn[mrn_to_use] = by_mrn.get(mrn_to_use, 0) + 1
+                    by_file = file_counts[accession]
+                    by_file[file_name] = by_file.get(file_name, 0) + 1
+        return message
+
+    def duplicates(self, threshold=DUPLICATE_THRESHOLD):
+        """Accessions counted more than `threshold` times, in the order first seen."""
+        return [accession for accession, refs in self.occurrences.items() if len(refs) > threshold]
+
+    def report_line(self, accession):
+        mrn_info = ", ".join(f"No MRN ({count} time(s))" if mrn == NO_MRN else f"{mrn} ({count} time(s))"
+                             for mrn, count in self.mrns[accession].items())
+        file_info = ", ".join(f"{name} ({count} time(s))" for name, count in self.file_counts[accession].items())
+        return (f"Duplicate Accession: {accession} (appears {self.count(accession)} time(s))"
+                f"{' - MRNs: ' + mrn_info if mrn_info else ''}{' - Files: ' + file_info if file_info else ''}")
+
+    def messages_to_remove(self, accessions):
+        """{file path: set of message numbers} holding any of the accessions."""
+        mask = (1 << MESSAGE_BITS) - 1
+        marked = {}
+        for accession in accessions:
+            for ref in self.occurrences[accession]:
+                marked.setdefault(self.files[ref >> MESSAGE_BITS], set()).add(ref & mask)
+        return marked
+
+
+def _field(fields, index):
+    return fields[index].strip() if len(fields) > index else ""
+
+
+def remove_messages(path, messages):
+    """
+    Rewrite `path` without the given message numbers (numbered as AccessionIndex.add_file numbers them); other lines
+    are copied unchanged. Returns the number of lines removed.
+    """
+    directory, name = os.path.split(path)
+    fd, temp_file = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory or ".")
+    removed = 0
+    message = 0
+    try:
+        with _lines(path) as f, open(fd, "w", encoding="utf-8", errors="surrogateescape", newline="",
+                                     buffering=READ_BUFFER) as out:
+            for raw in f:
+                line = raw.strip()
+                if len(line) >= 3:
+                    if line.startswith("MSH"):
+                        message += 1
+                    elif message == 0:
+                        message = 1
+                    if message in messages:
+                        removed += 1
+                        continue
+                out.write(raw)
+        os.chmod(temp_file, os.stat(path).st_mode & 0o7777)
+        os.replace(temp_file, path)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.unlink(temp_file)
+        raise
+    return removed
+
+
+def track_accessions(input_folder, output_file, threshold=DUPLICATE_THRESHOLD, remove=True):
+    """Run the whole check on a folder, printing progress like the PowerShell script; returns the AccessionIndex."""
+    input_files = sorted(entry.path for entry in os.scandir(input_folder) if entry.is_file())
+    index = AccessionIndex()
+    if not input_files:
+        print(f"No files found in input folder: {input_folder}")
+        return index
+
+    print(f"Found {len(input_files)} file(s) to process...\n")
+    processed = errors = 0
+    for path in input_files:
+        print(f"Processing: {os.path.basename(path)}...")
+        try:
+            index.add_file(path)
+        except OSError as e:
+            errors += 1
+            print(f"  ✗ Error processing {os.path.basename(path)}: {e}\n")
+            continue
+        processed += 1
+        print("  ✓ Completed\n")
+    print("File processing complete!")
+    print(f"  Successfully processed: {processed} file(s)")
+    if errors:
+        print(f"  Errors: {errors} file(s)")
+    print()
+
+    duplicates = index.duplicates(threshold)
+    if remove:
+        print("Removing duplicate lines from files...")
+        for path, messages in index.messages_to_remove(duplicates).items():
+            try:
+                print(f"  Removed {remove_messages(path, messages)} line(s) from: {os.path.basename(path)}")
+            except OSError as e:
+                print(f"  ✗ Error removing lines from {os.path.basename(path)}: {e}")
+        print()
+
+    print("Field Counts (showing only counts > 1):\n")
+    has_counts = False
+    for field in sorted(index.field_counts):
+        for value, count in sorted(index.field_counts[field].items(), key=lambda item: (item[0].casefold(), item[0])):
+            if count > 1:
+                print(f"{field}: {value}, Count: {count}")
+                has_counts = True
+    if not has_counts:
+        print("No counts greater than 1 found.")
+    print(f"\nRan check on folder: {input_folder}\n")
+
+    with open(output_file, "w", encoding="utf-8", errors="surrogateescape") as out:
+        if duplicates:
+            print(f"Found {len(duplicates)} duplicate(s). Exporting to {output_file}...")
+            for accession in duplicates:
+                out.write(index.report_line(accession) + "\n")
+            print(f"Duplicates exported to {output_file}")
+        else:
+            print("No duplicates found.")
+            out.write("No duplicates found.\n")
+    return index
+
+
+# Input/Output (defaults when run without arguments)
+input_folder = "/var/lib/hl7/priors"
+output_file = "duplicatesACCMRN.txt"
+
+if __name__ == "__main__":
+    threshold = int(sys.argv[sys.argv.index("--threshold") + 1]) if "--threshold" in sys.argv else DUPLICATE_THRESHOLD
+    args = [a for i, a in enumerate(sys.argv[1:], 1) if not a.startswith("--") and sys.argv[i - 1] != "--threshold"]
+    if len(args) > 2:
+        print("Usage: hl7_accession_tracker.py [input_folder [output_file]] [--threshold N] [--dry-run]")
+        sys.exit(1)
+    if args:
+        input_folder = args[0]
+        output_file = args[1] if len(args) > 1 else output_file
+
+    track_accessions(input_folder, output_file, threshold, remove="--dry-run" not in sys.argv)
@@ -0,0 +1,262 @@
+"""
+Value-frequency histograms of HL7 flat-file fields: how often each value of OBR-24, MSH-4, OBR-4.2, ... occurs, for
+any number of fields at once, in one streaming pass. Replaces PowerShell/HL7-Field-Counter.ps1 and the obr24counts
+step used to decide the replacement tables for hl7_rewrite.py / OBR24Update.py.
+
+    python hl7_field_profiler.py input... [--fields OBR-24,MSH-4,OBR-4.2] [--output counts.csv | counts.json]
+                                 [--top N] [--max-values N] [--workers N]
+
+input is any number of flat files or directories (every .txt file in them). Fields are SEG-N or SEG-N.C references
+(MSH fields numbered as in the standard, MSH-3 being the sending application); without --fields, the fields of
+HL7-Field-Counter.ps1 and OBR-24 are profiled. Counting follows the .ps1:
+  - lines are trimmed and each segment of a field's type counts once, even when a message has several
+  - the value is the field (or its Nth component) with surrounding whitespace removed, "<empty>" when blank or missing
+Output goes to stdout as "FIELD: value, Count: N" lines, most frequent first, or to a .csv (field, value, count,
+error) or .json file given with --output; --top N keeps the N most frequent values per field.
+
+Memory stays bounded on free-text or unique fields: each field keeps at most --max-values distinct values (default
+MAX_VALUES). Up to that many its counts are exact. Past it the counter becomes a Space-Saving heavy-hitters sketch:
+the least frequent half of the values is dropped, and a value seen afterwards starts from the highest count dropped so
+far (the field's floor) instead of from zero. A count then overstates the true count by at most its error column, and
+a value missing from the list occurred at most floor times, so everything more frequent than the floor is listed.
+
+With --workers N (default: one per CPU) big files are cut at MSH boundaries into shards (see hl7_shard.py) that are
+profiled by a process pool; the per-shard counters are merged, exactly while they are exact.
+"""
+
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+
+from hl7_parser import DEFAULT_DELIMITERS, field_split_index, parse_delimiters, parse_field_spec
+from hl7_rewrite import READ_BUFFER
+from hl7_shard import MIN_SHARD_SIZE, SHARDS_PER_WORKER, find_message_shards, open_shard
+
+MAX_VALUES = 10000  # distinct values kept per field
+EMPTY = "<empty>"
+
+# Fields profiled when no --fields are given: those of HL7-Field-Counter.ps1, plus OBR-24
+fields = ["MSH-3", "MSH-4", "MSH-5", "MSH-6", "ORC-5", "ORC-17", "OBR-18", "OBR-24"]
+
+
+class ValueCounter:
+    """
+    Counts of the values of one field: exact up to max_values distinct values, a Space-Saving sketch after that.
+
+    Each count overstates the true count by at most errors.get(value, 0); values not in counts occurred at most floor
+    times. floor is 0, and every count exact, until the first prune.
+    """
+
+    def __init__(self, max_values=MAX_VALUES):
+        if max_values < 2:
+            raise ValueError("max_values must be at least 2")
+        self.max_values = max_values
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+        self.total = 0
+
+    @property
+    def exact(self):
+        return self.floor == 0
+
+    def add(self, value):
+        self.total += 1
+        count = self.counts.get(value)
+        if count is not None:
+            self.counts[value] = count + 1
+            return
+        self.counts[value] = self.floor + 1
+        if self.floor:
+            self.errors[value] = self.floor
+        if len(self.counts) > self.max_values:
+            self._prune()
+
+    def _prune(self):
+        """Keep the max_values // 2 most frequent values; raise the floor to the highest count dropped."""
+        keep = self.max_values // 2
+        ranked = sorted(self.counts.items(), key=itemgetter(1), reverse=True)
+        self.floor = max(self.floor, ranked[keep][1])
+        self.counts = dict(ranked[:keep])
+        self.errors = {value: error for value, error in self.errors.items() if value in self.counts}
+
+    def merge(self, other):
+        """Add the counts of another ValueCounter (e.g. from another shard) to this one."""
+        counts, errors = {}, {}
+        for value in self.counts.keys() | other.counts.keys():
+            error = 0
+            count = self.counts.get(value)
+            if count is None:
+                count = error = self.floor
+            else:
+                error = self.errors.get(value, 0)
+            other_count = other.counts.get(value)
+            if other_count is None:
+                count += other.floor
+                error += other.floor
+            else:
+                count += other_count
+                error += other.errors.get(value, 0)
+            counts[value] = count
+            if error:
+                errors[value] = error
+        self.counts, self.errors = counts, errors
+        self.floor += other.floor
+        self.total += other.total
+        if len(self.counts) > self.max_values:
+            self._prune()
+        return self
+
+    def most_common(self, n=None):
+        """[(value, count, error), ...], most frequent first (ties by value)."""
+        ranked = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+        return [(value, count, self.errors.get(value, 0)) for value, count in ranked[:n]]
+
+
+def compile_fields(specs):
+    """["OBR-24", "OBR-4.2", ...] -> {"OBR": [("OBR-24", split position, None), ("OBR-4.2", 4, 2)], ...}"""
+    table = {}
+    for spec in specs:
+        segment, field, component = parse_field_spec(spec)
+        if segment == "MSH" and field == 1:
+            raise ValueError(f"{spec}: MSH-1 is the field separator itself")
+        name = f"{segment}-{field}" + (f".{component}" if component is not None else "")
+        table.setdefault(segment, []).append((name, field_split_index(segment, field), component))
+    return table
+
+
+def profile_lines(infile, table, counters):
+    """Count the fields of `table` over every line of infile into counters ({field name: ValueCounter})."""
+    delimiters = DEFAULT_DELIMITERS
+    targets = {segment: [(counters[name].add, position, component) for name, position, component in wanted]
+               for segment, wanted in table.items()}
+    for line in infile:
+        line = line.strip()
+        segment = line[:3]
+        if segment == "MSH":
+            delimiters = parse_delimiters(line)
+        wanted = targets.get(segment)
+        if wanted is None:
+            continue
+        values = line.split(delimiters.field)
+        for add, position, component in wanted:
+            value = values[position].strip() if position < len(values) else ""
+            if component is not None and value:
+                components = value.split(delimiters.component)
+                value = components[component - 1].strip() if component <= len(components) else ""
+            add(value or EMPTY)
+
+
+def _new_counters(table, max_values):
+    return {name: ValueCounter(max_values) for wanted in table.values() for name, _, _ in wanted}
+
+
+def profile_shard(path, start, end, table, max_values=MAX_VALUES):
+    """Counters for bytes [start, end) of a flat file (a range from find_message_shards)."""
+    counters = _new_counters(table, max_values)
+    with open_shard(path, start, end) as infile:
+        profile_lines(infile, table, counters)
+    return counters
+
+
+def input_files(paths):
+    """The files named, with each directory replaced by the .txt files in it."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(entry.path for entry in os.scandir(path)
+                                if entry.is_file() and entry.name.lower().endswith(".txt")))
+        else:
+            files.append(path)
+    return files
+
+
+def profile_files(paths, specs=None, max_values=MAX_VALUES, workers=None):
+    """{field name: ValueCounter} over every file in paths (files or directories), on `workers` processes."""
+    table = compile_fields(specs or fields)
+    counters = _new_counters(table, max_values)
+    workers = workers or os.cpu_count() or 1
+    files = input_files(paths)
+    if workers == 1:
+        for path in files:
+            with open(path, "r", encoding="utf-8", buffering=READ_BUFFER) as infile:
+                profile_lines(infile, table, counters)
+        return counters
+
+    jobs = []
+    for path in files:
+        shards = max(1, min(workers * SHARDS_PER_WORKER, os.path.getsize(path) // MIN_SHARD_SIZE))
+        jobs.extend((path, start, end) for start, end in find_message_shards(path, shards))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(profile_shard, path, start, end, table, max_values) for path, start, end in jobs]
+        for future in futures:
+            for name, shard_counter in future.result().items():
+                counters[name].merge(shard_counter)
+    return counters
+
+
+def write_csv(counters, output_file, top=None):
+    with open(output_file, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["field", "value", "count", "error"])
+        for name, counter in counters.items():
+            writer.writerows((name, value, count, error) for value, count, error in counter.most_common(top))
+
+
+def write_json(counters, output_file, top=None):
+    profile = {
+        name: {
+            "total": counter.total,
+            "distinct": len(counter.counts) if counter.exact else None,
+            "exact": counter.exact,
+            "floor": counter.floor,
+            "values": [{"value": value, "count": count, "error": error}
+                       for value, count, error in counter.most_common(top)],
+        }
+        for name, counter in counters.items()
+    }
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def print_counts(counters, top=None):
+    for name, counter in counters.items():
+        if counter.exact:
+            print(f"{name}: {counter.total} values, {len(counter.counts)} distinct")
+        else:
+            print(f"{name}: {counter.total} values, over {counter.max_values} distinct "
+                  f"(approximate; values not listed occurred at most {counter.floor} times)")
+        for value, count, error in counter.most_common(top):
+            print(f"{name}: {value}, Count: {count}" + (f" (at most {error} too high)" if error else ""))
+        print()
+
+
+if __name__ == "__main__":
+    options = ("--fields", "--output", "--top", "--max-values", "--workers")
+
+    def option(flag, default=None):
+        return sys.argv[sys.argv.index(flag) + 1] if flag in sys.argv else default
+
+    args = [a for i, a in enumerate(sys.argv[1:], 1) if not a.startswith("--") and sys.argv[i - 1] not in options]
+    if not args:
+        print("Usage: hl7_field_profiler.py input... [--fields OBR-24,MSH-4,...] [--output counts.csv|counts.json] "
+              "[--top N] [--max-values N] [--workers N]")
+        sys.exit(1)
+    specs = option("--fields").split(",") if "--fields" in sys.argv else fields
+    output_file = option("--output")
+    top = int(option("--top")) if "--top" in sys.argv else None
+    workers = int(option("--workers")) if "--workers" in sys.argv else None
+
+    counters = profile_files(args, specs, int(option("--max-values", MAX_VALUES)), workers)
+    if output_file is None:
+        print_counts(counters, top)
+    elif output_file.lower().endswith(".json"):
+        write_json(counters, output_file, top)
+        print(f"Field counts written to {output_file}")
+    else:
+        write_csv(counters, output_file, top)
+        print(f"Field counts written to {output_file}")
@@ -0,0 +1,311 @@
+"""
+Persistent SQLite index of HL7 flat files: which messages carry an accession, MRN or OBR-24 value, or fall in a date
+range, and where each one is (file, byte offset, length), so tools can seek straight to them instead of rescanning.
+
+    python hl7_index.py index hl7_index.db archive/ more.txt ...      # build, or bring up to date
+    python hl7_index.py query hl7_index.db --accession 126372120       # print the matching messages
+    python hl7_index.py query hl7_index.db --mrn 000734081 --from 20120101 --to 20121231 --list
+    python hl7_index.py query hl7_index.db --obr24 DXA --count
+
+index takes files and directories (every regular file directly inside; files that have disappeared from an indexed
+directory are dropped from the index). Re-running it is cheap:
+  - a file whose size, mtime and inode are unchanged is skipped
+  - a file that has grown (same inode, same bytes up to where indexing stopped) is read only from its last message on
+  - anything else (replaced by a rewrite tool, truncated, edited) is indexed again from the start
+query combines filters with AND; --list prints file, offset, length and date instead of the messages, --count just the
+number. A file changed since it was indexed is reported on stderr.
+
+What is indexed per message (a message runs from one line starting with MSH to the next):
+  - accession: the first component of every OBR-2, OBR-3, ORC-2 and ORC-3
+  - mrn: the first component of every PID-3 repetition and of PID-2
+  - obr24: every OBR-24
+  - date: the first 8 characters of MSH-7 (YYYYMMDD)
+
+    from hl7_index import FlatFileIndex
+    with FlatFileIndex("hl7_index.db") as index:
+        for hit in index.query(accession="126372120"):
+            text = index.read_message(hit)
+"""
+
+import hashlib
+import mmap
+import os
+import sqlite3
+import sys
+from collections import namedtuple
+from contextlib import contextmanager
+
+from hl7_parser import parse_message
+from hl7_shard import next_message_start
+
+KINDS = {"accession": 1, "mrn": 2, "obr24": 3}
+KEY_FIELDS = (
+    ("accession", "OBR", (2, 3)),
+    ("accession", "ORC", (2, 3)),
+    ("mrn", "PID", (2, 3)),
+)
+CHECK_BYTES = 4096  # bytes hashed at the start of a file and before the resume point, to tell appends from rewrites
+COMMIT_EVERY = 50000  # messages per transaction while indexing a big file
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    inode INTEGER, size INTEGER, mtime_ns INTEGER,
+    indexed_to INTEGER NOT NULL DEFAULT 0,   -- offset of the last message indexed; re-read from here on update
+    check_hash BLOB
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    msg_date TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_file ON messages (file_id, offset);
+CREATE INDEX IF NOT EXISTS messages_date ON messages (msg_date);
+CREATE TABLE IF NOT EXISTS keys (
+    kind INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    PRIMARY KEY (kind, value, message_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS keys_message ON keys (message_id);
+"""
+
+Hit = namedtuple("Hit", ["path", "offset", "length", "msg_date"])
+
+
+def message_keys(text):
+    """(MSH-7 date, {(kind, value), ...}) for one message's text."""
+    msg = parse_message(text)
+    delimiters = msg.delimiters
+    keys = set()
+    for kind, segment, fields in KEY_FIELDS:
+        for values in msg.field_values(segment, *fields):
+            for value in values:
+                if not value:
+                    continue
+                for repetition in value.split(delimiters.repetition):
+                    first = repetition.split(delimiters.component, 1)[0].strip()
+                    if first:
+                        keys.add((kind, first))
+    for (obr24,) in msg.field_values("OBR", 24):
+        if obr24 and obr24.strip():
+            keys.add(("obr24", obr24.strip()))
+    msg_date = None
+    for (msh7,) in msg.field_values("MSH", 7):
+        msg_date = msh7[:8] or None
+        break
+    return msg_date, keys
+
+
+def _check_hash(mm, indexed_to):
+    # Only bytes before indexed_to: for a file indexed while still shorter than CHECK_BYTES, an append must not change
+    # its head hash
+    digest = hashlib.sha1(mm[:min(CHECK_BYTES, indexed_to)])
+    digest.update(mm[max(0, indexed_to - CHECK_BYTES):indexed_to])
+    return digest.digest()
+
+
+class FlatFileIndex:
+    """The index database (created if missing). Updates commit as they go; usable as a context manager."""
+
+    def __init__(self, db_path):
+        self.db = sqlite3.connect(db_path, isolation_level=None)  # transactions are begun explicitly
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    @contextmanager
+    def _transaction(self):
+        self.db.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def update(self, paths):
+        """Index files and directories (see the module docstring). Returns {path: messages indexed}."""
+        indexed = {}
+        for path in paths:
+            path = os.path.abspath(path)
+            if os.path.isdir(path):
+                present = set()
+                for entry in sorted(os.scandir(path), key=lambda e: e.name):
+                    if entry.is_file() and not entry.name.startswith("."):
+                        present.add(entry.path)
+                        indexed[entry.path] = self.update_file(entry.path)
+                prefix = path.rstrip(os.sep) + os.sep
+                for (stale,) in self.db.execute("SELECT path FROM files WHERE substr(path, 1, ?) = ?",
+                                                (len(prefix), prefix)).fetchall():
+                    if stale not in present and os.sep not in stale[len(prefix):]:
+                        self.forget(stale)
+            else:
+                indexed[path] = self.update_file(path)
+        return indexed
+
+    def forget(self, path):
+        """Drop a file and its messages from the index."""
+        row = self.db.execute("SELECT id FROM files WHERE path = ?", (os.path.abspath(path),)).fetchone()
+        if row is not None:
+            with self._transaction():
+                self._delete_messages(row[0], 0)
+                self.db.execute("DELETE FROM files WHERE id = ?", (row[0],))
+
+    def update_file(self, path):
+        """Bring one file's entries up to date; returns the number of messages (re)indexed."""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        row = self.db.execute("SELECT id, inode, size, mtime_ns, indexed_to, check_hash FROM files WHERE path = ?",
+                              (path,)).fetchone()
+        if row is not None and row[1:4] == (st.st_ino, st.st_size, st.st_mtime_ns):
+            return 0
+        if st.st_size == 0:
+            with self._transaction():
+                file_id = self._file_id(row, path)
+                self._delete_messages(file_id, 0)
+                self.db.execute("UPDATE files SET inode = ?, size = 0, mtime_ns = ?, indexed_to = 0, "
+                                "check_hash = NULL WHERE id = ?", (st.st_ino, st.st_mtime_ns, file_id))
+            return 0
+
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            if (row is not None and row[1] == st.st_ino and row[4] <= len(mm)
+                    and row[5] == _check_hash(mm, row[4])):
+                start = row[4]  # appended to: resume at the last message, which may have grown
+            return self._index_from(row, path, mm, start, st)
+
+    def _file_id(self, row, path):
+        if row is not None:
+            return row[0]
+        return self.db.execute("INSERT INTO files (path) VALUES (?)", (path,)).lastrowid
+
+    def _delete_messages(self, file_id, start):
+        self.db.execute("DELETE FROM keys WHERE message_id IN "
+                        "(SELECT id FROM messages WHERE file_id = ? AND offset >= ?)", (file_id, start))
+        self.db.execute("DELETE FROM messages WHERE file_id = ? AND offset >= ?", (file_id, start))
+
+    def _index_from(self, row, path, mm, start, st):
+        size = len(mm)
+        count = 0
+        offset = next_message_start(mm, start)
+        last = start
+        self.db.execute("BEGIN")
+        try:
+            file_id = self._file_id(row, path)
+            self._delete_messages(file_id, start)
+            while offset is not None:
+                following = next_message_start(mm, offset + 3)
+                end = following if following is not None else size
+                msg_date, keys = message_keys(mm[offset:end].decode("utf-8", "replace"))
+                message_id = self.db.execute(
+                    "INSERT INTO messages (file_id, offset, length, msg_date) VALUES (?, ?, ?, ?)",
+                    (file_id, offset, end - offset, msg_date)).lastrowid
+                self.db.executemany("INSERT OR IGNORE INTO keys (kind, value, message_id) VALUES (?, ?, ?)",
+                                    [(KINDS[kind], value, message_id) for kind, value in keys])
+                last = offset
+                offset = following
+                count += 1
+                if count % COMMIT_EVERY == 0:
+                    # progress survives an interruption: with size unset the next update resumes from `last`
+                    self.db.execute("UPDATE files SET inode = ?, size = NULL, indexed_to = ?, check_hash = ? "
+                                    "WHERE id = ?", (st.st_ino, last, _check_hash(mm, last), file_id))
+                    self.db.execute("COMMIT")
+                    self.db.execute("BEGIN")
+            self.db.execute("UPDATE files SET inode = ?, size = ?, mtime_ns = ?, indexed_to = ?, check_hash = ? "
+                            "WHERE id = ?", (st.st_ino, st.st_size, st.st_mtime_ns, last,
+                                             _check_hash(mm, last), file_id))
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return count
+
+    def query(self, accession=None, mrn=None, obr24=None, date_from=None, date_to=None):
+        """Hits (path, offset, length, msg_date) of the messages matching every given filter, in file order."""
+        sql = ["SELECT f.path, m.offset, m.length, m.msg_date FROM messages m JOIN files f ON f.id = m.file_id "
+               "WHERE 1"]
+        params = []
+        for kind, value in (("accession", accession), ("mrn", mrn), ("obr24", obr24)):
+            if value is not None:
+                sql.append("AND m.id IN (SELECT message_id FROM keys WHERE kind = ? AND value = ?)")
+                params += [KINDS[kind], value]
+        if date_from is not None:
+            sql.append("AND m.msg_date >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            sql.append("AND m.msg_date <= ?")
+            params.append(date_to)
+        sql.append("ORDER BY f.path, m.offset")
+        return [Hit(*row) for row in self.db.execute(" ".join(sql), params)]
+
+    def stale_files(self, paths):
+        """The given indexed paths whose file has changed (or gone) since it was indexed."""
+        stale = []
+        for path in paths:
+            row = self.db.execute("SELECT inode, size, mtime_ns FROM files WHERE path = ?", (path,)).fetchone()
+            try:
+                st = os.stat(path)
+            except OSError:
+                stale.append(path)
+                continue
+            if row is None or row != (st.st_ino, st.st_size, st.st_mtime_ns):
+                stale.append(path)
+        return stale
+
+    @staticmethod
+    def read_message(hit):
+        """The raw bytes of one hit's message."""
+        with open(hit.path, "rb") as f:
+            f.seek(hit.offset)
+            return f.read(hit.length)
+
+
+def _option(name):
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else None
+
+
+USAGE = ("Usage: hl7_index.py index DB path [path ...]\n"
+         "       hl7_index.py query DB [--accession X] [--mrn Y] [--obr24 Z] [--from YYYYMMDD] [--to YYYYMMDD]"
+         " [--list | --count]")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("index", "query"):
+        print(USAGE)
+        sys.exit(1)
+    command, db_path = sys.argv[1], sys.argv[2]
+
+    with FlatFileIndex(db_path) as index:
+        if command == "index":
+            if len(sys.argv) < 4:
+                print(USAGE)
+                sys.exit(1)
+            for path, count in index.update(sys.argv[3:]).items():
+                print(f"{path}: {count} message(s) indexed")
+            sys.exit(0)
+
+        hits = index.query(accession=_option("--accession"), mrn=_option("--mrn"), obr24=_option("--obr24"),
+                           date_from=_option("--from"), date_to=_option("--to"))
+        for path in index.stale_files(sorted({hit.path for hit in hits})):
+            print(f"warning: {path} has changed since it was indexed; run hl7_index.py index again", file=sys.stderr)
+        if "--count" in sys.argv:
+            print(len(hits))
+        elif "--list" in sys.argv:
+            for hit in hits:
+                print(f"{hit.path}\t{hit.offset}\t{hit.length}\t{hit.msg_date or ''}")
+        else:
+            out = sys.stdout.buffer
+            for hit in hits:
+                out.write(FlatFileIndex.read_message(hit))
@@ -0,0 +1,441 @@
+"""
+Lightweight HL7 v2 message parser shared by the HL7 scripts in this folder.
+
+A message is split into segments once, and each segment is split into fields only the first time one of its fields is
+read (components are split the same way). Field and component indexes follow HL7 numbering, so OBR-4.2 is
+msg["OBR"][0][4][2] and MSH-3 is msg["MSH"][0][3]. Missing fields/components read as empty strings.
+
+Delimiters come from MSH-1/MSH-2 when the message starts with MSH; otherwise the standard |^~\\& set is used.
+Segments may be terminated by \\r, \\n or \\r\\n (or any mix of them).
+
+Example:
+    from hl7_parser import parse_message
+    msg = parse_message(text)
+    accession = msg["OBR"][0][3].value
+    modality = msg["OBR"][0][4][2]
+
+Messages with a large embedded document (e.g. a base64 PDF in OBX-5) can be read from a binary file with
+scan_message(), which streams that one field to a sink instead of keeping it:
+    with open(path, "rb") as f, open(pdf_path, "wb") as out:
+        decoder = Base64FieldDecoder(out, strip="^^PDF^Base64^")
+        msg = scan_message(f, "OBX", 5, decoder, collapse=True)   # msg has every OBX-5 emptied
+        decoder.close()
+"""
+
+import binascii
+import re
+from collections import namedtuple
+
+Delimiters = namedtuple("Delimiters", ["field", "component", "repetition", "escape", "subcomponent"])
+DEFAULT_DELIMITERS = Delimiters("|", "^", "~", "\\", "&")
+
+
+def parse_delimiters(msh_segment):
+    """Read the delimiters from an MSH segment string; fall back to the defaults for anything missing."""
+    if not msh_segment.startswith("MSH") or len(msh_segment) < 4:
+        return DEFAULT_DELIMITERS
+
+    field_sep = msh_segment[3]
+    encoding_chars = msh_segment[4:].split(field_sep, 1)[0]
+    defaults = DEFAULT_DELIMITERS[1:]
+    chars = [encoding_chars[i] if i < len(encoding_chars) else defaults[i] for i in range(4)]
+    return Delimiters(field_sep, *chars)
+
+
+def split_segments(text):
+    """Split message text on \\r, \\n or \\r\\n, dropping blank lines."""
+    if "\n" in text:
+        text = text.replace("\r\n", "\r").replace("\n", "\r")
+    return [s for s in text.split("\r") if s and not s.isspace()]
+
+
+class Field:
+    """A single field value; index it (1-based) to get a component."""
+
+    __slots__ = ("value", "_component_sep", "_components")
+
+    def __init__(self, value, component_sep="^"):
+        self.value = value
+        self._component_sep = component_sep
+        self._components = None
+
+    @property
+    def components(self):
+        if self._components is None:
+            self._components = self.value.split(self._component_sep)
+        return self._components
+
+    def __getitem__(self, index):
+        if index < 1:
+            raise IndexError("HL7 component indexes start at 1")
+        components = self.components
+        return components[index - 1] if index <= len(components) else ""
+
+    def __len__(self):
+        return len(self.components)
+
+    def __bool__(self):
+        return bool(self.value)
+
+    def __eq__(self, other):
+        if isinstance(other, Field):
+            return self.value == other.value
+        return self.value == other
+
+    def __hash__(self):
+        return hash(self.value)
+
+    def __str__(self):
+        return self.value
+
+    def __repr__(self):
+        return f"Field({self.value!r})"
+
+
+class Segment:
+    """One HL7 segment. len(segment) is the highest field number present."""
+
+    __slots__ = ("raw", "name", "delimiters", "_fields")
+
+    def __init__(self, raw, delimiters=DEFAULT_DELIMITERS):
+        self.raw = raw
+        self.name = raw[:3]
+        self.delimiters = delimiters
+        self._fields = None
+
+    @property
+    def fields(self):
+        """Raw field strings, split on first use. Index 0 is the segment name."""
+        if self._fields is None:
+            fields = self.raw.split(self.delimiters.field)
+            if self.name == "MSH":
+                # MSH-1 is the field separator itself, so every later field shifts right by one
+                fields.insert(1, self.delimiters.field)
+            self._fields = fields
+        return self._fields
+
+    def __len__(self):
+        return len(self.fields) - 1
+
+    def __getitem__(self, index):
+        if index < 1:
+            raise IndexError("HL7 field indexes start at 1")
+        fields = self.fields
+        value = fields[index] if index < len(fields) else ""
+        return Field(value, self.delimiters.component)
+
+    def get(self, index, default=None):
+        """Return field `index` as a string, or `default` when the segment is too short to contain it."""
+        fields = self.fields
+        if 0 < index < len(fields):
+            return fields[index]
+        return default
+
+    def __str__(self):
+        return self.raw
+
+    def __repr__(self):
+        return f"Segment({self.name!r})"
+
+
+class Message:
+    """
+    An HL7 message: segments in order, plus lookup of all segments of a type via msg["OBX"].
+
+    Segment objects are only created for the segment types actually looked up; use field_values() to pull a few
+    fields out of many segments (e.g. every OBX-5 chunk of an embedded PDF) without building them at all.
+    """
+
+    def __init__(self, text):
+        self.raw_segments = split_segments(text)
+        self.delimiters = parse_delimiters(self.raw_segments[0]) if self.raw_segments else DEFAULT_DELIMITERS
+        self._raw_by_name = {}
+        for raw in self.raw_segments:
+            by_name = self._raw_by_name.get(raw[:3])
+            if by_name is None:
+                self._raw_by_name[raw[:3]] = [raw]
+            else:
+                by_name.append(raw)
+        self._by_name = {}
+
+    @property
+    def segments(self):
+        return [Segment(raw, self.delimiters) for raw in self.raw_segments]
+
+    def __getitem__(self, name):
+        segments = self._by_name.get(name)
+        if segments is None:
+            segments = [Segment(raw, self.delimiters) for raw in self._raw_by_name.get(name, ())]
+            self._by_name[name] = segments
+        return segments
+
+    def field_values(self, name, *indexes):
+        """
+        Yield a tuple of raw field strings for every `name` segment, one entry per requested field index.
+        Fields the segment doesn't have come back as None.
+        """
+        sep = self.delimiters.field
+        shift = 1 if name == "MSH" else 0
+        top = max(indexes) - shift  # split position of the highest requested field; the rest stays unsplit
+        for raw in self._raw_by_name.get(name, ()):
+            parts = raw.split(sep, top + 1)
+            if shift:
+                parts.insert(1, sep)
+            count = min(len(parts), top + shift + 1)
+            yield tuple(parts[i] if i < count else None for i in indexes)
+
+    def __contains__(self, name):
+        return name in self._raw_by_name
+
+    def __iter__(self):
+        return iter(self.segments)
+
+    def __len__(self):
+        return len(self.raw_segments)
+
+
+def parse_message(text):
+    """Parse a single HL7 message string into a Message."""
+    return Message(text)
+
+
+FieldSpec = namedtuple("FieldSpec", ["segment", "field", "component"])
+_FIELD_SPEC = re.compile(r"([A-Z][A-Z0-9]{2})-(\d+)(?:\.(\d+))?")
+
+
+def parse_field_spec(spec):
+    """
+    Parse a field reference such as "OBR-24", "PID-8" or "OBR-4.2" into FieldSpec(segment, field, component); the
+    component is None for a whole field. Raises ValueError for anything else.
+    """
+    match = _FIELD_SPEC.fullmatch(spec.strip().upper())
+    if match is None:
+        raise ValueError(f"Not an HL7 field reference (SEG-N or SEG-N.M): {spec!r}")
+    segment, field, component = match.group(1), int(match.group(2)), match.group(3)
+    component = int(component) if component is not None else None
+    if field < 1 or component == 0:
+        raise ValueError(f"HL7 field and component numbers start at 1: {spec!r}")
+    return FieldSpec(segment, field, component)
+
+
+def field_split_index(segment, field):
+    """Position of HL7 field `field` in raw_segment.split(field_separator) (MSH fields sit one to the left)."""
+    return field - 1 if segment == "MSH" else field
+
+
+SCAN_CHUNK_SIZE = 1 << 16
+_SEGMENT_END = re.compile(rb"[\r\n]")
+
+
+def scan_message(stream, segment_name, field_index, sink, collapse=False, chunk_size=SCAN_CHUNK_SIZE):
+    """
+    Parse a message from a binary stream, handing the value of `segment_name`-`field_index` (e.g. OBX-5) to `sink`
+    piece by piece instead of keeping it. Only a chunk of the field is in memory at a time.
+
+    sink.write(piece) receives the raw bytes of the field in order; sink.end_field() is called after each
+    occurrence. The returned Message has that field emptied in every such segment; everything else is as parse_message
+    would give for the same file read as UTF-8 (undecodable bytes dropped).
+
+    collapse=True keeps only the last of a run of `segment_name` segments that are identical once the field is
+    emptied, apart from the set ID (field 1) -- e.g. thousands of "OBX|n|ED|PDF^Report||...||||||F" lines carrying one
+    PDF become one segment, so memory doesn't grow with the number of chunks either. Later segments still win.
+    """
+    if segment_name == "MSH":
+        raise ValueError("scan_message cannot elide an MSH field")
+    name = segment_name.encode("ascii")
+
+    chunk = stream.read(chunk_size)
+    sep = chunk[3:4] if chunk.startswith(b"MSH") and len(chunk) > 3 else DEFAULT_DELIMITERS.field.encode("ascii")
+    field_end = re.compile(b"[" + re.escape(sep) + rb"\r\n]")
+    skeleton = []           # segments with the streamed field emptied
+    run_key = None          # with collapse: what the last skeleton segment looks like without its set ID
+    partial = b""           # start of a segment continued in the next chunk (never holds streamed bytes)
+    partial_done = False    # the field of the segment in `partial` has already been streamed
+    streaming = False       # the previous chunk ended inside the field value
+
+    def add(segment, streamed):
+        nonlocal run_key
+        if not segment.strip():
+            return
+        if collapse and streamed:
+            key = segment.split(sep, 2)[2:]
+            if key == run_key:
+                skeleton[-1] = segment
+                return
+            run_key = key
+        else:
+            run_key = None
+        skeleton.append(segment)
+
+    while chunk:
+        if streaming:
+            m = field_end.search(chunk)
+            if not m:
+                sink.write(chunk)
+                chunk = stream.read(chunk_size)
+                continue
+            if m.start():
+                sink.write(chunk[:m.start()])
+            sink.end_field()
+            streaming = False
+            chunk = chunk[m.start():]
+
+        lines = _SEGMENT_END.split(chunk)
+        lines[0] = partial + lines[0]
+        for i in range(len(lines) - 1):
+            line = lines[i]
+            streamed = (i == 0 and partial_done) or line.startswith(name)
+            if streamed and not (i == 0 and partial_done):
+                parts = line.split(sep, field_index + 1)
+                if len(parts) > field_index:
+                    sink.write(parts[field_index])
+                    sink.end_field()
+                    parts[field_index] = b""
+                    line = sep.join(parts)
+            add(line, streamed)
+        if len(lines) > 1:
+            partial_done = False
+
+        # The last piece has no segment end yet; if it's already into the field, stream what's there
+        partial = lines[-1]
+        if not partial_done and partial.startswith(name):
+            parts = partial.split(sep, field_index)
+            if len(parts) > field_index:
+                value = parts[field_index]
+                m = field_end.search(value)
+                if m:
+                    sink.write(value[:m.start()])
+                    sink.end_field()
+                    value = value[m.start():]
+                else:
+                    sink.write(value)
+                    streaming = True
+                    value = b""
+                parts[field_index] = value
+                partial = sep.join(parts)
+                partial_done = True
+        chunk = stream.read(chunk_size)
+
+    if streaming:
+        sink.end_field()
+    add(partial, partial_done)
+    return Message(b"\r".join(skeleton).decode("utf-8", errors="ignore"))
+
+
+_B64_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+_B64_JUNK = bytes(b for b in range(128) if b not in _B64_ALPHABET)
+_FIELD_WHITESPACE = b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f"  # what str.strip() removes in the ASCII range
+
+
+class Base64FieldDecoder:
+    """
+    scan_message sink that base64-decodes field values straight into a binary file object.
+
+    Gives the same bytes as stripping each value, joining them, removing `strip` (e.g. "^^PDF^Base64^"), padding the
+    joined length to a multiple of 4 and calling base64.b64decode -- but only ever holds one chunk. Characters outside
+    the base64 alphabet are skipped and decoding stops at the first completed "=" padding, as b64decode does.
+    close() finishes the output and raises ValueError on bad input; after it, `size` is the number of stripped value
+    bytes seen (0 means the field was empty everywhere).
+    """
+
+    def __init__(self, out, strip=""):
+        self.out = out
+        self.size = 0
+        self._strip = strip.encode("ascii")
+        self._field_started = False
+        self._trailing = b""   # whitespace at the end of the last piece; dropped if the field ends there
+        self._tail = b""       # end of the joined value that may be the start of a `strip` match
+        self._length = 0       # joined length after removing `strip`, for the final padding
+        self._pending = b""    # base64 characters not yet decoded (less than one 4-character quad, or a pad run)
+        self._done = False
+        self._batch = []       # stripped values not decoded yet; small OBX chunks are decoded SCAN_CHUNK_SIZE at a time
+        self._batch_size = 0
+
+    def write(self, piece):
+        if not self._field_started:
+            piece = piece.lstrip(_FIELD_WHITESPACE)
+            if not piece:
+                return
+            self._field_started = True
+        body = piece.rstrip(_FIELD_WHITESPACE)
+        if not body:
+            self._trailing += piece
+            return
+        if self._trailing:
+            self._batch.append(self._trailing)
+            self._batch_size += len(self._trailing)
+        self._batch.append(body)
+        self._batch_size += len(body)
+        self._trailing = piece[len(body):]
+        if self._batch_size >= SCAN_CHUNK_SIZE:
+            self._flush()
+
+    def end_field(self):
+        self._field_started = False
+        self._trailing = b""
+
+    def close(self):
+        """Flush and pad the remaining input; raises ValueError if it isn't valid base64."""
+        self._flush()
+        data, self._tail = self._tail, b""
+        self._length += len(data)
+        self._decode(data + b"=" * (-self._length % 4))
+        if not self._done and self._pending:
+            self.out.write(binascii.a2b_base64(self._pending))
+        self._pending = b""
+
+    def _flush(self):
+        if self._batch:
+            data = b"".join(self._batch)
+            self.size += len(data)
+            self._batch, self._batch_size = [], 0
+            self._remove_strip(data)
+
+    def _remove_strip(self, data):
+        if not self._strip:
+            self._length += len(data)
+            self._decode(data)
+            return
+        data = self._tail + data
+        cut = len(data) - len(self._strip) + 1  # a match starting at or after here may continue in the next piece
+        kept, i = [], 0
+        while True:
+            j = data.find(self._strip, i)
+            if j < 0 or j >= cut:
+                break
+            kept.append(data[i:j])
+            i = j + len(self._strip)
+        keep = max(i, cut)
+        kept.append(data[i:keep])
+        self._tail = data[keep:]
+        data = b"".join(kept)
+        self._length += len(data)
+        self._decode(data)
+
+    def _decode(self, data):
+        if self._done or not data:
+            return
+        if not data.isascii():
+            raise ValueError("string argument should contain only ASCII characters")
+        data = self._pending + data.translate(None, _B64_JUNK)
+
+        # "=" after two or three characters of a quad ends the data once the quad is full; anywhere else it's ignored
+        k = data.find(b"=")
+        while k >= 0:
+            run = len(data) - k - len(data[k:].lstrip(b"="))
+            quad_pos = k % 4
+            if quad_pos >= 2 and run >= 4 - quad_pos:
+                self.out.write(binascii.a2b_base64(data[:k + 4 - quad_pos]))
+                self._pending = b""
+                self._done = True
+                return
+            if quad_pos >= 2 and k + run == len(data):
+                break  # might still be completed by the next piece
+            data = data[:k] + data[k + run:]
+            k = data.find(b"=", k)
+
+        limit = len(data) if k < 0 else k
+        limit -= limit % 4
+        if limit:
+            self.out.write(binascii.a2b_base64(data[:limit]))
+        self._pending = data[limit:]
@@ -1,18 +1,41 @@
-import base64
+import time
+
+_STARTED = time.perf_counter()  # before the heavy imports, so cold-start cost shows up in the latency log
+
 import os
 import re
 import subprocess
 import shutil
 import sys
 import logging
-import time
-from pdf2image import convert_from_path
+import fcntl
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pdf2image import convert_from_path, pdfinfo_from_path
+from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.sequence import Sequence
+from pydicom.uid import ExplicitVRLittleEndian, EncapsulatedPDFStorage, SecondaryCaptureImageStorage, generate_uid
+
+from file_readiness import wait_until_ready
+from hl7_parser import Base64FieldDecoder, parse_message, scan_message
+from worker_socket import serve
 
 # Converts HL7 files containing base64-encoded PDF data in OBX-5 segments to PDF, then to JPEG, and finally to DICOM format.
 # Use case: Convert preliminary reports from nighthawk providers to DICOM format for PACS posting when RIS cannot accept prelims.
 # Generated PDFs can be used for automated faxing (see ORU2pdf.py), encrypted email distribution, Samba network folder drops, or Azure API uploads to SharePoint.
 # SEE hl7_pdf_dcm.md FOR FULL DETAILS!
 # Updated: Accepts file path as command-line argument instead of polling directory for improved efficiency.
+# Updated: --serve keeps the script resident and takes file paths over a Unix socket (see worker_socket.py), so each
+#          inbound HL7 skips interpreter startup, imports and directory setup.
+# Updated: --batch DIR [--workers N] drains a backlog of HL7 files across a process pool (e.g. after a PACS/RIS outage).
+# Updated: HL7_DICOM_MODE=pdf|sc builds the DICOM in Python (Encapsulated PDF, or uncompressed Secondary Capture of
+#          page 1) instead of writing a JPEG and running img2dcm; filemonitor.sh then skips dcmdjpeg as well.
+# Updated: HL7_PAGES=all renders every page (one page in memory at a time) as its own instance in one series;
+#          HL7_RENDER_DPI / HL7_RENDER_GRAYSCALE size the pixel data.
+# Updated: The OBX-5 base64 PDF is decoded straight into the PDF file while the HL7 is read (hl7_parser.scan_message),
+#          so memory no longer grows with the size of the embedded PDF.
+# Updated: No fixed size-polling wait; close_write/moved_to files are used at once, polling only for network-mounted
+#          sources (file_readiness.py). The wait is logged per file as a latency metric.
 
 # Isolated log file for this script (filemonitor redirects here; detailed logs stay out of main log)
 HL7_LOG_DIR = "/var/lib/filemonitor/HL7toDICOM/logs"
@@ -35,6 +58,31 @@ dcm_dir = os.path.join(base_dir, "/var/lib/filemonitor/HL7toDICOM/DICOM/")
 error_dir = os.path.join(base_dir, "/var/lib/filemonitor/HL7toDICOM/pdf2dcmERROR/")
 jpeg_dir = os.path.join(base_dir, "/var/lib/filemonitor/HL7toDICOM/JPEGs/")
 
+# Unix socket the resident worker (--serve) listens on; filemonitor.sh sends file paths here
+HL7_WORKER_SOCKET = os.environ.get("HL7_WORKER_SOCKET", "/run/filemonitor/hl7_pdf_dcm.sock")
+
+# How the DICOM is produced:
+#   img2dcm - page 1 -> JPEG in jpeg_dir -> img2dcm (default; filemonitor.sh runs dcmdjpeg before sending)
+#   pdf     - Encapsulated PDF Storage built in-process from the decoded PDF bytes (no rasterising at all)
+#   sc      - Secondary Capture with uncompressed RGB pixel data from the in-memory page 1 image
+HL7_DICOM_MODE = os.environ.get("HL7_DICOM_MODE", "img2dcm")
+
+# Rasterising (img2dcm and sc modes):
+#   HL7_PAGES=first - page 1 only (original behaviour)
+#   HL7_PAGES=all   - every page, rendered one at a time so memory stays flat, each page a separate instance in the
+#                     same series (page 1 keeps the usual file name, later pages get _p2, _p3, ...)
+# Grayscale 8-bit pixels are a third the size of RGB; fine for black-on-white report text.
+HL7_PAGES = os.environ.get("HL7_PAGES", "first")
+RENDER_DPI = int(os.environ.get("HL7_RENDER_DPI", "200"))
+RENDER_GRAYSCALE = os.environ.get("HL7_RENDER_GRAYSCALE", "0") == "1"
+
+# --batch skips files modified in the last BATCH_MIN_AGE seconds; those are still on their way through the live path
+BATCH_MIN_AGE = 10
+BATCH_SKIP_PATTERNS = (".swp", ".tmp", ".swx", "~")
+
+# Marker some senders put in front of the base64 data in OBX-5 (removed before decoding)
+PDF_PREFIX = "^^PDF^Base64^"
+
 # Ensure directories exist
 os.makedirs(hl7_dir, exist_ok=True)
 os.makedirs(pdf_dir, exist_ok=True)
@@ -42,90 +90,226 @@ os.makedirs(dcm_dir, exist_ok=True)
 os.makedirs(error_dir, exist_ok=True)
 os.makedirs(jpeg_dir, exist_ok=True)
 
-def wait_for_file_complete(file_path, max_wait=30, check_interval=0.5):
-    """Wait for file to be completely written (file size stable)."""
-    if not os.path.exists(file_path):
-        return False
-
-    last_size = -1
-    stable_count = 0
-    required_stable = 2  # File size must be stable for 2 checks
+def _stripped(value, current):
+    """Stripped field value, or the value already found when this segment doesn't have the field."""
+    return current if value is None else value.strip()
 
-    for _ in range(int(max_wait / check_interval)):
-        try:
-            current_size = os.path.getsize(file_path)
-            if current_size == last_size:
-                stable_count += 1
-                if stable_count >= required_stable:
-                    return True
-            else:
-                stable_count = 0
-                last_size = current_size
-            time.sleep(check_interval)
-        except OSError:
-            return False
-    return False
-
-def parse_hl7(hl7_message):
+def report_fields(msg, obx_5_chunks=None):
+    """
+    PID-5, PID-3, PID-7, OBR-3, OBR-4-2 and OBX-11 from a parsed message (later segments win, same as the old
+    line-by-line scan). Stripped OBX-5 values are appended to obx_5_chunks when a list is passed.
+    """
     pid_5, pid_3, pid_7, obr_3, obr_4_2, obx_11 = None, None, None, None, None, None
-    base64_pdf = ""
 
-    lines = hl7_message.split("\n")
-    for line in lines:
-        if line.startswith("PID"):
-            pid_5_match = re.search(r"(?:\|[^|]*){4}\|([^|]*)", line)
-            pid_3_match = re.search(r"(?:\|[^|]*){2}\|([^|]*)", line)
-            pid_7_match = re.search(r"(?:\|[^|]*){6}\|([^|]*)", line)
-            if pid_5_match: pid_5 = pid_5_match.group(1).strip()
-            if pid_3_match: pid_3 = pid_3_match.group(1).strip()
-            if pid_7_match: pid_7 = pid_7_match.group(1).strip()
-
-        if line.startswith("OBR"):
-            obr_3_match = re.search(r"(?:\|[^|]*){2}\|([^|]*)", line)
-            obr_4_match = re.search(r"(?:\|[^|]*){3}\|([^|]*)", line)
-            if obr_3_match: obr_3 = obr_3_match.group(1).strip()
-            if obr_4_match:
-                obr_4_parts = obr_4_match.group(1).split("^")
-                if len(obr_4_parts) > 1:
-                    obr_4_2 = obr_4_parts[1][:2].strip()
-
-        if line.startswith("OBX"):
-            obx_11_match = re.search(r"(?:\|[^|]*){10}\|([^|]*)", line)
-            if obx_11_match: obx_11 = obx_11_match.group(1).strip()
-            parts = line.split("|")
-            if len(parts) > 5:
-                base64_pdf += parts[5].strip()
-
-    return pid_5, pid_3, pid_7, obr_3, obr_4_2, obx_11, base64_pdf
-
-def process_hl7_file(hl7_file_path):
-    """Process a single HL7 file. Returns True on success, False on error."""
-    # Initialize variables for error reporting
-    pid_5 = pid_3 = pid_7 = obr_3 = obr_4_2 = obx_11 = None
+    for pid in msg["PID"]:
+        pid_3 = _stripped(pid.get(3), pid_3)
+        pid_5 = _stripped(pid.get(5), pid_5)
+        pid_7 = _stripped(pid.get(7), pid_7)
 
-    log.info("Processing file: %s", hl7_file_path)
+    for obr in msg["OBR"]:
+        obr_3 = _stripped(obr.get(3), obr_3)
+        if len(obr) >= 4 and len(obr[4]) > 1:
+            obr_4_2 = obr[4][2][:2].strip()
 
-    # Check if file exists and is readable
-    if not os.path.exists(hl7_file_path):
-        log.error("File does not exist: %s", hl7_file_path)
-        return False
+    # OBX can number in the hundreds of thousands for a large PDF, so pull the two fields in bulk
+    for obx_5, obx_11_value in msg.field_values("OBX", 5, 11):
+        obx_11 = _stripped(obx_11_value, obx_11)
+        if obx_5 is not None and obx_5_chunks is not None:
+            obx_5_chunks.append(obx_5.strip())
 
-    if not os.access(hl7_file_path, os.R_OK):
-        log.error("File is not readable: %s", hl7_file_path)
-        return False
+    return pid_5, pid_3, pid_7, obr_3, obr_4_2, obx_11
 
-    # Wait for file to be completely written
-    if not wait_for_file_complete(hl7_file_path):
-        log.warning("File may still be writing: %s, proceeding anyway", hl7_file_path)
+def parse_hl7(hl7_message):
+    """Report fields plus the joined OBX-5 base64 text from a whole message string (see read_hl7_to_pdf)."""
+    obx_5_chunks = []  # joined once at the end; repeated += goes quadratic on large embedded PDFs
+    fields = report_fields(parse_message(hl7_message), obx_5_chunks)
+    return (*fields, "".join(obx_5_chunks))
+
+def read_hl7_to_pdf(hl7_file_path, pdf_file):
+    """
+    Parse an HL7 file while base64-decoding its OBX-5 PDF straight into the open binary file `pdf_file`.
+    Only one read chunk of the payload is in memory at a time. Returns (message without OBX-5 values, decoder);
+    call decoder.close() to finish the PDF once the report fields have been checked.
+    """
+    decoder = Base64FieldDecoder(pdf_file, strip=PDF_PREFIX)
+    with open(hl7_file_path, "rb") as hl7_file:
+        msg = scan_message(hl7_file, "OBX", 5, decoder, collapse=True)
+    return msg, decoder
+
+def _new_dicom(sop_class_uid, tags, instance_number=1):
+    """
+    FileDataset with file meta, patient/study/series identity and the HL7-derived tags filled in.
+    Pages of one report pass the same StudyInstanceUID/SeriesInstanceUID in `tags` so they land in one series.
+    """
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = sop_class_uid
+    file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = FileDataset(None, {}, file_meta=file_meta, preamble=b"\0" * 128)
+    now = datetime.now()
+    ds.SOPClassUID = sop_class_uid
+    ds.SOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+    ds.StudyInstanceUID = tags.get("StudyInstanceUID") or generate_uid()
+    ds.SeriesInstanceUID = tags.get("SeriesInstanceUID") or generate_uid()
+    ds.StudyDate = ds.ContentDate = now.strftime("%Y%m%d")
+    ds.StudyTime = ds.ContentTime = now.strftime("%H%M%S")
+    ds.StudyID = ""
+    ds.ReferringPhysicianName = ""
+    ds.SeriesNumber = "1"
+    ds.InstanceNumber = str(instance_number)
+    ds.PatientName = tags["PatientName"]
+    ds.PatientID = tags["PatientID"]
+    ds.PatientBirthDate = tags["PatientBirthDate"][:8]
+    ds.PatientSex = tags["PatientSex"]
+    ds.AccessionNumber = tags["AccessionNumber"]
+    ds.Modality = tags["Modality"]
+    return ds
+
+def build_encapsulated_pdf(pdf_binary, tags):
+    """Encapsulated PDF Storage object carrying the decoded report PDF as-is."""
+    ds = _new_dicom(EncapsulatedPDFStorage, tags)
+    ds.ConversionType = "WSD"
+    ds.BurnedInAnnotation = "YES"
+    ds.DocumentTitle = "Preliminary Report"
+    ds.ConceptNameCodeSequence = Sequence([])
+    ds.AcquisitionDateTime = ds.ContentDate + ds.ContentTime
+    ds.MIMETypeOfEncapsulatedDocument = "application/pdf"
+    ds.EncapsulatedDocumentLength = len(pdf_binary)
+    ds.EncapsulatedDocument = pdf_binary + b"\0" if len(pdf_binary) % 2 else pdf_binary
+    return ds
+
+def build_secondary_capture(image, tags, instance_number=1):
+    """Secondary Capture with uncompressed pixel data from a PIL image (no JPEG round trip, no dcmdjpeg needed)."""
+    ds = _new_dicom(SecondaryCaptureImageStorage, tags, instance_number)
+    ds.ConversionType = "WSD"
+    if image.mode == "L":
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = "MONOCHROME2"
+    else:
+        image = image.convert("RGB")
+        ds.SamplesPerPixel = 3
+        ds.PhotometricInterpretation = "RGB"
+        ds.PlanarConfiguration = 0
+    ds.Rows = image.height
+    ds.Columns = image.width
+    ds.BitsAllocated = 8
+    ds.BitsStored = 8
+    ds.HighBit = 7
+    ds.PixelRepresentation = 0
+    pixels = image.tobytes()
+    ds.PixelData = pixels + b"\0" if len(pixels) % 2 else pixels
+    return ds
+
+def iter_pdf_pages(pdf_path, all_pages=False, dpi=RENDER_DPI, grayscale=RENDER_GRAYSCALE):
+    """
+    Yield (page_number, PIL image) one page at a time. Each page is a separate poppler call, so only the page being
+    encoded is held in memory -- convert_from_path over the whole document would hold every page at once.
+    """
+    page_count = pdfinfo_from_path(pdf_path)["Pages"] if all_pages else 1
+    for page in range(1, page_count + 1):
+        images = convert_from_path(pdf_path, dpi=dpi, first_page=page, last_page=page, grayscale=grayscale)
+        if not images:
+            raise ValueError(f"Page {page} of {pdf_path} did not render.")
+        yield page, images[0]
+
+def page_output_path(path, page):
+    """report.dcm -> report.dcm for page 1, report_p2.dcm for page 2, ..."""
+    if page == 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_p{page}{ext}"
+
+def claim_hl7_file(hl7_file_path):
+    """
+    Take an exclusive, non-blocking lock on the HL7 file so the live path, the resident worker and --batch never
+    process the same file twice. Returns the locked file descriptor, or None if another process holds the lock or the
+    file has already been moved away.
+    """
+    try:
+        fd = os.open(hl7_file_path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        # The previous holder may have finished and moved the file between our open() and flock()
+        if os.fstat(fd).st_ino != os.stat(hl7_file_path).st_ino:
+            raise OSError("file was replaced")
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+def _stage_done(timings, stage, since):
+    """Add how long `stage` took (when timings are being collected; summed over pages) and return the time it ended."""
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + now - since
+    return now
+
+def process_hl7_file(hl7_file_path, timings=None, settled=False):
+    """
+    Process a single HL7 file. Returns True on success, False on error, None if another process is already
+    handling it or has already processed and moved it. Pass a dict as `timings` to get per-stage durations (seconds)
+    back. settled=True skips the readiness wait (--batch only picks files that haven't changed for BATCH_MIN_AGE
+    seconds).
+    """
+    log.info("Processing file: %s", hl7_file_path)
 
+    lock_fd = claim_hl7_file(hl7_file_path)
+    if lock_fd is None:
+        if not os.path.exists(hl7_file_path):
+            name = os.path.basename(hl7_file_path)
+            if os.path.exists(os.path.join(hl7_dir, name)) or os.path.exists(os.path.join(error_dir, name)):
+                # Archived by whoever processed it since it was queued/scanned (live path, worker, another batch)
+                log.info("Skipping %s: no longer there, already processed", hl7_file_path)
+                return None
+            log.error("File does not exist: %s", hl7_file_path)
+            return False
+        if not os.access(hl7_file_path, os.R_OK):
+            log.error("File is not readable: %s", hl7_file_path)
+            return False
+        log.info("Skipping %s: already being processed by another worker", hl7_file_path)
+        return None
     try:
-        with open(hl7_file_path, "r", encoding='utf-8', errors='ignore') as file:
-            hl7_message = file.read()
+        return _convert_hl7_file(hl7_file_path, timings, settled)
+    finally:
+        os.close(lock_fd)
+
+def _convert_hl7_file(hl7_file_path, timings, settled):
+    """HL7 -> PDF -> JPEG(s) -> DICOM(s) for a file the caller has claimed; moves it to the archive or error dir."""
+    # Initialize variables for error reporting
+    pid_5 = pid_3 = pid_7 = obr_3 = obr_4_2 = obx_11 = None
+    partial_pdf_path = None
+
+    # Wait for file to be completely written: immediate for close_write/moved_to on local disk, size polling for
+    # network-mounted sources or FILE_READINESS=poll (see file_readiness.py)
+    if not settled:
+        ready, waited = wait_until_ready(hl7_file_path)
+        if timings is not None:
+            timings["wait"] = waited
+        if not ready:
+            log.warning("File may still be writing: %s, proceeding anyway", hl7_file_path)
+        elif waited:
+            log.info("Waited %.1f s for %s to finish writing", waited, hl7_file_path)
 
-        if not hl7_message.strip():
+    try:
+        stage_start = time.perf_counter()
+        # The PDF is decoded while the HL7 is read, into a partial file that gets its real name once the fields are in
+        partial_pdf_path = os.path.join(pdf_dir, f".{os.path.basename(hl7_file_path)}.part")
+        with open(partial_pdf_path, "wb") as pdf_file:
+            msg, decoder = read_hl7_to_pdf(hl7_file_path, pdf_file)
+            try:
+                decoder.close()
+                decode_error = None
+            except ValueError as e:
+                decode_error = e
+
+        if not msg.raw_segments:
             raise ValueError("HL7 file is empty")
 
-        pid_5, pid_3, pid_7, obr_3, obr_4_2, obx_11, base64_pdf = parse_hl7(hl7_message)
+        pid_5, pid_3, pid_7, obr_3, obr_4_2, obx_11 = report_fields(msg)
+        stage_start = _stage_done(timings, "parse", stage_start)
 
         # Validate required fields early
         if not all([pid_5, pid_3, pid_7, obr_3, obr_4_2, obx_11]):
@@ -151,52 +335,99 @@ def process_hl7_file(hl7_file_path):
         output_dcm_name = f"{safe_pid_5}_{safe_pid_3}_{safe_obr_3}.dcm"
         output_dcm_path = os.path.join(dcm_dir, output_dcm_name)
 
-        # Step 1: Decode Base64 PDF
-        if not base64_pdf:
+        # Step 1: Base64 PDF (already decoded into the partial file)
+        if not decoder.size:
             raise ValueError("No base64 PDF data found in HL7 message")
+        if decode_error:
+            raise ValueError(f"Failed to decode base64 PDF: {decode_error}")
 
-        base64_pdf_cleaned = base64_pdf.replace("^^PDF^Base64^", "").replace("\n", "").replace("\r", "")
-        padding_needed = len(base64_pdf_cleaned) % 4
-        if padding_needed:
-            base64_pdf_cleaned += "=" * (4 - padding_needed)
-
-        try:
-            pdf_binary = base64.b64decode(base64_pdf_cleaned)
-        except Exception as e:
-            raise ValueError(f"Failed to decode base64 PDF: {e}")
-
-        with open(output_pdf_path, "wb") as pdf_file:
-            pdf_file.write(pdf_binary)
+        os.replace(partial_pdf_path, output_pdf_path)
+        partial_pdf_path = None
         log.info("PDF saved: %s", output_pdf_path)
-
-        # Step 2: Convert PDF to JPEG
-        try:
-            images = convert_from_path(output_pdf_path, dpi=200, first_page=1, last_page=1)
-            if not images:
-                raise ValueError("No pages found in PDF for JPEG conversion.")
-            images[0].save(output_jpg_path, 'JPEG')
-            log.info("JPEG created: %s", output_jpg_path)
-        except Exception as e:
-            raise ValueError(f"Failed to convert PDF to JPEG: {e}")
-
-        # Step 3: Convert JPEG to DICOM
-        img2dcm_command = [
-            'img2dcm',
-            '-k', f'(0010,0010)={pid_5}',     # Patient Name
-            '-k', f'(0010,0020)={pid_3}',     # Patient ID
-            '-k', f'(0010,0030)={pid_7}',     # Patient DOB
-            '-k', f'(0010,0040)={obx_11}',    # Patient Sex (or other value stored in OBX-11)
-            '-k', f'(0008,0050)={obr_3}',     # Accession Number
-            '-k', f'(0008,0060)={obr_4_2}',   # Modality
-            output_jpg_path,
-            output_dcm_path
-        ]
-
-        try:
-            result = subprocess.run(img2dcm_command, check=True, capture_output=True, text=True)
-            log.info("DICOM created: %s", output_dcm_path)
-        except subprocess.CalledProcessError as e:
-            raise ValueError(f"img2dcm failed: {e.stderr if e.stderr else str(e)}")
+        stage_start = _stage_done(timings, "pdf", stage_start)
+
+        tags = {
+            "PatientName": pid_5,
+            "PatientID": pid_3,
+            "PatientBirthDate": pid_7,
+            "PatientSex": obx_11,     # Patient Sex (or other value stored in OBX-11)
+            "AccessionNumber": obr_3,
+            "Modality": obr_4_2,
+        }
+
+        if HL7_DICOM_MODE == "pdf":
+            # Step 2: Wrap the PDF itself in a DICOM Encapsulated PDF object
+            with open(output_pdf_path, "rb") as pdf_file:
+                pdf_binary = pdf_file.read()
+            build_encapsulated_pdf(pdf_binary, tags).save_as(output_dcm_path, write_like_original=False)
+            log.info("DICOM (Encapsulated PDF) created: %s", output_dcm_path)
+            _stage_done(timings, "dicom", stage_start)
+
+        else:
+            all_pages = HL7_PAGES == "all"
+            if all_pages:
+                # Every page goes into one series; img2dcm would otherwise mint new UIDs per file
+                tags["StudyInstanceUID"] = generate_uid()
+                tags["SeriesInstanceUID"] = generate_uid()
+
+            # Step 2: Render one page at a time and turn it into a DICOM before the next page is rendered
+            pages = iter_pdf_pages(output_pdf_path, all_pages)
+            page_count = 0
+            while True:
+                try:
+                    page, image = next(pages, (None, None))
+                except Exception as e:
+                    raise ValueError(f"Failed to render PDF: {e}")
+                if page is None:
+                    break
+                stage_start = _stage_done(timings, "render", stage_start)
+                page_dcm_path = page_output_path(output_dcm_path, page)
+
+                if HL7_DICOM_MODE == "sc":
+                    # Step 3: Uncompressed Secondary Capture straight from the image
+                    build_secondary_capture(image, tags, page).save_as(page_dcm_path, write_like_original=False)
+                    log.info("DICOM (Secondary Capture) created: %s", page_dcm_path)
+
+                else:
+                    # Step 3: Save the page as JPEG
+                    page_jpg_path = page_output_path(output_jpg_path, page)
+                    try:
+                        image.save(page_jpg_path, 'JPEG')
+                        log.info("JPEG created: %s", page_jpg_path)
+                    except Exception as e:
+                        raise ValueError(f"Failed to convert PDF to JPEG: {e}")
+                    stage_start = _stage_done(timings, "jpeg", stage_start)
+
+                    # Step 4: Convert JPEG to DICOM
+                    img2dcm_command = [
+                        'img2dcm',
+                        '-k', f'(0010,0010)={pid_5}',     # Patient Name
+                        '-k', f'(0010,0020)={pid_3}',     # Patient ID
+                        '-k', f'(0010,0030)={pid_7}',     # Patient DOB
+                        '-k', f'(0010,0040)={obx_11}',    # Patient Sex (or other value stored in OBX-11)
+                        '-k', f'(0008,0050)={obr_3}',     # Accession Number
+                        '-k', f'(0008,0060)={obr_4_2}',   # Modality
+                    ]
+                    if all_pages:
+                        img2dcm_command += [
+                            '-k', f'(0020,000D)={tags["StudyInstanceUID"]}',    # Study Instance UID
+                            '-k', f'(0020,000E)={tags["SeriesInstanceUID"]}',   # Series Instance UID
+                            '-k', f'(0020,0013)={page}',                        # Instance Number
+                        ]
+                    img2dcm_command += [page_jpg_path, page_dcm_path]
+
+                    try:
+                        result = subprocess.run(img2dcm_command, check=True, capture_output=True, text=True)
+                        log.info("DICOM created: %s", page_dcm_path)
+                    except subprocess.CalledProcessError as e:
+                        raise ValueError(f"img2dcm failed: {e.stderr if e.stderr else str(e)}")
+
+                del image  # drop this page before rendering the next
+                page_count += 1
+                stage_start = _stage_done(timings, "dicom", stage_start)
+
+            if page_count > 1:
+                log.info("%d pages written as one series for %s", page_count, output_dcm_name)
 
         # Move processed file to archive
         shutil.move(hl7_file_path, os.path.join(hl7_dir, os.path.basename(hl7_file_path)))
@@ -207,6 +438,9 @@ def process_hl7_file(hl7_file_path):
         log.error("Error processing %s: %s", hl7_file_path, e)
         log.error("Context: PID-5=%s PID-3=%s PID-7=%s OBR-3=%s OBR-4-2=%s OBX-11=%s", pid_5, pid_3, pid_7, obr_3, obr_4_2, obx_11)
 
+        if partial_pdf_path and os.path.exists(partial_pdf_path):
+            os.remove(partial_pdf_path)
+
         # Move error file
         try:
             shutil.move(hl7_file_path, os.path.join(error_dir, os.path.basename(hl7_file_path)))
@@ -216,13 +450,118 @@ def process_hl7_file(hl7_file_path):
         return False
 
 
+def process_hl7_file_timed(hl7_file_path, cold_start=False):
+    """
+    process_hl7_file plus a per-file latency line in the log (cold_start adds interpreter/import time).
+    A file skipped because another process holds it counts as success; that process reports the outcome.
+    """
+    timings = {}
+    start = time.perf_counter()
+    success = process_hl7_file(hl7_file_path, timings)
+    end = time.perf_counter()
+    wait_ms = timings.get("wait", 0.0) * 1000
+    if cold_start:
+        log.info("Latency %s: %.0f ms processing (%.0f ms readiness wait), %.0f ms incl. startup (cold start)",
+                 os.path.basename(hl7_file_path), (end - start) * 1000, wait_ms, (end - _STARTED) * 1000)
+    else:
+        log.info("Latency %s: %.0f ms processing (%.0f ms readiness wait) (resident worker)",
+                 os.path.basename(hl7_file_path), (end - start) * 1000, wait_ms)
+    return success is not False
+
+
+def _batch_process(hl7_file_path):
+    """--batch pool task: runs in a worker process, returns (path, result, per-stage timings, total seconds)."""
+    timings = {}
+    start = time.perf_counter()
+    result = process_hl7_file(hl7_file_path, timings, settled=True)
+    return hl7_file_path, result, timings, time.perf_counter() - start
+
+def _percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))]
+
+def run_batch(directory, workers=None, min_age=BATCH_MIN_AGE):
+    """
+    Process every HL7 file directly under `directory` across a process pool. Each file keeps the single-file
+    archive/error handling; files another process has claimed (live inotify path, resident worker, a second batch)
+    are skipped. Prints and logs a throughput summary. Returns True if no file failed.
+    """
+    now = time.time()
+    files = []
+    for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+        if not entry.is_file() or entry.name.endswith(BATCH_SKIP_PATTERNS):
+            continue
+        if entry.name.startswith(("FAX_", "PRELIM_")):
+            continue  # routed to ORU2pdf.py / prelimSR.py, not HL7 with embedded PDF
+        try:
+            if now - entry.stat().st_mtime < min_age:
+                continue
+        except FileNotFoundError:
+            continue  # archived by the live path or the resident worker since the listing
+        files.append(entry.path)
+
+    workers = workers or os.cpu_count()
+    log.info("Batch started: %d file(s) in %s, %d worker(s)", len(files), directory, workers)
+    print(f"Batch: {len(files)} file(s) in {directory}, {workers} worker(s)")
+
+    counts = {"ok": 0, "err": 0, "skipped": 0}
+    stage_times = {}
+    totals = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_batch_process, path) for path in files]
+        for future in as_completed(futures):
+            path, result, timings, elapsed = future.result()
+            if result is None:
+                counts["skipped"] += 1
+                continue
+            counts["ok" if result else "err"] += 1
+            totals.append(elapsed)
+            for stage, seconds in timings.items():
+                stage_times.setdefault(stage, []).append(seconds)
+    wall = time.perf_counter() - start
+
+    processed = counts["ok"] + counts["err"]
+    lines = [
+        f"Batch finished in {wall:.1f} s: {counts['ok']} ok, {counts['err']} err, {counts['skipped']} skipped "
+        f"({processed / wall if wall else 0:.2f} files/s)",
+    ]
+    for stage, values in stage_times.items():
+        lines.append(f"  {stage:<6} p50 {_percentile(values, 50) * 1000:8.1f} ms"
+                     f"   p95 {_percentile(values, 95) * 1000:8.1f} ms")
+    if totals:
+        lines.append(f"  {'total':<6} p50 {_percentile(totals, 50) * 1000:8.1f} ms"
+                     f"   p95 {_percentile(totals, 95) * 1000:8.1f} ms")
+    for line in lines:
+        print(line)
+        log.info(line)
+    return counts["err"] == 0
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        log.error("Usage: hl7_pdf_dcm.py <hl7_file_path>")
+        log.error("Usage: hl7_pdf_dcm.py <hl7_file_path> | --serve [socket_path] | --batch <dir> [--workers N]")
         sys.exit(1)
 
+    if sys.argv[1] == "--serve":
+        socket_path = sys.argv[2] if len(sys.argv) > 2 else HL7_WORKER_SOCKET
+        log.info("hl7_pdf_dcm worker starting (startup %.0f ms)", (time.perf_counter() - _STARTED) * 1000)
+        serve(socket_path, process_hl7_file_timed)
+        sys.exit(0)
+
+    if sys.argv[1] == "--batch":
+        if len(sys.argv) < 3:
+            log.error("Usage: hl7_pdf_dcm.py --batch <dir> [--workers N]")
+            sys.exit(1)
+        workers = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else None
+        sys.exit(0 if run_batch(sys.argv[2], workers) else 1)
+
     hl7_file_path = sys.argv[1]
     log.info("hl7_pdf_dcm started for: %s", hl7_file_path)
-    success = process_hl7_file(hl7_file_path)
+    if not os.path.exists(hl7_file_path):
+        log.error("File does not exist: %s", hl7_file_path)
+        sys.exit(1)
+    success = process_hl7_file_timed(hl7_file_path, cold_start=True)
     log.info("hl7_pdf_dcm finished: %s", "ok" if success else "err")
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    sys.exit(0 if success else 1)
@@ -0,0 +1,195 @@
+"""
+Rule-driven field rewrites for HL7 flat files (one segment per line, messages starting at MSH), in one streaming pass.
+
+Rules map a field (or component) reference to a table of value replacements:
+
+    rules = {
+        "OBR-24": {"DXA": "OT", "MRCP": "MR"},
+        "PID-8": {"Female": "F", "Male": "M"},
+        "OBR-4.2": {"CT HEAD": "CT HEAD WO"},
+    }
+
+compile_rules() turns them, once, into a segment type -> [(split position, component, replacements)] table, so each
+line costs one dict lookup on its first three characters and only segments with rules are split. A field (or
+component) is replaced only when its whole value is a key of its table; fields a segment doesn't have are left alone.
+
+Two output modes:
+  - every line (OBR24Update.py): each line is written as it is read, with its rules applied and "\\n" line endings
+  - only_changed (ModalityCodeMod.py): only the messages in which some rule changed a value are written, their
+    segments stripped of surrounding whitespace, joined with "\\r", messages also separated by "\\r"
+Either way only the current message is held in memory, so file size doesn't matter.
+
+    python hl7_rewrite.py input [output] [--rules rules.json] [--only-changed]
+
+input may be a directory (every .txt file in it). Without output, files are rewritten in place through a temp file
+that replaces the original. rules.json holds the rules above as a JSON object; without --rules, `rules` below is used.
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+from hl7_parser import DEFAULT_DELIMITERS, field_split_index, parse_delimiters, parse_field_spec
+
+READ_BUFFER = 1 << 20  # bytes of input read at a time
+
+# Rules used when no --rules file is given
+rules = {
+    "OBR-24": {
+        "STEREOTACTIC": "MG",
+        "TISSUE": "MG",
+        "MAMMOGRAPHY": "MG",
+        "DIGITAL": "MG",
+        "DXA": "OT",
+        "MRCP": "MR",
+    },
+}
+
+
+def compile_rules(rules):
+    """{"OBR-24": {old: new, ...}, ...} -> {"OBR": [(split position, component or None, {old: new}), ...], ...}"""
+    table = {}
+    for spec, replacements in rules.items():
+        segment, field, component = parse_field_spec(spec)
+        if segment == "MSH" and field < 3:
+            raise ValueError(f"{spec}: MSH-1 and MSH-2 hold the delimiters and can't be rewritten")
+        if not isinstance(replacements, dict) or not all(
+                isinstance(k, str) and isinstance(v, str) for k, v in replacements.items()):
+            raise ValueError(f"{spec}: replacements must map strings to strings")
+        table.setdefault(segment, []).append((field_split_index(segment, field), component, dict(replacements)))
+    return table
+
+
+def load_rules(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def rewrite_segment(line, segment_rules, delimiters=DEFAULT_DELIMITERS):
+    """`line` (no line ending) with the segment's rules applied, or None if no value changed."""
+    fields = line.split(delimiters.field)
+    changed = False
+    for position, component, replacements in segment_rules:
+        if position >= len(fields):
+            continue
+        if component is None:
+            new = replacements.get(fields[position])
+            if new is not None:
+                fields[position] = new
+                changed = True
+        else:
+            components = fields[position].split(delimiters.component)
+            if component <= len(components):
+                new = replacements.get(components[component - 1])
+                if new is not None:
+                    components[component - 1] = new
+                    fields[position] = delimiters.component.join(components)
+                    changed = True
+    return delimiters.field.join(fields) if changed else None
+
+
+def rewrite_lines(infile, outfile, table):
+    """Copy every line of infile to outfile with the rules applied; returns (lines, lines changed)."""
+    delimiters = DEFAULT_DELIMITERS
+    count = changed = 0
+    while True:
+        lines = infile.readlines(READ_BUFFER)
+        if not lines:
+            break
+        count += len(lines)
+        if not lines[-1].endswith("\n"):
+            lines[-1] += "\n"
+        for i, line in enumerate(lines):
+            name = line[:3]
+            if name == "MSH":
+                delimiters = parse_delimiters(line)
+            segment_rules = table.get(name)
+            if segment_rules is None:
+                continue
+            updated = rewrite_segment(line.rstrip("\r\n"), segment_rules, delimiters)
+            if updated is not None:
+                lines[i] = updated + "\n"
+                changed += 1
+        outfile.writelines(lines)
+    return count, changed
+
+
+def rewrite_changed_messages(infile, outfile, table):
+    """Write only the messages of infile in which a rule changed a value; returns (messages, messages written)."""
+    delimiters = DEFAULT_DELIMITERS
+    current_message = []
+    is_matching = False
+    messages = written = 0
+
+    def flush():
+        nonlocal written
+        if is_matching and current_message:
+            outfile.write(("\r" if written else "") + "\r".join(current_message))
+            written += 1
+
+    for line in infile:
+        line = line.strip()
+        if line.startswith("MSH"):
+            flush()
+            current_message = []
+            is_matching = False
+            messages += 1
+            delimiters = parse_delimiters(line)
+        segment_rules = table.get(line[:3])
+        if segment_rules is not None:
+            updated = rewrite_segment(line, segment_rules, delimiters)
+            if updated is not None:
+                line = updated
+                is_matching = True
+        current_message.append(line)
+    flush()
+    return messages, written
+
+
+def rewrite_file(input_file, output_file, table, only_changed=False):
+    """
+    Rewrite input_file into output_file (None: in place, through a temp file that then replaces it). Returns the
+    counts from rewrite_lines / rewrite_changed_messages.
+    """
+    rewrite = rewrite_changed_messages if only_changed else rewrite_lines
+    if output_file is not None:
+        with open(input_file, "r", encoding="utf-8", buffering=READ_BUFFER) as infile, \
+                open(output_file, "w", encoding="utf-8", buffering=READ_BUFFER) as outfile:
+            return rewrite(infile, outfile, table)
+
+    directory, name = os.path.split(input_file)
+    fd, temp_file = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory or ".")
+    try:
+        with open(input_file, "r", encoding="utf-8", buffering=READ_BUFFER) as infile, \
+                open(fd, "w", encoding="utf-8", buffering=READ_BUFFER) as outfile:
+            counts = rewrite(infile, outfile, table)
+        os.chmod(temp_file, os.stat(input_file).st_mode & 0o7777)
+        os.replace(temp_file, input_file)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.unlink(temp_file)
+        raise
+    return counts
+
+
+if __name__ == "__main__":
+    if "--rules" in sys.argv:
+        rules = load_rules(sys.argv[sys.argv.index("--rules") + 1])
+    args = [a for i, a in enumerate(sys.argv[1:], 1) if not a.startswith("--") and sys.argv[i - 1] != "--rules"]
+    if not 1 <= len(args) <= 2 or (len(args) == 2 and os.path.isdir(args[0])):
+        print("Usage: hl7_rewrite.py input_file [output_file] [--rules rules.json] [--only-changed]\n"
+              "       hl7_rewrite.py directory [--rules rules.json] [--only-changed]")
+        sys.exit(1)
+    only_changed = "--only-changed" in sys.argv
+    table = compile_rules(rules)
+
+    if os.path.isdir(args[0]):
+        inputs = [os.path.join(args[0], f) for f in sorted(os.listdir(args[0])) if f.endswith(".txt")]
+    else:
+        inputs = [args[0]]
+    for input_file in inputs:
+        output_file = args[1] if len(args) > 1 else None
+        total, changed = rewrite_file(input_file, output_file, table, only_changed)
+        unit = "messages" if only_changed else "lines"
+        print(f"{input_file}: {changed} of {total} {unit} changed -> {output_file or input_file}")
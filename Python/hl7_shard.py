@@ -0,0 +1,160 @@
+"""
+Multi-core hl7_rewrite for large HL7 flat files: the file is cut into byte-range shards at MSH message boundaries,
+the shards are rewritten by a process pool, and the results are joined back in the original order.
+
+    python hl7_shard.py input [output] [--rules rules.json] [--only-changed] [--workers N]
+
+Same options and the same output, byte for byte, as hl7_rewrite.py. Without output the file is rewritten in place
+through a temp file that replaces the original.
+
+Shard boundaries are found by memory-mapping the file and looking, from each 1/Nth point, for the next "MSH" at the
+start of a line. A shard therefore holds whole lines and whole messages, and each worker runs the usual
+rewrite_lines / rewrite_changed_messages loop on its own byte range. Workers write their part next to the output;
+the parent appends each part, and deletes it, as soon as it and every earlier one are done.
+"""
+
+import io
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import hl7_rewrite
+from hl7_rewrite import READ_BUFFER, compile_rules, rewrite_changed_messages, rewrite_lines
+
+SHARDS_PER_WORKER = 4  # more shards than workers, so one slow shard doesn't leave the other cores idle
+MIN_SHARD_SIZE = 8 << 20  # bytes; smaller files get fewer shards
+
+
+def next_message_start(mm, pos):
+    """Offset of the first "MSH" at or after `pos` that starts a line, or None."""
+    while True:
+        pos = mm.find(b"MSH", pos)
+        if pos < 0:
+            return None
+        if pos == 0 or mm[pos - 1] in b"\r\n":
+            return pos
+        pos += 1
+
+
+def find_message_shards(path, count):
+    """
+    Up to `count` (start, end) byte ranges covering the file, each starting at a line that begins with MSH (the first
+    one at 0, so anything before the first MSH goes with it).
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return [(0, 0)]
+    bounds = [0]
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i in range(1, count):
+            start = next_message_start(mm, max(size * i // count, bounds[-1] + 1))
+            if start is None:
+                break
+            if start > bounds[-1]:
+                bounds.append(start)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+class _ByteRange(io.RawIOBase):
+    """Raw binary stream over bytes [start, end) of a file."""
+
+    def __init__(self, path, start, end):
+        self._file = open(path, "rb", buffering=0)
+        self._file.seek(start)
+        self._left = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._left <= 0:
+            return 0
+        count = self._file.readinto(memoryview(buffer)[:min(len(buffer), self._left)])
+        self._left -= count
+        return count
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def open_shard(path, start, end):
+    """Text stream (UTF-8, universal newlines, like open(path, "r")) over one shard of the file."""
+    return io.TextIOWrapper(io.BufferedReader(_ByteRange(path, start, end), READ_BUFFER), encoding="utf-8")
+
+
+def rewrite_shard(input_file, start, end, part_file, table, only_changed=False):
+    """Rewrite one shard into part_file; returns the (total, changed) counts."""
+    rewrite = rewrite_changed_messages if only_changed else rewrite_lines
+    with open_shard(input_file, start, end) as infile, \
+            open(part_file, "w", encoding="utf-8", buffering=READ_BUFFER) as outfile:
+        return rewrite(infile, outfile, table)
+
+
+def rewrite_file_sharded(input_file, output_file, table, only_changed=False, workers=None, shards=None):
+    """
+    hl7_rewrite.rewrite_file on `workers` processes (default: one per CPU). Returns the summed (total, changed)
+    counts: (lines, lines changed), or (messages, messages written) with only_changed.
+    """
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(input_file)
+    shards = shards or max(1, min(workers * SHARDS_PER_WORKER, size // MIN_SHARD_SIZE))
+    ranges = find_message_shards(input_file, shards)
+    if workers == 1 or len(ranges) == 1:
+        return hl7_rewrite.rewrite_file(input_file, output_file, table, only_changed)
+
+    target = output_file or input_file
+    directory, name = os.path.split(os.path.abspath(target))
+    work_dir = tempfile.mkdtemp(prefix=f".{name}.", dir=directory)
+    part_files = [os.path.join(work_dir, f"part{n}") for n in range(len(ranges))]
+    joined_file = output_file or os.path.join(work_dir, name)
+    total = changed = 0
+    try:
+        with open(joined_file, "wb") as joined, ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(rewrite_shard, input_file, start, end, part_file, table, only_changed)
+                       for (start, end), part_file in zip(ranges, part_files)]
+            for future, part_file in zip(futures, part_files):
+                shard_total, shard_changed = future.result()
+                total += shard_total
+                changed += shard_changed
+                with open(part_file, "rb") as part:
+                    first = part.read(1)
+                    if first:
+                        # rewrite_changed_messages separates messages with \r but doesn't end the last one
+                        if only_changed and joined.tell():
+                            joined.write(b"\r")
+                        joined.write(first)
+                        while True:
+                            chunk = part.read(READ_BUFFER)
+                            if not chunk:
+                                break
+                            joined.write(chunk)
+                os.unlink(part_file)
+        if output_file is None:
+            os.chmod(joined_file, os.stat(input_file).st_mode & 0o7777)
+            os.replace(joined_file, input_file)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return total, changed
+
+
+if __name__ == "__main__":
+    rules = hl7_rewrite.rules
+    if "--rules" in sys.argv:
+        rules = hl7_rewrite.load_rules(sys.argv[sys.argv.index("--rules") + 1])
+    workers = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else None
+    args = [a for i, a in enumerate(sys.argv[1:], 1)
+            if not a.startswith("--") and sys.argv[i - 1] not in ("--rules", "--workers")]
+    if not 1 <= len(args) <= 2:
+        print("Usage: hl7_shard.py input_file [output_file] [--rules rules.json] [--only-changed] [--workers N]")
+        sys.exit(1)
+    only_changed = "--only-changed" in sys.argv
+    output_file = args[1] if len(args) > 1 else None
+
+    total, changed = rewrite_file_sharded(args[0], output_file, compile_rules(rules), only_changed, workers)
+    unit = "messages" if only_changed else "lines"
+    print(f"{args[0]}: {changed} of {total} {unit} changed -> {output_file or args[0]}")
@@ -0,0 +1,90 @@
+"""
+JSON Lines (NDJSON) files: one compact JSON record per line, each ending in a newline. Non-ASCII characters are
+written as \\uXXXX escapes, so the files are plain ASCII (and valid UTF-8).
+
+A JSON Lines extract can be read one record at a time, appended to without rewriting it, and cut into byte ranges that
+separate processes read independently. That lets one file stand in for a directory of per-report JSON files.
+
+    from jsonl import append_records, iter_records, split_offsets
+    append_records("notes.jsonl", entries)                  # creates the file, or adds to the end of it
+    for offset, record in iter_records("notes.jsonl"):      # offset = byte position where the record's line starts
+        ...
+    for start, end in split_offsets("notes.jsonl", 4):      # 4 byte ranges; together they hold every record once
+        ...iter_records("notes.jsonl", start, end)...
+
+Byte ranges: a range [start, end) owns every line that *starts* inside it. A reader whose range begins mid-line skips
+forward to the next line, and reads past `end` to finish the line it is on. Ranges that cover the file without gaps
+therefore see every record exactly once, wherever the boundaries fall.
+"""
+
+import json
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+READ_BUFFER = 1 << 20
+
+
+def dumps_record(record):
+    """One record as a JSON Lines line (compact, with the trailing newline)."""
+    return json.dumps(record, separators=(',', ':')) + "\n"
+
+
+def append_records(path, records):
+    """
+    Append the records to `path` (created if missing); returns how many were written. If the file doesn't end in a
+    newline (a writer died mid-line) one is added first, so the torn line stays on its own and fails alone.
+    """
+    count = 0
+    with open(path, 'a', encoding='ascii', newline='\n', buffering=READ_BUFFER) as f:
+        if f.tell() > 0 and not _ends_with_newline(path):
+            f.write("\n")
+        for record in records:
+            f.write(dumps_record(record))
+            count += 1
+    return count
+
+
+def _ends_with_newline(path):
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def iter_records(path, start=0, end=None, skip_invalid=False):
+    """
+    Yield (offset, record) for every line of `path` that starts in the byte range [start, end) (end None: to the end
+    of the file). Blank lines are skipped. An unparsable line raises ValueError giving its offset, or with
+    skip_invalid is logged and skipped.
+    """
+    with open(path, 'rb', buffering=READ_BUFFER) as f:
+        offset = start
+        if start > 0:
+            # the line that starts at `start` is ours only if the byte before it ends the previous line
+            f.seek(start - 1)
+            offset += len(f.readline()) - 1
+        while end is None or offset < end:
+            line = f.readline()
+            if not line:
+                return
+            line_offset = offset
+            offset += len(line)
+            if line.isspace():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                if not skip_invalid:
+                    raise ValueError(f"{path}: invalid JSON at byte {line_offset}: {e}") from None
+                log.error("%s: skipping invalid JSON at byte %d: %s", path, line_offset, e)
+                continue
+            yield line_offset, record
+
+
+def split_offsets(path, parts):
+    """Cut `path` into `parts` byte ranges of about equal size, as (start, end) pairs for iter_records."""
+    size = os.path.getsize(path)
+    parts = max(1, parts)
+    bounds = [size * i // parts for i in range(parts + 1)]
+    return list(zip(bounds, bounds[1:]))
@@ -0,0 +1,631 @@
+"""
+asyncio replacement for the three `inotifywait | while read` loops of BASH/filemonitor.sh: the same directories, the
+same routing rules and the same commands, but each route has its own worker pool, so one slow storescu or PDF render
+only holds up files of its own route instead of everything queued behind it.
+
+    python pipeline_orchestrator.py            # run until SIGTERM/SIGINT
+    python pipeline_orchestrator.py --drain    # handle everything already waiting (journal + rescan), then exit
+
+Routes (filemonitor.sh's rules):
+  fax           FAX_*.json in MONITOR_DIR       -> moved to FAX_DIR, ORU2pdf.py (resident worker if up, else a run)
+  prelim        PRELIM_* in MONITOR_DIR         -> moved to PRELIM_DIR, prelimSR.py
+  hl7           any other file in MONITOR_DIR   -> hl7_pdf_dcm.py (resident worker if up, else a run)
+  hl7_dicom     files in HL7toDICOM/DICOM       -> decompressed (img2dcm mode only) and sent to DICOM_AEC,
+                                                   then Processed/ or Failed/
+  prelim_dicom  <AET>_* in PrelimSR/DICOM       -> decompressed and sent as <AET> to PRELIM_AEC, Processed/ or Failed/
+DICOM files are sent over associations dicom_sender.py keeps open, one per calling/called AET pair (so one per
+facility for PrelimSR), and JPEG is decoded in memory; DICOM_SENDER=storescu runs dcmdjpeg and storescu per file
+instead, as filemonitor.sh does.
+(*.swp, *.tmp, *.swx, *~ are ignored, and so are the *_uncompressed.dcm copies dcmdjpeg leaves in the DICOM folders.)
+
+Scheduling:
+  - each route has its own queue and runs at most ROUTE_CONCURRENCY[route] jobs at once
+  - MAX_JOBS caps the jobs running across all routes; when they are all busy, the next free slot goes to the most
+    urgent waiting job: PRELIM work (prelim, prelim_dicom) first, then files that just arrived, then backfill found by
+    the start-up rescan. Each route's queue is served in the same order.
+  - each job is recorded in a SQLite journal (QUEUE_DB) when it is accepted and removed when it has finished, so after
+    a crash or restart queued and interrupted jobs run again (a job started MAX_ATTEMPTS times is given up on), and
+    files that arrived while nothing was watching are picked up by rescanning the watched folders
+
+Files are reported by `inotifywait -m` (close_write, moved_to) as in filemonitor.sh. Without inotifywait, or with
+WATCH_MODE=poll, the folders are listed every POLL_INTERVAL seconds and a file is taken once its size and mtime have
+held still across two listings. Inbound files then get the scripts' readiness check (file_readiness.py).
+
+Like filemonitor.sh it starts the resident hl7_pdf_dcm.py and ORU2pdf.py workers (START_WORKERS), writes one line per
+file to LOG_FILE and sends each script's own output to its log. Every setting below can be overridden by an
+environment variable of the same name, e.g. to run against a local stand-in SCP:
+    DICOM_HOST=127.0.0.1 DICOM_PORT=11112 python pipeline_orchestrator.py
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import shutil
+import signal
+import sqlite3
+import sys
+import time
+
+import worker_socket
+from file_readiness import wait_until_ready
+
+try:
+    from dicom_sender import HAVE_PYNETDICOM, StoreClients, StoreError
+except ImportError:
+    HAVE_PYNETDICOM = False
+
+
+def _setting(name, default):
+    value = os.environ.get(name)
+    return default if value is None else type(default)(value)
+
+
+# Folders and scripts (filemonitor.sh defaults)
+MONITOR_DIR = _setting("MONITOR_DIR", "/var/lib/filemonitor")
+HL7toDICOM_DIR = _setting("HL7toDICOM_DIR", os.path.join(MONITOR_DIR, "HL7toDICOM", "DICOM"))
+FAX_DIR = _setting("FAX_DIR", os.path.join(MONITOR_DIR, "FAX"))
+PRELIM_DIR = _setting("PRELIM_DIR", os.path.join(MONITOR_DIR, "PrelimSR"))
+PRELIM_DICOM_DIR = _setting("PRELIM_DICOM_DIR", os.path.join(PRELIM_DIR, "DICOM"))
+PYTHON = _setting("PYTHON", "/opt/radx-workflow/bin/python")
+HL7toDICOM_SCRIPT = _setting("HL7toDICOM_SCRIPT", "/opt/hl7toDICOM.py")
+FAX_SCRIPT = _setting("FAX_SCRIPT", "/opt/ORU2pdf.py")
+PRELIM_SCRIPT = _setting("PRELIM_SCRIPT", "/opt/prelimSR.py")
+STORESCU = _setting("STORESCU", "storescu")
+DCMDJPEG = _setting("DCMDJPEG", "dcmdjpeg")
+# association: dicom_sender.py keeps one association per calling/called AET pair open and decompresses in memory;
+# storescu: dcmdjpeg + storescu per file, as filemonitor.sh does (also used when pynetdicom isn't installed)
+DICOM_SENDER = _setting("DICOM_SENDER", "association")
+
+# Resident workers (--serve), started here and fed over their sockets; a run per file when they're unreachable
+START_WORKERS = _setting("START_WORKERS", 1)
+HL7_WORKER_SOCKET = _setting("HL7_WORKER_SOCKET", "/run/filemonitor/hl7_pdf_dcm.sock")
+FAX_WORKER_SOCKET = _setting("FAX_WORKER_SOCKET", "/run/filemonitor/ORU2pdf.sock")
+
+HL7_DICOM_MODE = _setting("HL7_DICOM_MODE", "img2dcm")  # img2dcm output is JPEG and gets dcmdjpeg before sending
+
+# DICOM send configuration
+DICOM_HOST = _setting("DICOM_HOST", "192.168.1.25")
+DICOM_PORT = _setting("DICOM_PORT", 104)
+DICOM_AET = _setting("DICOM_AET", "ORTHANC")
+DICOM_AEC = _setting("DICOM_AEC", "SBDEMO")
+PRELIM_AEC = _setting("PRELIM_AEC", "NIGHTHAWK_SR")
+
+# Logs: one line per file in LOG_FILE, script output in the per-script logs
+LOG_FILE = _setting("LOG_FILE", "/opt/FileMonitor.log")
+LOG_ORU2PDF = _setting("LOG_ORU2PDF", os.path.join(FAX_DIR, "logs", "ORU2pdf.log"))
+LOG_PRELIMSR = _setting("LOG_PRELIMSR", os.path.join(PRELIM_DIR, "logs", "prelimSR.log"))
+LOG_HL7DCM = _setting("LOG_HL7DCM", os.path.join(MONITOR_DIR, "HL7toDICOM", "logs", "hl7_pdf_dcm.log"))
+
+# Scheduling
+QUEUE_DB = _setting("QUEUE_DB", os.path.join(MONITOR_DIR, "orchestrator", "queue.db"))
+# fax and hl7 go through the resident workers, which take one file at a time (worker_socket.serve): more than one
+# job per route would only queue inside the worker, against the client timeout
+ROUTE_CONCURRENCY = {"fax": 1, "prelim": 2, "hl7": 1, "hl7_dicom": 4, "prelim_dicom": 4}
+MAX_JOBS = _setting("MAX_JOBS", 8)
+MAX_ATTEMPTS = _setting("MAX_ATTEMPTS", 3)
+BACKFILL_MIN_AGE = _setting("BACKFILL_MIN_AGE", 10.0)  # seconds; younger files are still being written, and will
+                                                       # be reported by the watcher when they are done
+WATCH_MODE = _setting("WATCH_MODE", "auto")  # auto (inotifywait if installed), inotify, poll
+POLL_INTERVAL = _setting("POLL_INTERVAL", 1.0)
+
+SKIP_SUFFIXES = (".swp", ".tmp", ".swx", "~")
+PRIORITY_PRELIM, PRIORITY_LIVE, PRIORITY_BACKFILL = 0, 1, 2
+PRELIM_ROUTES = ("prelim", "prelim_dicom")
+
+log = logging.getLogger(__name__)
+
+
+def route_for(directory, name):
+    """Route of a file found in one of the folders, or None if it is to be left alone."""
+    if name.endswith(SKIP_SUFFIXES):
+        return None
+    if directory == MONITOR_DIR:
+        if name.startswith("FAX_") and name.endswith(".json"):
+            return "fax"
+        return "prelim" if name.startswith("PRELIM_") else "hl7"
+    if directory == HL7toDICOM_DIR:
+        return None if name.endswith("_uncompressed.dcm") else "hl7_dicom"
+    if directory == PRELIM_DICOM_DIR:
+        return None if name.endswith("_uncompressed.dcm") else "prelim_dicom"
+    # FAX_DIR and PRELIM_DIR are only rescanned, for reports moved there by a run that stopped before handling them
+    if directory == FAX_DIR and name.startswith("FAX_") and name.endswith(".json"):
+        return "fax"
+    if directory == PRELIM_DIR and name.startswith("PRELIM_"):
+        return "prelim"
+    return None
+
+
+class Job:
+    __slots__ = ("id", "route", "path", "priority", "queued_at")
+
+    def __init__(self, job_id, route, path, priority):
+        self.id = job_id
+        self.route = route
+        self.path = path
+        self.priority = priority
+        self.queued_at = time.monotonic()
+
+
+class JobJournal:
+    """Jobs accepted and not yet finished, in SQLite, so a restart runs them again."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                route TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                added REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )""")
+
+    def add(self, route, path, priority):
+        """Record a job; returns its id, or None if a job for this path is already recorded."""
+        cursor = self._db.execute("INSERT OR IGNORE INTO jobs (path, route, priority, added) VALUES (?, ?, ?, ?)",
+                                  (path, route, priority, time.time()))
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def started(self, job_id):
+        self._db.execute("UPDATE jobs SET attempts = attempts + 1 WHERE id = ?", (job_id,))
+
+    def moved(self, job_id, path):
+        self._db.execute("UPDATE jobs SET path = ? WHERE id = ?", (path, job_id))
+
+    def done(self, job_id):
+        self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def pending(self):
+        """(id, route, path, priority, attempts) of every recorded job, most urgent and oldest first."""
+        return self._db.execute(
+            "SELECT id, route, path, priority, attempts FROM jobs ORDER BY priority, added").fetchall()
+
+    def close(self):
+        self._db.close()
+
+
+class PriorityGate:
+    """At most `limit` holders at a time; when it is full, waiters get in by priority (lowest first), then FIFO."""
+
+    def __init__(self, limit):
+        self.free = limit
+        self._waiters = []
+        self._order = itertools.count()
+
+    async def acquire(self, priority):
+        if self.free > 0 and not self._waiters:
+            self.free -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # the slot was handed over just as we were cancelled
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.free += 1
+
+
+def log_main(message):
+    log.info(message)
+
+
+async def run(command, log_path):
+    """Run a command with its output appended to log_path; returns the exit code (127 if it couldn't start)."""
+    with open(log_path, "ab") as output:
+        try:
+            process = await asyncio.create_subprocess_exec(*command, stdin=asyncio.subprocess.DEVNULL,
+                                                           stdout=output, stderr=asyncio.subprocess.STDOUT)
+        except OSError as e:
+            output.write(f"{command[0]}: {e}\n".encode())
+            return 127
+        try:
+            return await process.wait()
+        except asyncio.CancelledError:
+            process.terminate()
+            raise
+
+
+async def run_script(script, path, log_path, socket_path=None):
+    """
+    Hand one file to a script's resident worker, or run the script on it when the worker can't be reached.
+    Returns True/False for ok/err, or None when the worker didn't answer in time and may still be handling the file.
+    """
+    if socket_path and os.path.exists(socket_path):
+        result = await asyncio.to_thread(worker_socket.submit, socket_path, path)
+        if result is worker_socket.NO_ANSWER:
+            return None
+        if result is not None:
+            return result
+        log_main(f"WARN worker on {socket_path} not reachable, running {os.path.basename(script)} directly: "
+                 f"{os.path.basename(path)}")
+    return await run([PYTHON, "-u", script, path], log_path) == 0
+
+
+async def ready(path):
+    """Seconds spent waiting for the file to be completely written (0 when its event can be trusted)."""
+    is_ready, waited = await asyncio.to_thread(wait_until_ready, path)
+    if not is_ready:
+        log_main(f"WARN file size not stable after {waited:.0f}s, proceeding: {os.path.basename(path)}")
+    return waited
+
+
+def move_into(path, directory):
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, os.path.basename(path))
+    shutil.move(path, target)
+    return target
+
+
+def outcome(ok, log_path):
+    if ok is None:
+        return f"unknown (worker still busy after {worker_socket.CLIENT_TIMEOUT}s, see {log_path})"
+    return "ok" if ok else f"err (see {log_path})"
+
+
+# Route handlers: handle the job's file and return (ok, DONE line for the main log); ok is None when the outcome is
+# unknown (the resident worker is still on it), which is neither retried nor counted as an error
+
+async def handle_fax(orchestrator, job):
+    name = os.path.basename(job.path)
+    if not os.access(job.path, os.R_OK):
+        return False, f"ERR FAX file not readable: {name}"
+    waited = await ready(job.path)
+    if os.path.dirname(job.path) != FAX_DIR:
+        orchestrator.moved(job, move_into(job.path, FAX_DIR))
+    log_main(f"RECV FAX {name} -> {FAX_DIR} | script ORU2pdf.py | wait {waited:.1f}s")
+    ok = await run_script(FAX_SCRIPT, job.path, LOG_ORU2PDF, FAX_WORKER_SOCKET)
+    return ok, f"DONE ORU2pdf.py {name} {outcome(ok, LOG_ORU2PDF)}"
+
+
+async def handle_prelim(orchestrator, job):
+    name = os.path.basename(job.path)
+    if not os.access(job.path, os.R_OK):
+        return False, f"ERR PRELIM file not readable: {name}"
+    waited = await ready(job.path)
+    if os.path.dirname(job.path) != PRELIM_DIR:
+        orchestrator.moved(job, move_into(job.path, PRELIM_DIR))
+    log_main(f"RECV PRELIM {name} -> {PRELIM_DIR} | script prelimSR.py | wait {waited:.1f}s")
+    ok = await run_script(PRELIM_SCRIPT, job.path, LOG_PRELIMSR)
+    return ok, f"DONE prelimSR.py {name} {outcome(ok, LOG_PRELIMSR)}"
+
+
+async def handle_hl7(orchestrator, job):
+    name = os.path.basename(job.path)
+    if not os.access(job.path, os.R_OK):
+        return False, f"ERR file not readable: {name}"
+    waited = await ready(job.path)
+    log_main(f"RECV HL7 {name} -> {HL7toDICOM_DIR} | script hl7_pdf_dcm.py | wait {waited:.1f}s")
+    ok = await run_script(HL7toDICOM_SCRIPT, job.path, LOG_HL7DCM, HL7_WORKER_SOCKET)
+    return ok, f"DONE hl7_pdf_dcm.py {name} {outcome(ok, LOG_HL7DCM)}"
+
+
+async def send_dicom(orchestrator, path, calling_aet, called_aet, decompress, log_path):
+    """
+    Send one file (decompressed first if asked), then file it under Processed/ or Failed/.
+    Returns ok, the error, and the seconds the C-STORE took (None when storescu sent it).
+    """
+    directory = os.path.dirname(path)
+    if orchestrator.senders is not None:
+        try:
+            seconds = await asyncio.to_thread(orchestrator.senders.send, path, calling_aet, called_aet, decompress)
+        except StoreError as e:
+            with open(log_path, "a", encoding="utf-8") as output:
+                output.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {calling_aet} -> {called_aet}: {e}\n")
+            move_into(path, os.path.join(directory, "Failed"))
+            return False, "send err", None
+        move_into(path, os.path.join(directory, "Processed"))
+        return True, None, seconds
+
+    sent_path = path
+    if decompress:
+        sent_path = f"{path[:-4] if path.endswith('.dcm') else path}_uncompressed.dcm"
+        if await run([DCMDJPEG, path, sent_path], log_path) != 0:
+            move_into(path, os.path.join(directory, "Failed"))
+            return False, "uncompress err", None
+    command = [STORESCU, "-v", "-aet", calling_aet, "-aec", called_aet, DICOM_HOST, str(DICOM_PORT), sent_path]
+    if await run(command, log_path) == 0:
+        if sent_path != path:
+            os.unlink(sent_path)
+        move_into(path, os.path.join(directory, "Processed"))
+        return True, None, None
+    move_into(sent_path, os.path.join(directory, "Failed"))  # as filemonitor.sh: the copy that failed to send
+    return False, "send err", None
+
+
+def store_time(seconds):
+    return "" if seconds is None else f" | store {seconds * 1000:.0f} ms"
+
+
+async def handle_hl7_dicom(orchestrator, job):
+    name = os.path.basename(job.path)
+    waited = await ready(job.path)
+    ok, error, seconds = await send_dicom(orchestrator, job.path, DICOM_AET, DICOM_AEC, HL7_DICOM_MODE == "img2dcm",
+                                          LOG_HL7DCM)
+    if ok:
+        return ok, f"DICOM HL7 {name} -> Processed/ | sent PACS ok{store_time(seconds)} | wait {waited:.1f}s"
+    return ok, f"DICOM HL7 {name} -> Failed/ | " + ("PACS send err" if error == "send err" else error)
+
+
+async def handle_prelim_dicom(orchestrator, job):
+    name = os.path.basename(job.path)
+    if "_" not in name:
+        move_into(job.path, os.path.join(PRELIM_DICOM_DIR, "Failed"))
+        return False, f"PRELIM DICOM {name} -> Failed/ | filename missing underscore"
+    aet = name.split("_", 1)[0]
+    waited = await ready(job.path)
+    ok, error, seconds = await send_dicom(orchestrator, job.path, aet, PRELIM_AEC, True, LOG_PRELIMSR)
+    if ok:
+        return ok, f"PRELIM DICOM {name} -> Processed/ | AET={aet} sent ok{store_time(seconds)} | wait {waited:.1f}s"
+    return ok, f"PRELIM DICOM {name} -> Failed/ | " + (f"AET={aet} send err" if error == "send err" else error)
+
+
+HANDLERS = {
+    "fax": handle_fax,
+    "prelim": handle_prelim,
+    "hl7": handle_hl7,
+    "hl7_dicom": handle_hl7_dicom,
+    "prelim_dicom": handle_prelim_dicom,
+}
+
+
+class Orchestrator:
+    """Route queues, their worker tasks and the journal behind them."""
+
+    def __init__(self, journal, concurrency=None, max_jobs=MAX_JOBS, senders=None):
+        self.journal = journal
+        self.senders = senders
+        self.concurrency = dict(ROUTE_CONCURRENCY, **(concurrency or {}))
+        self.gate = PriorityGate(max_jobs)
+        self.queues = {route: asyncio.PriorityQueue() for route in HANDLERS}
+        self.counts = {"ok": 0, "err": 0, "unknown": 0}
+        self._order = itertools.count()
+        self._paths = set()  # paths queued or running
+        self._tasks = []
+
+    def start(self):
+        for route, queue in self.queues.items():
+            for _ in range(self.concurrency[route]):
+                self._tasks.append(asyncio.create_task(self._worker(route, queue)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def join(self):
+        """Wait until every queue is empty and nothing is running."""
+        for queue in self.queues.values():
+            await queue.join()
+
+    def submit(self, route, path, priority=PRIORITY_LIVE):
+        """Queue a file; returns False if it is already queued or running."""
+        if path in self._paths:
+            return False
+        if route in PRELIM_ROUTES:
+            priority = PRIORITY_PRELIM
+        job_id = self.journal.add(route, path, priority)
+        if job_id is None:
+            return False  # recorded by a job of this run that is about to finish
+        self._queue(Job(job_id, route, path, priority))
+        return True
+
+    def on_file(self, directory, path):
+        route = route_for(directory, os.path.basename(path))
+        if route is not None:
+            self.submit(route, path)
+
+    def moved(self, job, path):
+        self._paths.discard(job.path)
+        self._paths.add(path)
+        job.path = path
+        self.journal.moved(job.id, path)
+
+    def recover(self):
+        """Queue the jobs a previous run left in the journal. Returns how many."""
+        count = 0
+        for job_id, route, path, priority, attempts in self.journal.pending():
+            if attempts >= MAX_ATTEMPTS:
+                log_main(f"GAVE UP {route} {os.path.basename(path)} after {attempts} attempts")
+                self.journal.done(job_id)
+            elif not os.path.exists(path):
+                self.journal.done(job_id)  # handled, or moved on by a run that stopped before recording it
+            else:
+                self._queue(Job(job_id, route, path, priority))
+                count += 1
+        return count
+
+    def rescan(self, min_age=BACKFILL_MIN_AGE, exclude=()):
+        """Queue, as backfill, the files waiting in the folders that nothing has queued. Returns their paths."""
+        queued = []
+        now = time.time()
+        for directory in (MONITOR_DIR, FAX_DIR, PRELIM_DIR, HL7toDICOM_DIR, PRELIM_DICOM_DIR):
+            try:
+                entries = [entry for entry in os.scandir(directory) if entry.is_file()]
+            except FileNotFoundError:
+                continue
+            for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+                route = route_for(directory, entry.name)
+                if route is None or entry.path in exclude or now - entry.stat().st_mtime < min_age:
+                    continue
+                if self.submit(route, entry.path, PRIORITY_BACKFILL):
+                    queued.append(entry.path)
+        return queued
+
+    def _queue(self, job):
+        self._paths.add(job.path)
+        self.queues[job.route].put_nowait((job.priority, next(self._order), job))
+
+    async def _worker(self, route, queue):
+        handler = HANDLERS[route]
+        while True:
+            _, _, job = await queue.get()
+            try:
+                await self.gate.acquire(job.priority)
+                started = time.monotonic()
+                try:
+                    self.journal.started(job.id)
+                    if os.path.exists(job.path):
+                        ok, line = await handler(self, job)
+                    else:
+                        ok, line = None, None  # gone already: handled by an earlier run or by hand
+                except asyncio.CancelledError:
+                    raise  # stays in the journal, to run again after a restart
+                except Exception as e:
+                    log.exception("ERR %s %s", route, os.path.basename(job.path))
+                    ok, line = False, f"ERR {route} {os.path.basename(job.path)}: {e}"
+                finally:
+                    self.gate.release()
+                self.journal.done(job.id)
+                self._paths.discard(job.path)
+                if line is not None:
+                    self.counts["unknown" if ok is None else "ok" if ok else "err"] += 1
+                    log_main(f"{line} | queued {started - job.queued_at:.1f}s, ran {time.monotonic() - started:.1f}s")
+            finally:
+                queue.task_done()
+
+
+async def watch_inotify(directory, on_file, watching):
+    """Report files closed after writing in, or moved into, `directory` (not its subfolders) until cancelled."""
+    process = await asyncio.create_subprocess_exec(
+        "inotifywait", "-m", "-e", "close_write", "-e", "moved_to", "--format", "%w%f", directory,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    try:
+        while b"Watches established" not in await process.stderr.readline():
+            if process.stderr.at_eof():
+                raise OSError(f"inotifywait could not watch {directory}")
+        watching.set()
+        async for line in process.stdout:
+            on_file(directory, line.decode("utf-8", errors="surrogateescape").rstrip("\n"))
+    finally:
+        if process.returncode is None:
+            process.terminate()
+            await process.wait()
+
+
+async def watch_poll(directory, on_file, watching, interval=POLL_INTERVAL):
+    """Report files in `directory` once their size and mtime are the same in two listings in a row."""
+    previous = {}
+    reported = {}
+    while True:
+        current = {}
+        try:
+            for entry in os.scandir(directory):
+                if entry.is_file():
+                    stat = entry.stat()
+                    current[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+        for path, signature in current.items():
+            if previous.get(path) == signature and reported.get(path) != signature:
+                reported[path] = signature
+                on_file(directory, path)
+        reported = {path: signature for path, signature in reported.items() if path in current}
+        previous = current
+        watching.set()
+        await asyncio.sleep(interval)
+
+
+async def start_workers():
+    """Start the resident hl7_pdf_dcm.py and ORU2pdf.py workers, as filemonitor.sh does; returns the processes."""
+    processes = []
+    for script, socket_path, log_path in ((HL7toDICOM_SCRIPT, HL7_WORKER_SOCKET, LOG_HL7DCM),
+                                          (FAX_SCRIPT, FAX_WORKER_SOCKET, LOG_ORU2PDF)):
+        os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+        with open(log_path, "ab") as output:
+            processes.append(await asyncio.create_subprocess_exec(
+                PYTHON, "-u", script, "--serve", socket_path, stdin=asyncio.subprocess.DEVNULL,
+                stdout=output, stderr=asyncio.subprocess.STDOUT))
+    return processes
+
+
+async def orchestrate(drain=False):
+    for directory in (MONITOR_DIR, FAX_DIR, PRELIM_DIR, HL7toDICOM_DIR, PRELIM_DICOM_DIR):
+        os.makedirs(directory, exist_ok=True)
+    for log_path in (LOG_ORU2PDF, LOG_PRELIMSR, LOG_HL7DCM):
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+
+    journal = JobJournal(QUEUE_DB)
+    senders = StoreClients(DICOM_HOST, DICOM_PORT) if DICOM_SENDER == "association" and HAVE_PYNETDICOM else None
+    orchestrator = Orchestrator(journal, senders=senders)
+    workers = await start_workers() if START_WORKERS and not drain else []
+    watchers = []
+    orchestrator.start()
+    try:
+        recovered = orchestrator.recover()
+        if drain:
+            found = orchestrator.rescan(min_age=0)
+            log_main(f"Draining: {recovered} jobs from the journal, {len(found)} files waiting")
+            seen = set(found)
+            while found or recovered:
+                await orchestrator.join()
+                # Files the finished jobs produced (HL7 -> DICOM, PRELIM -> SR); failures left in place run once
+                found = orchestrator.rescan(min_age=0, exclude=seen)
+                seen.update(found)
+                recovered = 0
+            log_main(f"Drained: {orchestrator.counts['ok']} ok, {orchestrator.counts['err']} err, "
+                     f"{orchestrator.counts['unknown']} unknown")
+            return
+
+        mode = WATCH_MODE
+        if mode == "auto":
+            mode = "inotify" if shutil.which("inotifywait") else "poll"
+        watch = watch_inotify if mode == "inotify" else watch_poll
+        for directory in (MONITOR_DIR, HL7toDICOM_DIR, PRELIM_DICOM_DIR):
+            watching = asyncio.Event()
+            watchers.append(asyncio.create_task(watch(directory, orchestrator.on_file, watching)))
+            await watching.wait()
+        # Anything that arrived before the watches were in place; files still being written at this point are
+        # reported by the watcher when closed, those closed just before are taken by the second rescan.
+        found = orchestrator.rescan()
+        asyncio.get_running_loop().call_later(BACKFILL_MIN_AGE, orchestrator.rescan)
+        log_main(f"Watching {MONITOR_DIR}, {HL7toDICOM_DIR}, {PRELIM_DICOM_DIR} ({mode}); "
+                 f"{recovered} jobs from the journal, {len(found)} files waiting")
+
+        stop = asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+        await asyncio.wait([asyncio.create_task(stop.wait()), *watchers], return_when=asyncio.FIRST_COMPLETED)
+        for task in watchers:
+            if task.done() and task.exception():
+                raise task.exception()
+        log_main("Stopping; unfinished jobs stay in the journal for the next start")
+    finally:
+        for task in watchers:
+            task.cancel()
+        await asyncio.gather(*watchers, return_exceptions=True)
+        await orchestrator.stop()
+        for process in workers:
+            if process.returncode is None:
+                process.terminate()
+                await process.wait()
+        if senders is not None:
+            senders.close()
+        journal.close()
+
+
+def main():
+    args = sys.argv[1:]
+    if args not in ([], ["--drain"]):
+        print("Usage: pipeline_orchestrator.py [--drain]", file=sys.stderr)
+        sys.exit(2)
+    logging.basicConfig(filename=LOG_FILE, level=logging.INFO, format="%(asctime)s %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    asyncio.run(orchestrate(drain=bool(args)))
+
+
+if __name__ == "__main__":
+    main()
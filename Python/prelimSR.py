@@ -4,36 +4,72 @@ Convert a JSON-formatted ORU report into a Basic Text SR-like DICOM object.
 
 Dependencies:
     pip install pydicom
+    pip install pynetdicom    (optional; without it StudyInstanceUID lookups fall back to DCMTK findscu)
 
 Usage:
     python json_oru_to_basic_text_sr.py input_oru.json
+    python prelimSR.py --batch [dir] [--workers N]    (every pending JSON in PRELIM_DIR; one C-FIND per accession)
 """
 
+import fcntl
+import io
 import json
 import logging
 import os
+import queue
 import re
 import shutil
 import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
 import pydicom
-from pydicom.dataset import Dataset, FileDataset
+from pydicom.charset import default_encoding
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.filebase import DicomBytesIO, DicomFileLike
+from pydicom.filereader import read_dataset
+from pydicom.filewriter import write_dataset, write_file_meta_info
 from pydicom.sequence import Sequence
 from pydicom.uid import ExplicitVRLittleEndian, generate_uid
 
+from dicom_query import HAVE_PYNETDICOM, FindClient, FindError, StudyUIDCache
+
 # ------------------------ DCMTK / PACS settings ------------------------ #
 
 FIND_SCU_AET = "REPORTGEN"
+FIND_SCU_AEC = "ANY-SCP"  # findscu's default called AE title
 FIND_SCU_PEER = "172.25.1.22"
 FIND_SCU_PORT = 5000
 
+# C-FIND timeouts (seconds): a hung PACS must not stall the monitor. findscu (used when pynetdicom is missing) gets
+# FIND_SCU_TIMEOUT for the whole run.
+FIND_CONNECT_TIMEOUT = 5
+FIND_RESPONSE_TIMEOUT = 15
+FIND_SCU_TIMEOUT = 30
+
+# StudyInstanceUIDs found on PACS, keyed by accession+facility, so addenda/re-sends skip the C-FIND
+STUDY_UID_CACHE_FILE = "/var/lib/filemonitor/PrelimSR/study_uid_cache.json"
+STUDY_UID_CACHE_SIZE = 5000
+STUDY_UID_CACHE_TTL = 24 * 3600
+
+# --batch: C-FINDs in flight at once (each on its own association; PACS limit associations per calling AE)
+FIND_BATCH_WORKERS = 4
+
 # You can keep Basic Text SR; your working file might be Comprehensive SR,
 # but most PACS will still accept this if the content tree looks similar.
 BASIC_TEXT_SR_SOP_CLASS_UID = "1.2.840.10008.5.1.4.1.1.88.11"
 
+PRELIM_DIR = "/var/lib/filemonitor/PrelimSR"
+
+# --batch skips files modified in the last BATCH_MIN_AGE seconds (still being written), and files the live path holds
+# (claim_report). It claims, looks up and builds BATCH_CHUNK reports at a time, holding one lock per report.
+BATCH_MIN_AGE = 10
+BATCH_CHUNK = 200
+BATCH_SKIP_PATTERNS = (".swp", ".tmp", ".swx", "~")
+
 # Isolated log file for this script
 PRELIM_LOG_DIR = "/var/lib/filemonitor/PrelimSR/logs"
 PRELIM_LOG_FILE = os.path.join(PRELIM_LOG_DIR, "prelimSR.log")
@@ -138,12 +174,33 @@ def split_person_name(name):
     return s
 
 
-# -------------------- findscu / SUID logic -------------------- #
+# -------------------- C-FIND / SUID logic -------------------- #
+
+_find_client = None
+_study_uid_cache = None
+
+
+def find_client():
+    """Shared C-FIND client (one association reused across queries), or None without pynetdicom."""
+    global _find_client
+    if _find_client is None and HAVE_PYNETDICOM:
+        _find_client = FindClient(FIND_SCU_PEER, FIND_SCU_PORT, FIND_SCU_AET, FIND_SCU_AEC,
+                                  connect_timeout=FIND_CONNECT_TIMEOUT, response_timeout=FIND_RESPONSE_TIMEOUT)
+    return _find_client
+
+
+def study_uid_cache():
+    global _study_uid_cache
+    if _study_uid_cache is None:
+        _study_uid_cache = StudyUIDCache(STUDY_UID_CACHE_SIZE, STUDY_UID_CACHE_TTL, STUDY_UID_CACHE_FILE)
+    return _study_uid_cache
 
-def query_study_uid(accession, facility):
+
+def query_study_uid(accession, facility, client=None):
     """
-    Use findscu to query PACS for StudyInstanceUID (0020,000D)
-    based on AccessionNumber (0008,0050) = <accession><facility>.
+    Query PACS for StudyInstanceUID (0020,000D) based on AccessionNumber (0008,0050) = <accession><facility>.
+    Answers come from the StudyInstanceUID cache when possible; otherwise a C-FIND goes out on `client` (default: the
+    shared client), or through findscu when pynetdicom isn't installed.
 
     Returns the UID string if found, else None.
     """
@@ -152,6 +209,35 @@ def query_study_uid(accession, facility):
         return None
 
     acc_with_facility = f"{accession}{facility}"
+    cache = study_uid_cache()
+    uid = cache.get(acc_with_facility)
+    if uid:
+        log.info("Found StudyInstanceUID in cache: %s", uid)
+        return uid
+
+    client = client or find_client()
+    if client is None:
+        uid = query_study_uid_findscu(acc_with_facility)
+    else:
+        log.info("C-FIND AccessionNumber=%s on %s@%s:%s", acc_with_facility, FIND_SCU_AEC, FIND_SCU_PEER, FIND_SCU_PORT)
+        try:
+            uid = client.find_study_uid(acc_with_facility)
+        except FindError as e:
+            # PACS unreachable/timed out: proceed without SUID (non-fatal)
+            log.info("C-FIND failed (%s); proceeding without StudyInstanceUID.", e)
+            return None
+        if uid:
+            log.info("Found StudyInstanceUID via C-FIND: %s", uid)
+
+    if uid:
+        cache.put(acc_with_facility, uid)
+    else:
+        log.warning("No StudyInstanceUID found on PACS for %s.", acc_with_facility)
+    return uid
+
+
+def query_study_uid_findscu(acc_with_facility):
+    """Fallback without pynetdicom: fork DCMTK findscu and scan its verbose output."""
     cmd = [
         "findscu",
         "-v",
@@ -160,6 +246,10 @@ def query_study_uid(accession, facility):
         "-k", f"0008,0050={acc_with_facility}",
         "-k", "0020,000D",
         "-aet", FIND_SCU_AET,
+        "-aec", FIND_SCU_AEC,
+        "-to", str(FIND_CONNECT_TIMEOUT),
+        "-ta", str(FIND_CONNECT_TIMEOUT),
+        "-td", str(FIND_RESPONSE_TIMEOUT),
         FIND_SCU_PEER,
         str(FIND_SCU_PORT),
     ]
@@ -176,7 +266,11 @@ def query_study_uid(accession, facility):
             stderr=subprocess.STDOUT,
             text=True,
             check=False,
+            timeout=FIND_SCU_TIMEOUT,
         )
+    except subprocess.TimeoutExpired:
+        log.info("findscu did not finish within %ss; proceeding without StudyInstanceUID.", FIND_SCU_TIMEOUT)
+        return None
     except Exception as e:
         log.warning("findscu failed to run: %s", e)
         return None
@@ -198,36 +292,162 @@ def query_study_uid(accession, facility):
                 log.info("Found StudyInstanceUID via findscu: %s", uid)
                 return uid
 
-    log.warning("No StudyInstanceUID found in findscu output.")
     return None
 
 
 # -------------------- main SR builder -------------------- #
 
-def create_basic_text_sr_from_json(json_data, output_path):
-    """Build and save an SR DICOM file from parsed JSON ORU data."""
+# (0002,0012) names the software that wrote the file, so it is the same for every SR: derived from a fixed name instead
+# of a new random UID per file
+IMPLEMENTATION_CLASS_UID = generate_uid(entropy_srcs=["RadInformatix prelimSR"])
+
+# Report sections that get their own CONTAINER in the content tree: (heading labels as radiologists type them,
+# CONTAINER concept from CID 7001 "Diagnostic Imaging Report Headings", TEXT concept from CID 7002 "... Elements").
+# Any other "Word:" line (e.g. "Liver:" under FINDINGS) stays part of the section it is in.
+REPORT_SECTIONS = (
+    (("CLINICAL STATEMENT", "CLINICAL HISTORY", "CLINICAL INDICATION", "HISTORY", "INDICATION", "INDICATIONS",
+      "REASON FOR EXAM", "REASON FOR EXAMINATION", "REASON FOR STUDY"), ("121060", "History"), ("121060", "History")),
+    (("EXAM", "EXAMINATION", "PROCEDURE", "TECHNIQUE"),
+     ("121064", "Current Procedure Descriptions"), ("121065", "Procedure Description")),
+    (("COMPARISON", "COMPARISONS", "PRIOR STUDIES"),
+     ("121066", "Prior Procedure Descriptions"), ("121065", "Procedure Description")),
+    (("FINDINGS", "FINDING"), ("121070", "Findings"), ("121071", "Finding")),
+    (("IMPRESSION", "IMPRESSIONS"), ("121072", "Impressions"), ("121073", "Impression")),
+    (("CONCLUSION", "CONCLUSIONS"), ("121076", "Conclusions"), ("121077", "Conclusion")),
+    (("RECOMMENDATION", "RECOMMENDATIONS"), ("121074", "Recommendations"), ("121075", "Recommendation")),
+)
+# Text outside any section (before the first heading, the "signed by" line) goes in a TEXT item of this concept
+REPORT_COMMENT = ("121106", "Comment")
+
+_SECTION_BY_LABEL = {label: container[1] for labels, container, _ in REPORT_SECTIONS for label in labels}
+_SECTION_BOUNDARY = re.compile(
+    r"^[ \t]*(?:(?P<heading>"
+    + "|".join(label.replace(" ", r"[ \t]+") for label in sorted(_SECTION_BY_LABEL, key=len, reverse=True))
+    + r")[ \t]*:[ \t]*|(?P<signed>(?:exam[ \t]+was[ \t]+|electronically[ \t]+)?signed[ \t]+by\b))",
+    re.IGNORECASE | re.MULTILINE,
+)
 
-    # ---------------------------------------------------------
-    # File Meta
-    # ---------------------------------------------------------
-    file_meta = Dataset()
+
+def split_report_sections(report_text):
+    """
+    Split report text at its section headings in one pass. Returns [(heading, text), ...] in report order, heading
+    being the CONTAINER meaning from REPORT_SECTIONS ("Findings", "Impressions", ...) or None for text outside any
+    section. Empty sections are dropped. Returns [] when the report has no recognised heading.
+    """
+    sections = []
+    heading, start = None, 0
+    for m in _SECTION_BOUNDARY.finditer(report_text):
+        text = report_text[start:m.start()].strip()
+        if text:
+            sections.append((heading, text))
+        if m.group("heading") is not None:
+            heading, start = _SECTION_BY_LABEL[" ".join(m.group("heading").upper().split())], m.end()
+        else:
+            heading, start = None, m.start()  # the signature line is kept as text
+    if not any(h for h, _ in sections) and heading is None:
+        return []
+    text = report_text[start:].strip()
+    if text:
+        sections.append((heading, text))
+    return sections
+
+
+def _code(value, scheme, meaning):
+    item = Dataset()
+    item.CodeValue = value
+    item.CodingSchemeDesignator = scheme
+    item.CodeMeaning = meaning
+    return item
+
+
+def _freeze(template, cls=Dataset):
+    """
+    `template` encoded once as Explicit VR Little Endian and read back. Its elements stay undecoded (immutable
+    RawDataElements), and pydicom writes those bytes out verbatim instead of re-encoding every element per report.
+    """
+    buffer = DicomBytesIO()
+    buffer.is_little_endian = True
+    buffer.is_implicit_VR = False
+    write_dataset(buffer, template)
+    frozen = read_dataset(io.BytesIO(buffer.getvalue()), is_implicit_VR=False, is_little_endian=True)
+    return cls(dict(frozen.items()))
+
+
+def _build_sr_templates():
+    """
+    Everything in the SR that doesn't depend on the report, built and encoded once at import: (file meta, top-level
+    dataset, {section heading: (CONTAINER item, TEXT item)}, Comment TEXT item).
+    """
+    file_meta = FileMetaDataset()
     file_meta.MediaStorageSOPClassUID = BASIC_TEXT_SR_SOP_CLASS_UID
-    sop_instance_uid = generate_uid()
-    file_meta.MediaStorageSOPInstanceUID = sop_instance_uid
     file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
-    file_meta.ImplementationClassUID = generate_uid()
+    file_meta.ImplementationClassUID = IMPLEMENTATION_CLASS_UID
 
-    # ---------------------------------------------------------
-    # Top-level DICOM dataset
-    # ---------------------------------------------------------
-    ds = FileDataset(
-        output_path,
-        {},
-        file_meta=file_meta,
-        preamble=b"\0" * 128,
-    )
-    ds.is_little_endian = True
-    ds.is_implicit_VR = False
+    ds = Dataset()
+    ds.Modality = "SR"
+    ds.SeriesNumber = "1"
+    ds.InstanceNumber = "1"
+    ds.SeriesDescription = "Preliminary Report"
+    ds.Manufacturer = "RadInformatix"
+
+    # SR Document General
+    ds.SOPClassUID = BASIC_TEXT_SR_SOP_CLASS_UID
+    ds.CompletionFlag = "COMPLETE"
+    ds.VerificationFlag = "UNVERIFIED"  # can change to VERIFIED later if needed
+
+    # Top-level doc concept – match working SR (“Radiology Report”)
+    ds.ConceptNameCodeSequence = Sequence([_code("11528-7", "LN", "Radiology Report")])
+
+    # Make the SR document root explicit (matches your manual dcmtk edits)
+    ds.ValueType = "CONTAINER"
+    ds.ContinuityOfContent = "SEPARATE"
+
+    # ReferencedPerformedProcedureStepSequence (type 2, empty allowed)
+    ds.ReferencedPerformedProcedureStepSequence = Sequence([])
+
+    # Content tree – mimic working SR pattern: one CONTAINER per report section holding a single TEXT
+    sections = {}
+    for _, (container_code, container_meaning), (text_code, text_meaning) in REPORT_SECTIONS:
+        container = Dataset()
+        container.RelationshipType = "CONTAINS"
+        container.ValueType = "CONTAINER"
+        container.ConceptNameCodeSequence = Sequence([_code(container_code, "DCM", container_meaning)])
+        container.ContinuityOfContent = "SEPARATE"
+        sections[container_meaning] = (_freeze(container), _freeze(_text_item(text_code, text_meaning)))
+
+    comment = _text_item(*REPORT_COMMENT)
+
+    return _freeze(file_meta, FileMetaDataset), _freeze(ds), sections, _freeze(comment)
+
+
+def _text_item(code, meaning):
+    item = Dataset()
+    item.RelationshipType = "CONTAINS"
+    item.ValueType = "TEXT"
+    item.ConceptNameCodeSequence = Sequence([_code(code, "DCM", meaning)])
+    return item
+
+
+_SR_FILE_META, _SR_TEMPLATE, _SECTION_TEMPLATES, _COMMENT_TEMPLATE = _build_sr_templates()
+
+
+def _from_template(template, cls=Dataset):
+    """
+    New dataset starting out with the template's elements. They are immutable, so setting an attribute replaces the
+    element in the new dataset only. Marked as already Explicit VR Little Endian so writing keeps them undecoded.
+    """
+    ds = cls(dict(template.items()))
+    ds.set_original_encoding(False, True, default_encoding)
+    return ds
+
+
+def build_basic_text_sr(json_data):
+    """SR dataset (file meta included) for parsed JSON ORU data: the template plus this report's attributes."""
+    sop_instance_uid = generate_uid()
+    ds = _from_template(_SR_TEMPLATE)
+    ds.file_meta = _from_template(_SR_FILE_META, FileMetaDataset)
+    ds.file_meta.MediaStorageSOPInstanceUID = sop_instance_uid
+    ds.SOPInstanceUID = sop_instance_uid
 
     # Instance creation
     now = datetime.now()
@@ -308,125 +528,115 @@ def create_basic_text_sr_from_json(json_data, output_path):
     ds.SeriesInstanceUID = generate_uid()
     ds.StudyID = str(json_data.get("Accession", ""))
     ds.AccessionNumber = str(json_data.get("Accession", ""))
-    ds.Modality = "SR"
-    ds.SeriesNumber = "1"
-    ds.InstanceNumber = "1"
     ds.StudyDescription = str(json_data.get("ExamType", ""))
-    ds.SeriesDescription = "Preliminary Report"
 
     # ---------------------------------------------------------
-    # General Equipment / Institution
+    # Institution / Physicians
     # ---------------------------------------------------------
     ds.InstitutionName = str(json_data.get("Facility", ""))
-    ds.Manufacturer = "RadInformatix"
-
-    # ---------------------------------------------------------
-    # Physicians
-    # ---------------------------------------------------------
     ds.ReferringPhysicianName = split_person_name(json_data.get("Ordering", ""))
     ds.NameOfPhysiciansReadingStudy = split_person_name(json_data.get("Radiologist", ""))
 
-    # ---------------------------------------------------------
-    # SR Document General
-    # ---------------------------------------------------------
-    ds.SOPClassUID = BASIC_TEXT_SR_SOP_CLASS_UID
-    ds.SOPInstanceUID = sop_instance_uid
-    ds.CompletionFlag = "COMPLETE"
-    ds.VerificationFlag = "UNVERIFIED"  # can change to VERIFIED later if needed
-
-    # Top-level doc concept – match working SR (“Radiology Report”)
-    doc_title = Dataset()
-    doc_title.CodeValue = "11528-7"
-    doc_title.CodingSchemeDesignator = "LN"
-    doc_title.CodeMeaning = "Radiology Report"
-    ds.ConceptNameCodeSequence = Sequence([doc_title])
-
-    # Make the SR document root explicit (matches your manual dcmtk edits)
-    ds.ValueType = "CONTAINER"
-    ds.ContinuityOfContent = "SEPARATE"
-
     # PerformedProcedureCodeSequence (type 2)
-    ppcs_item = Dataset()
-    ppcs_item.CodeValue = "P0"
-    ppcs_item.CodingSchemeDesignator = "99LOCAL"
-    ppcs_item.CodeMeaning = str(json_data.get("ExamType", "Imaging procedure"))
-    ds.PerformedProcedureCodeSequence = Sequence([ppcs_item])
-
-    # ReferencedPerformedProcedureStepSequence (type 2, empty allowed)
-    ds.ReferencedPerformedProcedureStepSequence = Sequence([])
+    ds.PerformedProcedureCodeSequence = Sequence([
+        _code("P0", "99LOCAL", str(json_data.get("ExamType", "Imaging procedure")))
+    ])
 
     # ---------------------------------------------------------
-    # SR Content Tree – mimic working SR pattern
+    # SR Content Tree: a CONTAINER + TEXT per report section (FINDINGS, IMPRESSION, ...), or the whole report in
+    # a single Finding when it has no recognisable headings
     # ---------------------------------------------------------
     report_text = str(json_data.get("Report", ""))
+    sections = split_report_sections(report_text) or [("Findings", report_text)]
 
-    # Root item: Findings CONTAINER
-    root = Dataset()
-    root.RelationshipType = "CONTAINS"
-    root.ValueType = "CONTAINER"
+    items = []
+    for heading, text in sections:
+        if heading is None:
+            item = _from_template(_COMMENT_TEMPLATE)
+            item.TextValue = text
+        else:
+            container_template, text_template = _SECTION_TEMPLATES[heading]
+            text_item = _from_template(text_template)
+            text_item.TextValue = text
+            item = _from_template(container_template)
+            item.ContentSequence = Sequence([text_item])
+        items.append(item)
+    ds.ContentSequence = Sequence(items)
 
-    findings_code = Dataset()
-    findings_code.CodeValue = "121070"
-    findings_code.CodingSchemeDesignator = "DCM"
-    findings_code.CodeMeaning = "Findings"
-    root.ConceptNameCodeSequence = Sequence([findings_code])
+    return ds
 
-    root.ContinuityOfContent = "SEPARATE"
 
-    # Child TEXT item: single Finding
-    text_item = Dataset()
-    text_item.RelationshipType = "CONTAINS"
-    text_item.ValueType = "TEXT"
+def write_basic_text_sr(json_data, fp):
+    """Build the SR for `json_data` and write it as a DICOM file (preamble, file meta, dataset) to binary file `fp`."""
+    ds = build_basic_text_sr(json_data)
+    out = DicomFileLike(fp)
+    out.write(b"\0" * 128 + b"DICM")
+    write_file_meta_info(out, ds.file_meta, enforce_standard=True)
+    out.is_little_endian = True
+    out.is_implicit_VR = False
+    write_dataset(out, ds)
 
-    finding_code = Dataset()
-    finding_code.CodeValue = "121071"
-    finding_code.CodingSchemeDesignator = "DCM"
-    finding_code.CodeMeaning = "Finding"
-    text_item.ConceptNameCodeSequence = Sequence([finding_code])
 
-    text_item.TextValue = report_text
+def basic_text_sr_bytes(json_data):
+    """The SR for `json_data` as the bytes of a DICOM file."""
+    buffer = io.BytesIO()
+    write_basic_text_sr(json_data, buffer)
+    return buffer.getvalue()
 
-    # Attach child to root
-    root.ContentSequence = Sequence([text_item])
 
-    # Attach root as dataset ContentSequence[0]
-    ds.ContentSequence = Sequence([root])
+def create_basic_text_sr_from_json(json_data, output_path):
+    """Build and save an SR DICOM file from parsed JSON ORU data."""
+    with open(output_path, "wb") as f:
+        write_basic_text_sr(json_data, f)
 
-    log.debug("Root item: %s %s", ds.ContentSequence[0].RelationshipType, ds.ContentSequence[0].ValueType)
 
-    # ---------------------------------------------------------
-    # Save SR
-    # ---------------------------------------------------------
-    ds.save_as(output_path, write_like_original=False)
+# --------------------------- CLI --------------------------- #
 
+def claim_report(input_path):
+    """
+    Take an exclusive, non-blocking lock on the PRELIM JSON so a live run and --batch never build and send an SR for
+    the same report twice (filemonitor.sh keeps the file's mtime when it moves it here, so BATCH_MIN_AGE alone can't
+    tell). Returns the locked file descriptor, or None if another process holds the lock or the file has already been
+    moved away. Hold it until the JSON has been filed.
+    """
+    try:
+        fd = os.open(input_path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        # The previous holder may have finished and moved the file between our open() and flock()
+        if os.fstat(fd).st_ino != os.stat(input_path).st_ino:
+            raise OSError("file was replaced")
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
 
-# --------------------------- CLI --------------------------- #
 
-def main():
-    if len(sys.argv) != 2:
-        log.error("Usage: prelimSR.py input_oru.json")
-        sys.exit(1)
+def load_report(input_path):
+    """Read a PRELIM JSON; returns the parsed dict, or None (logged) if it is unreadable or lacks Accession/Facility."""
+    try:
+        with input_path.open("r", encoding="utf-8") as f:
+            json_data = json.load(f)
+    except (OSError, ValueError) as e:
+        log.error("Could not read JSON %s: %s", input_path, e)
+        return None
 
-    input_path = Path(sys.argv[1])
-    if not input_path.exists():
-        log.error("Input file not found: %s", input_path)
-        sys.exit(1)
+    if not json_data.get("Accession"):
+        log.error("JSON does not contain 'Accession' key.")
+        return None
+    if not json_data.get("Facility"):
+        log.error("JSON does not contain 'Facility' key.")
+        return None
+    return json_data
 
-    log.info("Processing: %s", input_path.name)
-    with input_path.open("r", encoding="utf-8") as f:
-        json_data = json.load(f)
 
+def process_report(input_path, json_data, suid_from_pacs):
+    """Record the PACS StudyInstanceUID in the JSON, build the SR, and file the SR and JSON under PRELIM_DIR."""
     accession = json_data.get("Accession")
     facility = json_data.get("Facility")
-    if not accession:
-        log.error("JSON does not contain 'Accession' key.")
-        sys.exit(1)
-    if not facility:
-        log.error("JSON does not contain 'Facility' key.")
-        sys.exit(1)
 
-    # ------------- NEW: query PACS for StudyInstanceUID and update SUID -------------
-    suid_from_pacs = query_study_uid(accession, facility)
     if suid_from_pacs:
         existing_suid = str(json_data.get("SUID", "") or "")
         if existing_suid:
@@ -451,7 +661,7 @@ def main():
     create_basic_text_sr_from_json(json_data, str(output_path))
 
     # ---------- move files into DICOM/ and JSON/ under script directory ----------
-    prelim_dir = Path("/var/lib/filemonitor/PrelimSR")
+    prelim_dir = Path(PRELIM_DIR)
     dicom_dir = prelim_dir / "DICOM"
     json_dir = prelim_dir / "JSON"
     prelim_dir.mkdir(exist_ok=True)
@@ -482,5 +692,150 @@ def main():
         log.info("Completed. SR: %s, JSON: %s", sr_dest, json_dest)
 
 
+def pending_reports(directory, min_age=BATCH_MIN_AGE):
+    """PRELIM JSON files waiting directly under `directory`, skipping ones that may still be being written."""
+    now = time.time()
+    paths = []
+    for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+        if not entry.is_file() or not entry.name.startswith("PRELIM_") or entry.name.endswith(BATCH_SKIP_PATTERNS):
+            continue  # filemonitor.sh routes PRELIM_* here; the UID cache and stray SRs live alongside
+        if now - entry.stat().st_mtime < min_age:
+            continue
+        paths.append(Path(entry.path))
+    return paths
+
+
+def resolve_study_uids(pairs, workers=FIND_BATCH_WORKERS):
+    """
+    Look up the StudyInstanceUID of each (accession, facility) pair with at most `workers` C-FINDs in flight, each on
+    its own kept-open association. Returns {pair: uid or None}.
+    """
+    clients = queue.SimpleQueue()
+    opened = []
+    for _ in range(workers):
+        client = None
+        if HAVE_PYNETDICOM:
+            client = FindClient(FIND_SCU_PEER, FIND_SCU_PORT, FIND_SCU_AET, FIND_SCU_AEC,
+                                connect_timeout=FIND_CONNECT_TIMEOUT, response_timeout=FIND_RESPONSE_TIMEOUT)
+            opened.append(client)
+        clients.put(client)
+
+    def resolve(pair):
+        client = clients.get()
+        try:
+            return pair, query_study_uid(*pair, client=client)
+        finally:
+            clients.put(client)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(pool.map(resolve, pairs))
+    finally:
+        for client in opened:
+            client.close()
+
+
+def run_batch(directory=PRELIM_DIR, workers=FIND_BATCH_WORKERS):
+    """
+    Build SRs for every pending PRELIM JSON under `directory` (e.g. when replaying a day of prelims). Reports are
+    claimed BATCH_CHUNK at a time (ones a live run holds, or has already filed, are skipped); each chunk's
+    accession+facility pairs are deduplicated and resolved, `workers` C-FINDs at a time, then its SRs are built.
+    Prints and logs a summary of queries issued versus files processed. Returns True if no file failed.
+    """
+    start = time.perf_counter()
+    paths = pending_reports(directory)
+    log.info("Batch started: %d file(s) in %s, %d concurrent C-FIND(s)", len(paths), directory, workers)
+    print(f"Batch: {len(paths)} file(s) in {directory}, {workers} concurrent C-FIND(s)")
+
+    cache = study_uid_cache()
+    hits_before = cache.hits
+    ok = errors = skipped = 0
+    all_pairs = set()
+    found_pairs = set()
+    looked_up = 0
+    lookup_seconds = 0.0
+    for first in range(0, len(paths), BATCH_CHUNK):
+        reports = []
+        try:
+            for path in paths[first:first + BATCH_CHUNK]:
+                lock_fd = claim_report(path)
+                if lock_fd is None:
+                    log.info("Skipping %s: being processed or already filed by another run", path.name)
+                    skipped += 1
+                    continue
+                json_data = load_report(path)
+                if json_data is None:
+                    os.close(lock_fd)
+                    errors += 1
+                else:
+                    reports.append((path, json_data, (json_data["Accession"], json_data["Facility"]), lock_fd))
+
+            lookup_start = time.perf_counter()
+            pairs = list(dict.fromkeys(pair for _, _, pair, _ in reports))
+            uids = resolve_study_uids(pairs, workers) if pairs else {}
+            lookup_seconds += time.perf_counter() - lookup_start
+            all_pairs.update(pairs)
+            found_pairs.update(pair for pair, uid in uids.items() if uid)
+            looked_up += len(pairs)
+
+            for path, json_data, pair, _ in reports:
+                log.info("Processing: %s", path.name)
+                try:
+                    process_report(path, json_data, uids.get(pair))
+                    ok += 1
+                except Exception as e:
+                    log.error("Failed to build SR for %s: %s", path.name, e)
+                    errors += 1
+        finally:
+            for *_, lock_fd in reports:
+                os.close(lock_fd)
+    cached = cache.hits - hits_before
+    cache.save()
+    wall = time.perf_counter() - start
+
+    lines = [
+        f"Batch finished in {wall:.1f} s: {ok} ok, {errors} err, {skipped} skipped out of {len(paths)} file(s)",
+        f"  {len(all_pairs)} distinct accession(s): {looked_up - cached} C-FIND(s) issued, {cached} from cache, "
+        f"{len(found_pairs)} StudyInstanceUID(s) found ({lookup_seconds:.1f} s)",
+    ]
+    for line in lines:
+        print(line)
+        log.info(line)
+    return errors == 0
+
+
+def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == "--batch":
+        directory = sys.argv[2] if len(sys.argv) > 2 and not sys.argv[2].startswith("--") else PRELIM_DIR
+        workers = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else FIND_BATCH_WORKERS
+        sys.exit(0 if run_batch(directory, workers) else 1)
+
+    if len(sys.argv) != 2:
+        log.error("Usage: prelimSR.py input_oru.json | --batch [dir] [--workers N]")
+        sys.exit(1)
+
+    input_path = Path(sys.argv[1])
+    if not input_path.exists():
+        log.error("Input file not found: %s", input_path)
+        sys.exit(1)
+
+    log.info("Processing: %s", input_path.name)
+    lock_fd = claim_report(input_path)
+    if lock_fd is None:
+        log.info("Skipping %s: being processed or already filed by another run", input_path.name)
+        return
+    json_data = load_report(input_path)
+    if json_data is None:
+        sys.exit(1)
+
+    # ------------- NEW: query PACS for StudyInstanceUID and update SUID -------------
+    suid_from_pacs = query_study_uid(json_data["Accession"], json_data["Facility"])
+    study_uid_cache().save()
+    if _find_client is not None:
+        _find_client.close()
+
+    process_report(input_path, json_data, suid_from_pacs)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,40 +1,172 @@
+# Removes rows whose BEGIN_EXAM_DTTM is on or after a threshold date from pipe-delimited ORU extracts (.pipe files),
+# rewriting each file without them, and logs the accession numbers of the removed rows.
+# Updated: each file is filtered in one streaming pass into a temp file next to it, which then replaces the original
+# (a crash mid-run leaves every file either untouched or fully filtered). Dates are parsed once per distinct string,
+# rows without quoting are copied through without being re-encoded, and files are filtered by parallel worker
+# processes whose removed-accession sets are merged at the end. Output is the same as the csv.DictReader/DictWriter
+# version (CRLF line endings included). Runs from the command line:
+#     python removeORUbydate.py [file_directory [log_file [MM/DD/YYYY]]] [--workers N]
+
 import csv
 import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import chain
+
+DATE_FORMAT = '%m/%d/%Y'
+READ_BUFFER = 1 << 20  # bytes read from a .pipe file at a time
+
+
+def recent_exam_test(date_threshold):
+    """
+    is_recent(begin_exam_dttm): whether that date is on or after date_threshold. Each distinct string is parsed with
+    strptime once (an extract has a few thousand distinct dates across millions of rows); an unparsable date raises
+    ValueError as before.
+    """
+    seen = {}
+
+    def is_recent(value):
+        recent = seen.get(value)
+        if recent is None:
+            recent = seen[value] = datetime.strptime(value, DATE_FORMAT) >= date_threshold
+        return recent
+
+    return is_recent
+
+
+def filter_file(file_path, date_threshold):
+    """
+    Rewrite one .pipe file without its rows dated on/after date_threshold. Returns (file_path, rows kept, rows
+    removed, accession numbers of the removed rows). The file is replaced atomically; on error it is left untouched.
+    """
+    is_recent = recent_exam_test(date_threshold)
+    accession_nums = set()
+    kept = removed = 0
+
+    directory, name = os.path.split(file_path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory or ".")
+    try:
+        with open(file_path, 'r', buffering=READ_BUFFER) as f, \
+                os.fdopen(fd, 'w', newline='', buffering=READ_BUFFER) as out:
+            header = next(csv.reader(f, delimiter='|'), None)
+            if header is None:
+                os.unlink(tmp_path)
+                return file_path, 0, 0, accession_nums
+            dict_writer = csv.DictWriter(out, fieldnames=header, delimiter='|')
+            dict_writer.writeheader()
 
-def process_files(file_list, log_file, date_threshold):
+            positions = {}  # DictReader semantics: a repeated column keeps its last value
+            for i, column in enumerate(header):
+                positions[column] = i
+            date_col = positions.get('BEGIN_EXAM_DTTM')
+            accn_col = positions.get('ACCESSION_NUM')
+            width = len(header)
+            # a plain '|'-joined line is exactly what DictWriter would write back, unless a column name repeats or
+            # the file has one column (DictWriter writes a lone empty field as "")
+            passthrough = len(positions) == width and width > 1
+
+            while True:
+                lines = f.readlines(READ_BUFFER)
+                if not lines:
+                    break
+                block = iter(lines)
+                for line in block:
+                    if passthrough and '"' not in line:
+                        if line == '\n':
+                            continue  # DictReader skips blank lines
+                        row = line.rstrip('\n').split('|')
+                        if len(row) == width:
+                            begin_exam_dttm = row[date_col] if date_col is not None else None
+                            if begin_exam_dttm and is_recent(begin_exam_dttm):
+                                removed += 1
+                                accession_num = row[accn_col] if accn_col is not None else None
+                                if accession_num:
+                                    accession_nums.add(accession_num)
+                            else:
+                                out.write(line.rstrip('\n') + '\r\n')
+                                kept += 1
+                            continue
+                    else:
+                        row = next(csv.reader(chain([line], block, f), delimiter='|'))
+                        if not row:
+                            continue
+
+                    # the DictReader/DictWriter path: quoted fields, short or long rows, repeated columns
+                    d = dict(zip(header, row))
+                    if len(row) > width:
+                        d[None] = row[width:]
+                    else:
+                        for column in header[len(row):]:
+                            d[column] = None
+                    begin_exam_dttm = d.get('BEGIN_EXAM_DTTM')
+                    if begin_exam_dttm and is_recent(begin_exam_dttm):
+                        removed += 1
+                        accession_num = d.get('ACCESSION_NUM')
+                        if accession_num:
+                            accession_nums.add(accession_num)
+                    else:
+                        dict_writer.writerow(d)
+                        kept += 1
+
+            out.flush()
+            os.fsync(out.fileno())
+        os.chmod(tmp_path, os.stat(file_path).st_mode & 0o7777)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return file_path, kept, removed, accession_nums
+
+
+def process_files(file_list, log_file, date_threshold, workers=None):
+    """
+    Filter every file (with `workers` processes, default one per CPU) and write the merged set of removed accession
+    numbers to log_file, one per line, sorted. Returns (rows kept, rows removed).
+    """
+    workers = min(workers or os.cpu_count() or 1, len(file_list))
     accession_nums_to_remove = set()
-    
-    for file_path in file_list:
-        entries_to_keep = []
-        with open(file_path, 'r') as f:
-            reader = csv.DictReader(f, delimiter='|')
-            for row in reader:
-                begin_exam_dttm = row.get('BEGIN_EXAM_DTTM')
-                accession_num = row.get('ACCESSION_NUM')
-                
-                # Parse the date and check if it's newer than the threshold
-                if begin_exam_dttm and datetime.strptime(begin_exam_dttm, '%m/%d/%Y') >= date_threshold:
-                    if accession_num:
-                        accession_nums_to_remove.add(accession_num)
-                else:
-                    entries_to_keep.append(row)
-
-        # Rewrite the file without the removed entries
-        with open(file_path, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=reader.fieldnames, delimiter='|')
-            writer.writeheader()
-            writer.writerows(entries_to_keep)
+    total_kept = total_removed = 0
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(filter_file, file_list, [date_threshold] * len(file_list)))
+    else:
+        results = [filter_file(file_path, date_threshold) for file_path in file_list]
+
+    for file_path, kept, removed, accession_nums in results:
+        print(f"{file_path}: kept {kept}, removed {removed}")
+        accession_nums_to_remove |= accession_nums
+        total_kept += kept
+        total_removed += removed
 
     # Log the removed accession numbers
     with open(log_file, 'w') as log:
-        for accession_num in accession_nums_to_remove:
+        for accession_num in sorted(accession_nums_to_remove):
             log.write(f"{accession_num}\n")
+    return total_kept, total_removed
 
-# Example usage
+
+# Example usage (defaults when run without arguments)
 file_directory = 'data_files'  # Replace with the directory containing your files
-file_list = [os.path.join(file_directory, filename) for filename in os.listdir(file_directory) if filename.endswith('.pipe')]
 log_file = 'FAC_NT10012024_ORU_PRIORS.txt'
-date_threshold = datetime.strptime('10/1/2024', '%m/%d/%Y')
+date_threshold = datetime.strptime('10/1/2024', DATE_FORMAT)
+
+if __name__ == "__main__":
+    workers = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else None
+    args = [a for i, a in enumerate(sys.argv[1:], 1) if not a.startswith("--") and sys.argv[i - 1] != "--workers"]
+    if len(args) > 3:
+        print("Usage: removeORUbydate.py [file_directory [log_file [MM/DD/YYYY]]] [--workers N]")
+        sys.exit(1)
+    if args:
+        file_directory = args[0]
+        log_file = args[1] if len(args) > 1 else log_file
+        date_threshold = datetime.strptime(args[2], DATE_FORMAT) if len(args) > 2 else date_threshold
 
-process_files(file_list, log_file, date_threshold)
+    file_list = [os.path.join(file_directory, filename) for filename in os.listdir(file_directory)
+                 if filename.endswith('.pipe')]
+    if file_list:
+        kept, removed = process_files(file_list, log_file, date_threshold, workers)
+        print(f"{len(file_list)} files: kept {kept} rows, removed {removed}; accession numbers in {log_file}")
@@ -0,0 +1,113 @@
+"""
+Tiny Unix-socket job protocol so a script can stay resident and skip Python cold starts between files.
+
+Server side (inside the worker script):
+    from worker_socket import serve
+    serve("/run/filemonitor/hl7_pdf_dcm.sock", handler)   # handler(path) -> True/False
+
+Client side (called from filemonitor.sh; only imports the standard library, so it starts fast):
+    python worker_socket.py /run/filemonitor/hl7_pdf_dcm.sock /var/lib/filemonitor/some_file.hl7
+
+Protocol: one request per connection. The client sends the file path followed by a newline; the worker runs the
+handler and answers "ok" or "err". Requests are handled one at a time, in arrival order.
+
+Client exit codes: 0 = ok, 1 = err, 2 = worker not reachable (caller should fall back to running the script directly),
+3 = no answer within CLIENT_TIMEOUT (the worker may still be on the file: don't count it as failed or run it again).
+"""
+
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+
+log = logging.getLogger(__name__)
+
+CLIENT_TIMEOUT = 300  # seconds to wait for the worker to finish one file
+EXIT_OK, EXIT_ERR, EXIT_UNREACHABLE, EXIT_NO_ANSWER = 0, 1, 2, 3
+NO_ANSWER = "no answer"  # submit() result when the worker hasn't answered within the timeout
+
+
+def serve(socket_path, handler):
+    """Listen on `socket_path` and run handler(path) for each request until SIGTERM/SIGINT."""
+    os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)  # stale socket from a previous run
+
+    class _RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            path = self.rfile.readline().decode("utf-8", errors="replace").strip()
+            if not path:
+                return
+            try:
+                ok = handler(path)
+            except Exception as e:
+                log.exception("Worker handler failed for %s: %s", path, e)
+                ok = False
+            try:
+                self.wfile.write(b"ok\n" if ok else b"err\n")
+            except OSError:
+                log.info("Finished %s (%s) after the client stopped waiting", path, "ok" if ok else "err")
+
+    def _stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, _stop)
+
+    server = socketserver.UnixStreamServer(socket_path, _RequestHandler)
+    os.chmod(socket_path, 0o660)
+    log.info("Worker listening on %s (pid %s)", socket_path, os.getpid())
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        log.info("Worker on %s stopped", socket_path)
+
+
+def submit(socket_path, path, timeout=CLIENT_TIMEOUT):
+    """
+    Send one path to the worker. Returns True/False for ok/err, None if the worker could not be reached, or NO_ANSWER
+    if it didn't answer within `timeout` (it works through requests one at a time, so it may still handle the file).
+    """
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+    except OSError:
+        return None
+
+    reply = b""
+    with sock:
+        try:
+            sock.sendall(os.path.abspath(path).encode("utf-8") + b"\n")
+            while not reply.endswith(b"\n"):
+                chunk = sock.recv(64)
+                if not chunk:
+                    break
+                reply += chunk
+        except socket.timeout:
+            print(f"Worker on {socket_path} did not answer within {timeout}s for {path}; it may still handle it",
+                  file=sys.stderr)
+            return NO_ANSWER
+        except OSError as e:
+            print(f"Worker on {socket_path} did not answer for {path}: {e}", file=sys.stderr)
+            return False
+    return reply.strip() == b"ok"
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: worker_socket.py <socket_path> <file_path>", file=sys.stderr)
+        sys.exit(EXIT_UNREACHABLE)
+
+    result = submit(sys.argv[1], sys.argv[2])
+    if result is None:
+        sys.exit(EXIT_UNREACHABLE)
+    if result is NO_ANSWER:
+        sys.exit(EXIT_NO_ANSWER)
+    sys.exit(EXIT_OK if result else EXIT_ERR)